@@ -0,0 +1,95 @@
+"""Per-test overhead of TestCase.run for trivial tests.
+
+Times running tests that pass, are skipped, fail with an expected
+failure, have a cleanup, or run a subtest, so the cost of the machinery
+around the test method dominates. Compares running each part of a test
+in a contextlib generator, which is what testPartExecutor used to be,
+with the plain context manager it returns now.
+
+Run from the top of the checkout:
+
+    python benchmarks/bench_executor.py [-n NUMBER]
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest2
+from unittest2 import case
+
+
+class GeneratorOutcome(case._Outcome):
+    """Runs each part of a test in a contextlib generator, as before."""
+
+    __slots__ = ()
+
+    @contextlib.contextmanager
+    def testPartExecutor(self, test_case, isTest=False):
+        old_success = self.success
+        self.success = True
+        try:
+            yield
+        except:
+            if not self._endPart(test_case, old_success, *sys.exc_info()):
+                raise
+        else:
+            self._endPart(test_case, old_success, None, None, None)
+
+
+class Trivial(unittest2.TestCase):
+
+    def test_pass(self):
+        pass
+
+    def test_skip(self):
+        self.skipTest('skipped')
+
+    @unittest2.expectedFailure
+    def test_expected_failure(self):
+        raise ValueError
+
+    def test_cleanup(self):
+        self.addCleanup(int)
+
+    def test_subtest(self):
+        with self.subTest(i=1):
+            pass
+
+
+def _time(test, result, number, outcomeClass):
+    # best of three, in microseconds per test
+    original = case._Outcome
+    case._Outcome = outcomeClass
+    try:
+        timer = timeit.Timer(lambda: test.run(result))
+        return min(timer.repeat(3, number)) / number * 1e6
+    finally:
+        case._Outcome = original
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='runs per measurement (default 100000)')
+    args = parser.parse_args(argv)
+
+    result = unittest2.TestResult()
+    print('%-22s %14s %14s %8s' % ('usec per test', 'generator', 'class',
+                                   'speedup'))
+    for name in ('test_pass', 'test_skip', 'test_expected_failure',
+                 'test_cleanup', 'test_subtest'):
+        test = Trivial(name)
+        before, after = [_time(test, result, args.number, outcomeClass)
+                         for outcomeClass in (GeneratorOutcome,
+                                              case._Outcome)]
+        print('%-22s %14.3f %14.3f %7.2fx' % (name, before, after,
+                                             before / after))
+
+
+if __name__ == '__main__':
+    main()
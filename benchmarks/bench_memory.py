@@ -0,0 +1,91 @@
+"""Peak memory of running many tests and subtests.
+
+Reports the tracemalloc peak, in bytes per test, of running a suite of
+passing tests and of a single test with as many passing subtests. Each is
+run into a result whose addSubTest records passing subtests, for which
+the outcome keeps every one of them until the test ends, as it used to
+for every result, and into a plain TestResult, which ignores them. Needs
+Python 3.4 or later.
+
+Run from the top of the checkout:
+
+    python benchmarks/bench_memory.py [-n NUMBER]
+"""
+
+import argparse
+import gc
+import os
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest2
+
+
+class Tests(unittest2.TestCase):
+
+    def test(self):
+        pass
+
+
+class SubTests(unittest2.TestCase):
+
+    number = 0
+
+    def test(self):
+        for i in range(self.number):
+            with self.subTest(i=i):
+                pass
+
+
+class KeepingResult(unittest2.TestResult):
+    """Gets passing subtests, so the outcome keeps them, as before."""
+
+    def addSubTest(self, test, subtest, err):
+        super(KeepingResult, self).addSubTest(test, subtest, err)
+
+
+def run_tests(number, resultClass):
+    suite = unittest2.TestSuite(Tests('test') for _ in range(number))
+    suite.run(resultClass())
+
+
+def run_subtests(number, resultClass):
+    SubTests.number = number
+    SubTests('test').run(resultClass())
+
+
+def _peak(function, number, resultClass):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(number, resultClass)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='tests per measurement (default 100000)')
+    args = parser.parse_args(argv)
+    if tracemalloc is None:
+        parser.exit(1, 'tracemalloc is not available\n')
+
+    print('%-14s %14s %14s' % ('bytes per test', 'kept', 'not kept'))
+    for name, function in (('tests', run_tests),
+                           ('subtests', run_subtests)):
+        peaks = [_peak(function, args.number, resultClass)
+                 for resultClass in (KeepingResult, unittest2.TestResult)]
+        print('%-14s %14.1f %14.1f' % ((name,) + tuple(
+            float(peak) / args.number for peak in peaks)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Cost of creating TestCase instances and of assertEqual dispatch.
+
+Compares the class level type equality registry with functions registered
+per instance, which is what TestCase.__init__ used to do for every test.
+
+Run from the top of the checkout:
+
+    python benchmarks/bench_typeequality.py [-n NUMBER]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import six
+
+import unittest2
+
+
+class ClassRegistry(unittest2.TestCase):
+
+    def runTest(self):
+        pass
+
+
+class PerInstanceRegistry(unittest2.TestCase):
+    """Registers the default functions on each instance, as before."""
+
+    def __init__(self, methodName='runTest'):
+        super(PerInstanceRegistry, self).__init__(methodName)
+        self.addTypeEqualityFunc(dict, 'assertDictEqual')
+        self.addTypeEqualityFunc(list, 'assertListEqual')
+        self.addTypeEqualityFunc(tuple, 'assertTupleEqual')
+        self.addTypeEqualityFunc(set, 'assertSetEqual')
+        self.addTypeEqualityFunc(frozenset, 'assertSetEqual')
+        if six.PY2:
+            self.addTypeEqualityFunc(str, 'assertMultiLineEqual')
+        self.addTypeEqualityFunc(six.text_type, 'assertMultiLineEqual')
+
+    def runTest(self):
+        pass
+
+
+def _time(statement, number, namespace):
+    # best of three, in microseconds per call; a function is timed as
+    # timeit.Timer only takes globals from Python 3.5
+    timer = timeit.Timer(eval('lambda: ' + statement, namespace))
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='calls per measurement (default 100000)')
+    args = parser.parse_args(argv)
+
+    cases = [
+        ('construct', 'cls()'),
+        ('assertEqual int', 'test.assertEqual(1, 1)'),
+        ('assertEqual list', 'test.assertEqual(small_list, small_list)'),
+        ('assertEqual dict', 'test.assertEqual(small_dict, small_dict)'),
+        ('assertEqual text', 'test.assertEqual(text, text)'),
+    ]
+    print('%-18s %14s %14s %8s' % ('usec per call', 'per instance',
+                                   'class level', 'speedup'))
+    for name, statement in cases:
+        timings = []
+        for cls in (PerInstanceRegistry, ClassRegistry):
+            namespace = dict(cls=cls, test=cls(), small_list=[1, 2, 3],
+                             small_dict={'a': 1}, text=u'some text')
+            timings.append(_time(statement, args.number, namespace))
+        before, after = timings
+        print('%-18s %14.3f %14.3f %7.2fx' % (name, before, after,
+                                             before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -29,7 +29,8 @@ SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 __all__ = ['TestResult', 'TestCase', 'TestSuite',
            'TextTestRunner', 'TestLoader', 'FunctionTestCase', 'main',
            'defaultTestLoader', 'SkipTest', 'skip', 'skipIf', 'skipUnless',
-           'expectedFailure', 'TextTestResult', '__version__', 'collector']
+           'expectedFailure', 'parametrize', 'TextTestResult', '__version__',
+           'collector', 'Resource']
 
 __version__ = '1.0.1'
 
@@ -41,9 +42,11 @@ from unittest2.collector import collector
 from unittest2.result import TestResult
 from unittest2.case import (
     TestCase, FunctionTestCase, SkipTest, skip, skipIf,
-    skipUnless, expectedFailure
+    skipUnless, expectedFailure, parametrize, Resource
+)
+from unittest2.suite import (
+    BaseTestSuite, TestSuite, LazySuite, ParametrizedSuite
 )
-from unittest2.suite import BaseTestSuite, TestSuite
 from unittest2.loader import (
     TestLoader, defaultTestLoader, makeSuite, getTestCaseNames,
     findTestCases
@@ -1,8 +1,8 @@
 """Test case implementation"""
 
+import bisect
 import sys
 import collections
-import contextlib
 import difflib
 import logging
 import pprint
@@ -17,8 +17,8 @@ from six.moves import range
 
 from unittest2 import result
 from unittest2.util import (
-    safe_repr, safe_str, strclass,
-    unorderable_list_difference, _common_shorten_repr
+    clocks, safe_repr, safe_str, strclass,
+    unorderable_items_difference, _common_shorten
 )
 
 from unittest2.compatibility import (
@@ -30,6 +30,83 @@ __unittest = True
 
 DIFF_OMITTED = ('\nDiff is %s characters long. '
                  'Set self.maxDiff to None to see it.')
+DIFF_TOO_LONG = ('\nDiff is more than %s characters long. '
+                 'Set self.maxDiff to None to see it.')
+
+
+def _ndiff(a, b):
+    """Like difflib.ndiff(a, b), but the lines the two lists start and end
+    with are passed through, so that ndiff only compares the part where they
+    differ. ndiff takes quadratic time in the number of lines, so if that
+    part is large it is first split at lines that appear once in each list,
+    as in a patience diff."""
+    start, limit = 0, min(len(a), len(b))
+    while start < limit and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < limit - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    for line in a[:start]:
+        yield '  ' + line
+    a_middle, b_middle = a[start:len(a) - end], b[start:len(b) - end]
+    anchors = []
+    if len(a_middle) * len(b_middle) > _NDIFF_LIMIT:
+        anchors = _uniqueAnchors(a_middle, b_middle)
+    i = j = 0
+    for anchor_i, anchor_j in anchors:
+        for line in _ndiff(a_middle[i:anchor_i], b_middle[j:anchor_j]):
+            yield line
+        yield '  ' + a_middle[anchor_i]
+        i, j = anchor_i + 1, anchor_j + 1
+    if anchors:
+        lines = _ndiff(a_middle[i:], b_middle[j:])
+    else:
+        lines = difflib.ndiff(a_middle, b_middle)
+    for line in lines:
+        yield line
+    for line in a[len(a) - end:]:
+        yield '  ' + line
+
+# number of pairs of lines above which _ndiff splits its input
+_NDIFF_LIMIT = 10**6
+
+
+def _uniqueAnchors(a, b):
+    """The longest run of (i, j) pairs, increasing in both i and j, such
+    that a[i] == b[j] and the line appears once in a and once in b."""
+    counts = {}
+    for line in a:
+        counts[line] = counts.get(line, 0) + 1
+    unique = dict((line, i) for i, line in enumerate(a) if counts[line] == 1)
+    inB = {}
+    for j, line in enumerate(b):
+        if line in unique:
+            inB[line] = None if line in inB else j
+    pairs = sorted((unique[line], j) for line, j in inB.items()
+                   if j is not None)
+    # longest increasing subsequence of the js, by patience sorting
+    tails, tail_indexes, previous = [], [], []
+    for index, (i, j) in enumerate(pairs):
+        position = bisect.bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[position] = j
+            tail_indexes[position] = index
+        previous.append(tail_indexes[position - 1] if position else None)
+    anchors = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _pformatLines(obj):
+    return pprint.pformat(obj).splitlines()
+
 
 class SkipTest(Exception):
     """
@@ -49,45 +126,124 @@ class _UnexpectedSuccess(Exception):
     The test was supposed to fail, but it didn't!
     """
 
+# TestResult.addSubTest ignores subtests that pass
+_ignoresSubTestSuccess = getattr(result.TestResult.addSubTest, '__func__',
+                                 result.TestResult.addSubTest)
+
+def _recordsSubTestSuccess(result):
+    # results that pass the outcomes on say whether they want these
+    wantsSuccess = getattr(result, '_wantsSubTestSuccess', None)
+    if wantsSuccess is not None:
+        return wantsSuccess
+    addSubTest = getattr(result, 'addSubTest', None)
+    return (addSubTest is not None and
+            getattr(addSubTest, '__func__', None) is not _ignoresSubTestSuccess)
+
+_TestResult = result.TestResult
+
+def _callAddDuration(result, addDuration, test, elapsed, cpu):
+    if (isinstance(result, unittest.TestResult) and
+        not isinstance(result, _TestResult)):
+        # the standard library's TestResult takes no CPU time
+        addDuration(test, elapsed)
+    else:
+        addDuration(test, elapsed, cpu)
+
+def _addDuration(result, test, started):
+    """Tell result how long test took since started, a pair from clocks(),
+    if it records durations."""
+    addDuration = getattr(result, 'addDuration', None)
+    if addDuration is None:
+        return
+    wall, cpu = clocks()
+    _callAddDuration(result, addDuration, test, wall - started[0],
+                     cpu - started[1])
+
+
 class _Outcome(object):
+    __slots__ = ('expecting_failure', 'result', 'result_supports_subtests',
+                 'record_subtest_success', 'success', 'skipped',
+                 'expectedFailure', 'errors', 'subtest_failures')
+
     def __init__(self, result=None):
         self.expecting_failure = False
         self.result = result
         self.result_supports_subtests = hasattr(result, "addSubTest")
+        # Passing subtests are kept until the test ends only if the result
+        # wants to hear about them, otherwise a test with many subtests
+        # holds on to all of them.
+        self.record_subtest_success = _recordsSubTestSuccess(result)
         self.success = True
         self.skipped = []
         self.expectedFailure = None
         self.errors = []
+        self.subtest_failures = 0
 
-    @contextlib.contextmanager
     def testPartExecutor(self, test_case, isTest=False):
-        old_success = self.success
-        self.success = True
+        return _PartExecutor(self, test_case)
+
+    def _endPart(self, test_case, old_success, exc_type, exc_value, tb):
+        # Record how a part of the test ended, returning whether the
+        # exception is handled.
         try:
-            yield
-        except KeyboardInterrupt:
-            raise
-        except SkipTest as e:
-            self.success = False
-            self.skipped.append((test_case, str(e)))
-        except _ShouldStop:
-            pass
-        except:
-            exc_info = sys.exc_info()
-            if self.expecting_failure:
-                self.expectedFailure = exc_info
+            if exc_type is None:
+                if (self.record_subtest_success and self.success and
+                        isinstance(test_case, _SubTest)):
+                    self.errors.append((test_case, None))
+                return False
+            if issubclass(exc_type, KeyboardInterrupt):
+                return False
+            if exc_value is None:
+                exc_value = exc_type()
+            if issubclass(exc_type, SkipTest):
+                self.success = False
+                self.skipped.append((test_case, str(exc_value)))
+            elif issubclass(exc_type, _ShouldStop):
+                pass
+            elif self.expecting_failure:
+                self.expectedFailure = (exc_type, exc_value, tb)
             else:
                 self.success = False
-                self.errors.append((test_case, exc_info))
-            # explicitly break a reference cycle:
-            # exc_info -> frame -> exc_info
-            exc_info = None
-        else:
-            if self.result_supports_subtests and self.success:
-                self.errors.append((test_case, None))
+                self.subtest_failures += isinstance(test_case, _SubTest)
+                self.errors.append((test_case, (exc_type, exc_value, tb)))
+            return True
         finally:
             self.success = self.success and old_success
 
+
+class _PartExecutor(object):
+    """Runs a part of a test, such as setUp or a cleanup, recording its
+    outcome. A plain context manager rather than a generator as there are
+    several of these for every test."""
+
+    __slots__ = ('outcome', 'test_case', 'old_success')
+
+    def __init__(self, outcome, test_case):
+        self.outcome = outcome
+        self.test_case = test_case
+
+    def __enter__(self):
+        self.old_success = self.outcome.success
+        self.outcome.success = True
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return self.outcome._endPart(self.test_case, self.old_success,
+                                     exc_type, exc_value, tb)
+
+
+class _NoSubTest(object):
+    """What subTest() returns when the result doesn't support subtests."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+_noSubTest = _NoSubTest()
+
 def _id(obj):
     return obj
 
@@ -136,6 +292,52 @@ def expectedFailure(test_item):
     return test_item
 
 
+class _Parameters(object):
+    """The parameters of a parametrized test method."""
+
+    def __init__(self, params, ids):
+        self.params = params
+        self.ids = ids
+        # a plain iterator, rather than a function or a collection, can only
+        # be read once
+        self.readOnce = not callable(params) and iter(params) is params
+
+    def __iter__(self):
+        # (case id, arguments) for each case, reading params again if it
+        # is a function
+        params = self.params
+        if callable(params):
+            params = params()
+        for index, item in enumerate(params):
+            if self.ids is None:
+                caseId = str(index)
+            else:
+                caseId = str(self.ids(item))
+            if not isinstance(item, tuple):
+                item = (item,)
+            yield caseId, item
+
+
+def parametrize(params, ids=None):
+    """
+    Run a test method once for every item of params, each as a separate
+    test named after the method and the id of the item in brackets, such
+    as test_parse[17]. Tuples are passed as the positional arguments of
+    the method, other items as its only argument.
+
+    The id of an item is its index in params, or ids(item) if ids is given.
+
+    params is read while the tests run rather than when they are loaded.
+    It may be a function returning an iterable, such as a generator
+    function reading a data file, which is called each time the cases are
+    needed; a plain iterator can only be read once.
+    """
+    def decorator(test_item):
+        test_item.__unittest_params__ = _Parameters(params, ids)
+        return test_item
+    return decorator
+
+
 class _BaseTestCaseContext:
 
     def __init__(self, test_case):
@@ -261,9 +463,9 @@ class _AssertWarnsContext(_AssertRaisesBaseContext):
 
 class _TypeEqualityDict(object):
 
-    def __init__(self, testcase):
+    def __init__(self, testcase, store=()):
         self.testcase = testcase
-        self._store = {}
+        self._store = dict(store)
 
     def __setitem__(self, key, value):
         self._store[key] = value
@@ -347,6 +549,37 @@ class _AssertLogsContext(_BaseTestCaseContext):
                 .format(logging.getLevelName(self.level), self.logger.name))
 
 
+class Resource(object):
+    """Something expensive that tests share, such as a database.
+
+    make() returns a new value of the resource and clean(value), if given,
+    disposes of it. A value is kept for as long as consecutive tests need
+    it, across classes and modules, and reset(value), if given, is called
+    before each test that gets a value an earlier test used. cost is the
+    relative cost of making and cleaning a value, by which
+    unittest2.suite.groupByFixtures orders tests. name is used in error
+    reports, and defaults to the name of make.
+
+    See TestCase.resources for how tests declare what they need.
+    """
+
+    __slots__ = ('make', 'clean', 'reset', 'cost', 'name')
+
+    def __init__(self, make, clean=None, reset=None, cost=1, name=None):
+        self.make = make
+        self.clean = clean
+        self.reset = reset
+        self.cost = cost
+        if name is None:
+            name = getattr(make, '__name__', repr(make))
+        self.name = name
+
+    def __repr__(self):
+        return "<%s %s>" % (strclass(self.__class__), self.name)
+
+    def __str__(self):
+        return self.name
+
 
 class TestCase(unittest.TestCase):
     """A class whose instances are single test cases.
@@ -379,6 +612,15 @@ class TestCase(unittest.TestCase):
     * maxDiff: sets the maximum length of a diff in failure messages
         by assert methods using difflib. It is looked up as an instance
         attribute so can be configured by individual tests if required.
+    * maxRepr: sets the maximum length of the repr of an object in
+        failure messages, so huge objects don't have theirs made in full.
+        None means no limit.
+    * maxSubTestFailures: if not None, the test is stopped once this
+        many of its subtests have failed, so a broken data set doesn't
+        report a failure for every item in it.
+    * resources: (name, Resource) pairs for the shared resources the tests
+        need. TestSuite sets each value as the named attribute of a test
+        before running it.
     """
 
     failureException = AssertionError
@@ -387,6 +629,12 @@ class TestCase(unittest.TestCase):
 
     maxDiff = 80*8
 
+    maxRepr = 80*8*8
+
+    maxSubTestFailures = None
+
+    resources = ()
+
     # If a string is longer than _diffThreshold, use normal comparison instead
     # of difflib.  See #11763.
     _diffThreshold = 2**16
@@ -395,6 +643,26 @@ class TestCase(unittest.TestCase):
 
     _classSetupFailed = False
 
+    # Type specific assertEqual functions shared by all instances, see
+    # addClassTypeEqualityFunc. Values are callables or method names.
+    _classTypeEqualityFuncs = {
+        dict: 'assertDictEqual',
+        list: 'assertListEqual',
+        tuple: 'assertTupleEqual',
+        set: 'assertSetEqual',
+        frozenset: 'assertSetEqual',
+        six.text_type: 'assertMultiLineEqual',
+    }
+    if six.PY2:
+        _classTypeEqualityFuncs[str] = 'assertMultiLineEqual'
+
+    # (class, functions) merged along the MRO by _getClassTypeEqualityFuncs.
+    # Only valid when class is the class of the instance.
+    _resolvedTypeEqualityFuncs = (None, None)
+
+    # Per instance functions, only created by addTypeEqualityFunc
+    _type_equality_funcs = None
+
     def __init__(self, methodName='runTest'):
         """Create an instance of the class that will use the named test
            method when executed. Raises a ValueError if the instance does
@@ -405,24 +673,72 @@ class TestCase(unittest.TestCase):
         try:
             testMethod = getattr(self, methodName)
         except AttributeError:
-            raise ValueError("no such test method in %s: %s" % \
-                  (self.__class__, methodName))
+            testMethod = self._findParametrizedCase(methodName)
+            if testMethod is None:
+                raise ValueError("no such test method in %s: %s" % \
+                      (self.__class__, methodName))
         self._testMethodDoc = testMethod.__doc__
         self._cleanups = []
         self._subtest = None
 
-        # Map types to custom assertEqual functions that will compare
-        # instances of said type in more detail to generate a more useful
-        # error message.
-        self._type_equality_funcs = _TypeEqualityDict(self)
-        self.addTypeEqualityFunc(dict, 'assertDictEqual')
-        self.addTypeEqualityFunc(list, 'assertListEqual')
-        self.addTypeEqualityFunc(tuple, 'assertTupleEqual')
-        self.addTypeEqualityFunc(set, 'assertSetEqual')
-        self.addTypeEqualityFunc(frozenset, 'assertSetEqual')
-        if six.PY2:
-            self.addTypeEqualityFunc(str, 'assertMultiLineEqual')
-        self.addTypeEqualityFunc(six.text_type, 'assertMultiLineEqual')
+    def _findParametrizedCase(self, methodName):
+        # methodName may name one case of a parametrized method, such as
+        # test_parse[17]; the other cases are skipped over without making
+        # tests for them.
+        name, _, caseId = methodName.partition('[')
+        if not caseId.endswith(']'):
+            return None
+        parameters = getattr(getattr(self, name, None),
+                             '__unittest_params__', None)
+        if parameters is None:
+            return None
+        caseId = caseId[:-1]
+        for candidate, args in parameters:
+            if candidate == caseId:
+                return self._useParameters(name, caseId, args)
+        return None
+
+    def _useParameters(self, name, caseId, args):
+        """Make this the test of the parametrized method name with the
+        given case id and arguments."""
+        testMethod = getattr(self, name)
+        @wraps(testMethod)
+        def parametrizedTest():
+            return testMethod(*args)
+        self._testMethodName = '%s[%s]' % (name, caseId)
+        setattr(self, self._testMethodName, parametrizedTest)
+        return parametrizedTest
+
+    @classmethod
+    def addClassTypeEqualityFunc(cls, typeobj, function):
+        """Add a type specific assertEqual style function for all instances
+        of this class and its subclasses.
+
+        function may be a callable as for addTypeEqualityFunc, or the name
+        of a method of the class.
+        """
+        if '_classTypeEqualityFuncs' not in cls.__dict__:
+            cls._classTypeEqualityFuncs = {}
+        cls._classTypeEqualityFuncs[typeobj] = function
+        # forget what was resolved for this class and its subclasses
+        classes = [cls]
+        while classes:
+            klass = classes.pop()
+            klass._resolvedTypeEqualityFuncs = (None, None)
+            classes.extend(klass.__subclasses__())
+
+    @classmethod
+    def _getClassTypeEqualityFuncs(cls):
+        # Merged once per class from the _classTypeEqualityFuncs along the
+        # MRO, later classes winning.
+        owner, resolved = cls._resolvedTypeEqualityFuncs
+        if owner is not cls:
+            resolved = {}
+            for klass in reversed(cls.__mro__):
+                resolved.update(
+                    klass.__dict__.get('_classTypeEqualityFuncs', {}))
+            cls._resolvedTypeEqualityFuncs = (cls, resolved)
+        return resolved
 
     def addTypeEqualityFunc(self, typeobj, function):
         """Add a type specific assertEqual style function to compare a type.
@@ -437,6 +753,10 @@ class TestCase(unittest.TestCase):
                     msg= argument that raises self.failureException with a
                     useful error message when the two arguments are not equal.
         """
+        if self._type_equality_funcs is None:
+            # copy the class functions on first write
+            self._type_equality_funcs = _TypeEqualityDict(
+                self, self._getClassTypeEqualityFuncs())
         self._type_equality_funcs[typeobj] = function
 
     def addCleanup(self, function, *args, **kwargs):
@@ -500,7 +820,6 @@ class TestCase(unittest.TestCase):
                           RuntimeWarning, 2)
             result.addSuccess(test_case)
 
-    @contextlib.contextmanager
     def subTest(self, msg=None, **params):
         """Return a context manager that will return the enclosed block
         of code in a subtest identified by the optional message and
@@ -509,27 +828,8 @@ class TestCase(unittest.TestCase):
         block, allowing further test code to be executed.
         """
         if not self._outcome.result_supports_subtests:
-            yield
-            return
-        parent = self._subtest
-        if parent is None:
-            params_map = collections.ChainMap(params)
-        else:
-            params_map = parent.params.new_child(params)
-        self._subtest = _SubTest(self, msg, params_map)
-        try:
-            with self._outcome.testPartExecutor(self._subtest, isTest=True):
-                yield
-            if not self._outcome.success:
-                result = self._outcome.result
-                if result is not None and result.failfast:
-                    raise _ShouldStop
-            elif self._outcome.expectedFailure:
-                # If the test is expecting a failure, we really want to
-                # stop now and register the expected failure.
-                raise _ShouldStop
-        finally:
-            self._subtest = parent
+            return _noSubTest
+        return _SubTest(self, msg, params)
 
     def _feedErrorsToResult(self, result, errors):
         for test, exc_info in errors:
@@ -590,6 +890,7 @@ class TestCase(unittest.TestCase):
         expecting_failure = getattr(testMethod,
                                     "__unittest_expecting_failure__", False)
         outcome = _Outcome(result)
+        started = clocks()
         try:
             self._outcome = outcome
 
@@ -617,6 +918,7 @@ class TestCase(unittest.TestCase):
                     result.addSuccess(self)
             return result
         finally:
+            _addDuration(result, self, started)
             result.stopTest(self)
             if orig_result is None:
                 stopTestRun = getattr(result, 'stopTestRun', None)
@@ -668,13 +970,15 @@ class TestCase(unittest.TestCase):
     def assertFalse(self, expr, msg=None):
         "Fail the test if the expression is true."
         if expr:
-            msg = self._formatMessage(msg, "%s is not false" % safe_repr(expr))
+            msg = self._formatMessage(msg,
+                                      "%s is not false" % self._repr(expr))
             raise self.failureException(msg)
 
     def assertTrue(self, expr, msg=None):
         """Fail the test unless the expression is true."""
         if not expr:
-            msg = self._formatMessage(msg, "%s is not true" % safe_repr(expr))
+            msg = self._formatMessage(msg,
+                                      "%s is not true" % self._repr(expr))
             raise self.failureException(msg)
 
     def _formatMessage(self, msg, standardMsg):
@@ -812,8 +1116,15 @@ class TestCase(unittest.TestCase):
         # See the discussion in http://bugs.python.org/issue2578.
         #
         if type(first) is type(second):
-            asserter = self._type_equality_funcs.get(type(first))
+            funcs = self._type_equality_funcs
+            if funcs is None:
+                owner, funcs = self._resolvedTypeEqualityFuncs
+                if owner is not type(self):
+                    funcs = self._getClassTypeEqualityFuncs()
+            asserter = funcs.get(type(first))
             if asserter is not None:
+                if isinstance(asserter, six.string_types):
+                    asserter = getattr(self, asserter)
                 return asserter
 
         return self._baseAssertEqual
@@ -821,7 +1132,7 @@ class TestCase(unittest.TestCase):
     def _baseAssertEqual(self, first, second, msg=None):
         """The default assertEqual implementation, not type specific."""
         if not first == second:
-            standardMsg = '%s != %s' % _common_shorten_repr(first, second)
+            standardMsg = '%s != %s' % self._commonShortenRepr(first, second)
             msg = self._formatMessage(msg, standardMsg)
             raise self.failureException(msg)
 
@@ -837,8 +1148,8 @@ class TestCase(unittest.TestCase):
            operator.
         """
         if not first != second:
-            msg = self._formatMessage(msg, '%s == %s' % (safe_repr(first),
-                                                           safe_repr(second)))
+            msg = self._formatMessage(msg, '%s == %s' % (self._repr(first),
+                                                           self._repr(second)))
             raise self.failureException(msg)
 
     def assertAlmostEqual(self, first, second, places=None, msg=None, delta=None):
@@ -863,9 +1174,9 @@ class TestCase(unittest.TestCase):
             if abs(first - second) <= delta:
                 return
 
-            standardMsg = '%s != %s within %s delta' % (safe_repr(first),
-                                                        safe_repr(second),
-                                                        safe_repr(delta))
+            standardMsg = '%s != %s within %s delta' % (self._repr(first),
+                                                        self._repr(second),
+                                                        self._repr(delta))
         else:
             if places is None:
                 places = 7
@@ -873,8 +1184,8 @@ class TestCase(unittest.TestCase):
             if round(abs(second-first), places) == 0:
                 return
 
-            standardMsg = '%s != %s within %r places' % (safe_repr(first),
-                                                          safe_repr(second),
+            standardMsg = '%s != %s within %r places' % (self._repr(first),
+                                                          self._repr(second),
                                                           places)
         msg = self._formatMessage(msg, standardMsg)
         raise self.failureException(msg)
@@ -895,16 +1206,16 @@ class TestCase(unittest.TestCase):
         if delta is not None:
             if not (first == second) and abs(first - second) > delta:
                 return
-            standardMsg = '%s == %s within %s delta' % (safe_repr(first),
-                                                        safe_repr(second),
-                                                        safe_repr(delta))
+            standardMsg = '%s == %s within %s delta' % (self._repr(first),
+                                                        self._repr(second),
+                                                        self._repr(delta))
         else:
             if places is None:
                 places = 7
             if not (first == second) and round(abs(second-first), places) != 0:
                 return
-            standardMsg = '%s == %s within %r places' % (safe_repr(first),
-                                                         safe_repr(second),
+            standardMsg = '%s == %s within %r places' % (self._repr(first),
+                                                         self._repr(second),
                                                          places)
 
         msg = self._formatMessage(msg, standardMsg)
@@ -929,10 +1240,12 @@ class TestCase(unittest.TestCase):
             seq_type_name = seq_type.__name__
             if not isinstance(seq1, seq_type):
                 raise self.failureException('First sequence is not a %s: %s'
-                                            % (seq_type_name, safe_repr(seq1)))
+                                            % (seq_type_name,
+                                               self._repr(seq1)))
             if not isinstance(seq2, seq_type):
                 raise self.failureException('Second sequence is not a %s: %s'
-                                            % (seq_type_name, safe_repr(seq2)))
+                                            % (seq_type_name,
+                                               self._repr(seq2)))
         else:
             seq_type_name = "sequence"
 
@@ -956,7 +1269,7 @@ class TestCase(unittest.TestCase):
 
             differing = '%ss differ: %s != %s\n' % (
                     (seq_type_name.capitalize(),) +
-                    _common_shorten_repr(seq1, seq2))
+                    self._commonShortenRepr(seq1, seq2))
 
             for i in range(min(len1, len2)):
                 try:
@@ -975,7 +1288,7 @@ class TestCase(unittest.TestCase):
 
                 if item1 != item2:
                     differing += ('\nFirst differing element %d:\n%s\n%s\n' %
-                                 (i, item1, item2))
+                                 (i, self._repr(item1), self._repr(item2)))
                     break
             else:
                 if (len1 == len2 and seq_type is None and
@@ -988,7 +1301,7 @@ class TestCase(unittest.TestCase):
                              'elements.\n' % (seq_type_name, len1 - len2))
                 try:
                     differing += ('First extra element %d:\n%s\n' %
-                                  (len2, seq1[len2]))
+                                  (len2, self._repr(seq1[len2])))
                 except (TypeError, IndexError, NotImplementedError):
                     differing += ('Unable to index element %d '
                                   'of first %s\n' % (len2, seq_type_name))
@@ -997,25 +1310,56 @@ class TestCase(unittest.TestCase):
                              'elements.\n' % (seq_type_name, len2 - len1))
                 try:
                     differing += ('First extra element %d:\n%s\n' %
-                                  (len1, seq2[len1]))
+                                  (len1, self._repr(seq2[len1])))
                 except (TypeError, IndexError, NotImplementedError):
                     differing += ('Unable to index element %d '
                                   'of second %s\n' % (len1, seq_type_name))
-        standardMsg = differing
-        diffMsg = '\n' + '\n'.join(
-            difflib.ndiff(pprint.pformat(seq1).splitlines(),
-                          pprint.pformat(seq2).splitlines()))
-
-        standardMsg = self._truncateMessage(standardMsg, diffMsg)
+        standardMsg = self._diffMessage(
+            differing, seq1, seq2, _pformatLines, '\n',
+            self._reprLength(seq1, seq2))
         msg = self._formatMessage(msg, standardMsg)
         self.fail(msg)
 
+    def _repr(self, obj):
+        return safe_repr(obj, limit=self.maxRepr)
+
+    def _commonShortenRepr(self, *args):
+        return _common_shorten(tuple(map(self._repr, args)))
+
+    def _reprLength(self, *args):
+        """The length of the longest repr of args, cut short at maxDiff.
+        It is only compared with maxDiff, so is 0 if there is none."""
+        max_diff = self.maxDiff
+        if max_diff is None:
+            return 0
+        return max(len(safe_repr(arg, limit=max_diff)) for arg in args)
+
     def _truncateMessage(self, message, diff):
         max_diff = self.maxDiff
         if max_diff is None or len(diff) <= max_diff:
             return message + diff
         return message + (DIFF_OMITTED % len(diff))
 
+    def _diffMessage(self, message, first, second, lines, sep, shortest):
+        """Add the diff of lines(first) and lines(second) to message, or
+        say it was omitted if it is longer than maxDiff.
+
+        The diff is known to be longer than shortest, so if that is over
+        maxDiff, lines isn't even called. Otherwise the diff is abandoned
+        as soon as it gets too long.
+        """
+        max_diff = self.maxDiff
+        if max_diff is not None and shortest >= max_diff:
+            return message + DIFF_TOO_LONG % max_diff
+        diff = []
+        length = 1 - len(sep)
+        for line in _ndiff(lines(first), lines(second)):
+            diff.append(line)
+            length += len(sep) + len(line)
+            if max_diff is not None and length > max_diff:
+                return message + DIFF_TOO_LONG % max_diff
+        return self._truncateMessage(message, '\n' + sep.join(diff))
+
     def assertListEqual(self, list1, list2, msg=None):
         """A list-specific equality assertion.
 
@@ -1077,11 +1421,11 @@ class TestCase(unittest.TestCase):
         if difference1:
             lines.append('Items in the first set but not the second:')
             for item in difference1:
-                lines.append(repr(item))
+                lines.append(self._repr(item))
         if difference2:
             lines.append('Items in the second set but not the first:')
             for item in difference2:
-                lines.append(repr(item))
+                lines.append(self._repr(item))
 
         standardMsg = '\n'.join(lines)
         self.fail(self._formatMessage(msg, standardMsg))
@@ -1089,27 +1433,28 @@ class TestCase(unittest.TestCase):
     def assertIn(self, member, container, msg=None):
         """Just like self.assertTrue(a in b), but with a nicer default message."""
         if member not in container:
-            standardMsg = '%s not found in %s' % (safe_repr(member),
-                                                   safe_repr(container))
+            standardMsg = '%s not found in %s' % (self._repr(member),
+                                                   self._repr(container))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertNotIn(self, member, container, msg=None):
         """Just like self.assertTrue(a not in b), but with a nicer default message."""
         if member in container:
-            standardMsg = '%s unexpectedly found in %s' % (safe_repr(member),
-                                                            safe_repr(container))
+            standardMsg = '%s unexpectedly found in %s' % (self._repr(member),
+                                                            self._repr(container))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertIs(self, expr1, expr2, msg=None):
         """Just like self.assertTrue(a is b), but with a nicer default message."""
         if expr1 is not expr2:
-            standardMsg = '%s is not %s' % (safe_repr(expr1), safe_repr(expr2))
+            standardMsg = '%s is not %s' % (self._repr(expr1),
+                                            self._repr(expr2))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertIsNot(self, expr1, expr2, msg=None):
         """Just like self.assertTrue(a is not b), but with a nicer default message."""
         if expr1 is expr2:
-            standardMsg = 'unexpectedly identical: %s' % (safe_repr(expr1),)
+            standardMsg = 'unexpectedly identical: %s' % (self._repr(expr1),)
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertDictEqual(self, d1, d2, msg=None):
@@ -1117,11 +1462,10 @@ class TestCase(unittest.TestCase):
         self.assertIsInstance(d2, dict, 'Second argument is not a dictionary')
 
         if d1 != d2:
-            standardMsg = '%s != %s' % _common_shorten_repr(d1, d2)
-            diff = ('\n' + '\n'.join(difflib.ndiff(
-                           pprint.pformat(d1).splitlines(),
-                           pprint.pformat(d2).splitlines())))
-            standardMsg = self._truncateMessage(standardMsg, diff)
+            standardMsg = '%s != %s' % self._commonShortenRepr(d1, d2)
+            standardMsg = self._diffMessage(
+                standardMsg, d1, d2, _pformatLines, '\n',
+                self._reprLength(d1, d2))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertDictContainsSubset(self, expected, actual, msg=None):
@@ -1133,15 +1477,15 @@ class TestCase(unittest.TestCase):
                 missing.append(key)
             elif value != actual[key]:
                 mismatched.append('%s, expected: %s, actual: %s' %
-                                  (safe_repr(key), safe_repr(value),
-                                   safe_repr(actual[key])))
+                                  (self._repr(key), self._repr(value),
+                                   self._repr(actual[key])))
 
         if not (missing or mismatched):
             return
 
         standardMsg = ''
         if missing:
-            standardMsg = 'Missing: %s' % ','.join(safe_repr(m) for m in
+            standardMsg = 'Missing: %s' % ','.join(self._repr(m) for m in
                                                     missing)
         if mismatched:
             if standardMsg:
@@ -1172,19 +1516,18 @@ class TestCase(unittest.TestCase):
             # Unsortable items (example: set(), complex(), ...)
             expected = list(expected_seq)
             actual = list(actual_seq)
-            missing, unexpected = unorderable_list_difference(
-                expected, actual, ignore_duplicate=False
-            )
+            missing, unexpected = unorderable_items_difference(
+                expected, actual)
         else:
             return self.assertSequenceEqual(expected, actual, msg=msg)
 
         errors = []
         if missing:
             errors.append('Expected, but missing:\n    %s' %
-                           safe_repr(missing))
+                           self._repr(missing))
         if unexpected:
             errors.append('Unexpected, but present:\n    %s' %
-                           safe_repr(unexpected))
+                           self._repr(unexpected))
         if errors:
             standardMsg = '\n'.join(errors)
             self.fail(self._formatMessage(msg, standardMsg))
@@ -1206,39 +1549,41 @@ class TestCase(unittest.TestCase):
             if len(firstlines) == 1 and first.strip('\r\n') == first:
                 firstlines = [first + '\n']
                 secondlines = [second + '\n']
-            standardMsg = '%s != %s' % _common_shorten_repr(first, second)
-            diff = '\n' + ''.join(difflib.ndiff(firstlines, secondlines))
-            standardMsg = self._truncateMessage(standardMsg, diff)
+            standardMsg = '%s != %s' % self._commonShortenRepr(first, second)
+            standardMsg = self._diffMessage(
+                standardMsg, firstlines, secondlines, _id, '',
+                max(len(first), len(second)))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertLess(self, a, b, msg=None):
         """Just like self.assertTrue(a < b), but with a nicer default message."""
         if not a < b:
-            standardMsg = '%s not less than %s' % (safe_repr(a), safe_repr(b))
+            standardMsg = '%s not less than %s' % (self._repr(a),
+                                                   self._repr(b))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertLessEqual(self, a, b, msg=None):
         """Just like self.assertTrue(a <= b), but with a nicer default message."""
         if not a <= b:
-            standardMsg = '%s not less than or equal to %s' % (safe_repr(a), safe_repr(b))
+            standardMsg = '%s not less than or equal to %s' % (self._repr(a), self._repr(b))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertGreater(self, a, b, msg=None):
         """Just like self.assertTrue(a > b), but with a nicer default message."""
         if not a > b:
-            standardMsg = '%s not greater than %s' % (safe_repr(a), safe_repr(b))
+            standardMsg = '%s not greater than %s' % (self._repr(a), self._repr(b))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertGreaterEqual(self, a, b, msg=None):
         """Just like self.assertTrue(a >= b), but with a nicer default message."""
         if not a >= b:
-            standardMsg = '%s not greater than or equal to %s' % (safe_repr(a), safe_repr(b))
+            standardMsg = '%s not greater than or equal to %s' % (self._repr(a), self._repr(b))
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertIsNone(self, obj, msg=None):
         """Same as self.assertTrue(obj is None), with a nicer default message."""
         if obj is not None:
-            standardMsg = '%s is not None' % (safe_repr(obj),)
+            standardMsg = '%s is not None' % (self._repr(obj),)
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertIsNotNone(self, obj, msg=None):
@@ -1251,13 +1596,14 @@ class TestCase(unittest.TestCase):
         """Same as self.assertTrue(isinstance(obj, cls)), with a nicer
         default message."""
         if not isinstance(obj, cls):
-            standardMsg = '%s is not an instance of %r' % (safe_repr(obj), cls)
+            standardMsg = '%s is not an instance of %r' % (self._repr(obj),
+                                                           cls)
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertNotIsInstance(self, obj, cls, msg=None):
         """Included for symmetry with assertIsInstance."""
         if isinstance(obj, cls):
-            standardMsg = '%s is an instance of %r' % (safe_repr(obj), cls)
+            standardMsg = '%s is an instance of %r' % (self._repr(obj), cls)
             self.fail(self._formatMessage(msg, standardMsg))
 
     def assertRaisesRegex(self, expected_exception, expected_regex,
@@ -1302,7 +1648,8 @@ class TestCase(unittest.TestCase):
             expected_regex = re.compile(expected_regex)
         if not expected_regex.search(text):
             msg = msg or "Regex didn't match"
-            msg = '%s: %r not found in %r' % (msg, expected_regex.pattern, text)
+            msg = '%s: %r not found in %s' % (msg, expected_regex.pattern,
+                                              self._repr(text))
             raise self.failureException(msg)
 
     def assertNotRegex(self, text, unexpected_regex, msg=None):
@@ -1312,10 +1659,10 @@ class TestCase(unittest.TestCase):
         match = unexpected_regex.search(text)
         if match:
             msg = msg or "Regex matched"
-            msg = '%s: %r matches %r in %r' % (msg,
+            msg = '%s: %r matches %r in %s' % (msg,
                                                text[match.start():match.end()],
                                                unexpected_regex.pattern,
-                                               text)
+                                               self._repr(text))
             raise self.failureException(msg)
 
 
@@ -1400,14 +1747,140 @@ class FunctionTestCase(TestCase):
         return doc and doc.split("\n")[0].strip() or None
 
 
+def _overrides(cls, name):
+    return (six.get_unbound_function(getattr(cls, name)) is not
+            six.get_unbound_function(getattr(TestCase, name)))
+
+
+class TestHandle(object):
+    """Stands in for a test in a suite until it runs.
+
+    Holds only the TestCase class and the name of the test method; a
+    TestCase instance is created by instantiate() when the test is run and
+    not kept afterwards. Compares equal to the TestCase instance it stands
+    for.
+    """
+
+    __slots__ = ('testCaseClass', '_testMethodName')
+
+    def __init__(self, testCaseClass, methodName='runTest'):
+        self.testCaseClass = testCaseClass
+        self._testMethodName = methodName
+
+    def instantiate(self):
+        return self.testCaseClass(self._testMethodName)
+
+    def countTestCases(self):
+        return 1
+
+    def id(self):
+        if _overrides(self.testCaseClass, 'id'):
+            return self.instantiate().id()
+        return "%s.%s" % (strclass(self.testCaseClass), self._testMethodName)
+
+    def shortDescription(self):
+        if _overrides(self.testCaseClass, 'shortDescription'):
+            return self.instantiate().shortDescription()
+        doc = getattr(self.testCaseClass, self._testMethodName).__doc__
+        return doc and doc.split("\n")[0].strip() or None
+
+    def __eq__(self, other):
+        if isinstance(other, TestHandle):
+            other_class = other.testCaseClass
+        elif isinstance(other, unittest.TestCase):
+            other_class = type(other)
+        else:
+            return NotImplemented
+        return (self.testCaseClass is other_class and
+                self._testMethodName == other._testMethodName)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.testCaseClass, self._testMethodName))
+
+    def __str__(self):
+        if _overrides(self.testCaseClass, '__str__'):
+            return str(self.instantiate())
+        return "%s (%s)" % (self._testMethodName,
+                            strclass(self.testCaseClass))
+
+    def __repr__(self):
+        return "<%s handle testMethod=%s>" % \
+               (strclass(self.testCaseClass), self._testMethodName)
+
+    def run(self, result=None):
+        return self.instantiate().run(result)
+
+    def __call__(self, *args, **kwds):
+        return self.run(*args, **kwds)
+
+    def debug(self):
+        self.instantiate().debug()
+
+
 class _SubTest(TestCase):
+    # One of these is made for every subTest() block, and is the context
+    # manager for it, so TestCase.__init__ is skipped, the state is kept in
+    # slots and the params ChainMap is only built when it is needed to
+    # describe the subtest.
+    __slots__ = ('_message', 'test_case', '_params', '_parent',
+                 '_old_success')
+
+    _testMethodName = 'runTest'
+    _testMethodDoc = None
+    _outcome = None
+    _subtest = None
+    _cleanups = ()
 
     def __init__(self, test_case, message, params):
-        super(_SubTest, self).__init__()
         self._message = message
         self.test_case = test_case
-        self.params = params
-        self.failureException = test_case.failureException
+        self._params = params
+        self._parent = None
+
+    @property
+    def failureException(self):
+        return self.test_case.failureException
+
+    @property
+    def params(self):
+        if self._parent is None:
+            return collections.ChainMap(self._params)
+        return self._parent.params.new_child(self._params)
+
+    def __enter__(self):
+        test_case = self.test_case
+        outcome = test_case._outcome
+        self._parent = test_case._subtest
+        test_case._subtest = self
+        self._old_success = outcome.success
+        outcome.success = True
+
+    def __exit__(self, exc_type, exc_value, tb):
+        test_case = self.test_case
+        outcome = test_case._outcome
+        try:
+            handled = outcome._endPart(self, self._old_success,
+                                       exc_type, exc_value, tb)
+            if exc_type is not None and not handled:
+                return False
+            if not outcome.success:
+                result = outcome.result
+                if result is not None and result.failfast:
+                    raise _ShouldStop
+                maxFailures = test_case.maxSubTestFailures
+                if (maxFailures is not None and
+                        outcome.subtest_failures >= maxFailures):
+                    raise _ShouldStop
+            elif outcome.expectedFailure:
+                # If the test is expecting a failure, we really want to
+                # stop now and register the expected failure.
+                raise _ShouldStop
+            return True
+        finally:
+            test_case._subtest = self._parent
 
     def runTest(self):
         raise NotImplementedError("subtests cannot be run directly")
@@ -1416,10 +1889,11 @@ class _SubTest(TestCase):
         parts = []
         if self._message:
             parts.append("[{0}]".format(self._message))
-        if self.params:
+        params = self.params
+        if params:
             params_desc = ', '.join(
                 "{0}={1!r}".format(k, v)
-                for (k, v) in sorted(self.params.items()))
+                for (k, v) in sorted(params.items()))
             parts.append("({0})".format(params_desc))
         return " ".join(parts) or '(<subtest>)'
 
@@ -0,0 +1,314 @@
+"""Finding test names by parsing test modules instead of importing them"""
+
+import ast
+
+import six
+from six.moves import builtins
+
+__unittest = True
+
+
+_UNITTEST_MODULES = frozenset(['unittest', 'unittest2'])
+_SKIP_DECORATORS = frozenset(['skip', 'skipIf', 'skipUnless'])
+# the decorators test methods may have without changing what is collected
+_KNOWN_DECORATORS = _SKIP_DECORATORS | frozenset(['expectedFailure'])
+# calls that can add or replace names in a namespace behind our back
+_DYNAMIC_CALLS = frozenset(['setattr', 'type', 'globals', 'locals', 'vars',
+                            'exec', 'eval', '__import__', 'execfile'])
+_LITERALS = frozenset(['Num', 'Str', 'Bytes', 'Constant', 'List', 'Tuple',
+                       'Dict', 'Set', 'NameConstant'])
+_FUNCTIONS = tuple(getattr(ast, name) for name in
+                   ('FunctionDef', 'AsyncFunctionDef') if hasattr(ast, name))
+_BLOCKS = tuple(getattr(ast, name) for name in
+                ('If', 'Try', 'TryExcept', 'TryFinally', 'With')
+                if hasattr(ast, name))
+
+
+class _Dynamic(Exception):
+    """The module may create tests at import time."""
+
+
+def _looksLikeTestClass(name):
+    return name.startswith('Test') or name.endswith(('Test', 'Tests',
+                                                     'TestCase'))
+
+
+def _string(node):
+    if type(node).__name__ == 'Constant':
+        value = node.value
+    elif type(node).__name__ == 'Str':
+        value = node.s
+    else:
+        return None
+    if isinstance(value, six.string_types):
+        return value
+    return None
+
+
+def _isMainGuard(node):
+    test = node.test
+    return (isinstance(test, ast.Compare) and
+            isinstance(test.left, ast.Name) and test.left.id == '__name__')
+
+
+def _isParametrize(decorator):
+    if not isinstance(decorator, ast.Call):
+        return False
+    func = decorator.func
+    if isinstance(func, ast.Attribute):
+        return func.attr == 'parametrize'
+    return isinstance(func, ast.Name) and func.id == 'parametrize'
+
+
+class _Class(object):
+
+    def __init__(self):
+        self.isTest = False
+        self.methods = {}
+        self.skip = None
+
+
+class _Collector(object):
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.modules = set()
+        self.testCases = set()
+        self.decorators = {}
+        self.imported = set()
+        self.classes = {}
+
+    def collect(self, tree):
+        for node in tree.body:
+            self.statement(node, top=True)
+        found = []
+        for name in sorted(self.classes):
+            cls = self.classes[name]
+            if not cls.isTest:
+                continue
+            names = [(method, skip or cls.skip)
+                     for method, skip in cls.methods.items()
+                     if method.startswith(self.prefix)]
+            if not names and 'runTest' in cls.methods:
+                names = [('runTest', cls.methods['runTest'] or cls.skip)]
+            found.append((name, names))
+        return found
+
+    def bind(self, name):
+        if name == 'load_tests' or name in self.classes:
+            # a class that is bound again may be wrapped, replaced or gone
+            raise _Dynamic
+        self.testCases.discard(name)
+        self.decorators.pop(name, None)
+        self.modules.discard(name)
+
+    def statement(self, node, top):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                bound = alias.asname or alias.name.split('.')[0]
+                self.bind(bound)
+                if alias.name.split('.')[0] in _UNITTEST_MODULES and \
+                   (alias.asname is None or alias.name in _UNITTEST_MODULES):
+                    self.modules.add(bound)
+        elif isinstance(node, ast.ImportFrom):
+            fromUnittest = node.module in _UNITTEST_MODULES and not node.level
+            for alias in node.names:
+                if alias.name == '*':
+                    raise _Dynamic
+                bound = alias.asname or alias.name
+                self.bind(bound)
+                if not fromUnittest:
+                    # an imported TestCase is collected from this module too
+                    if _looksLikeTestClass(alias.name):
+                        raise _Dynamic
+                    self.imported.add(bound)
+                elif alias.name.endswith('TestCase'):
+                    self.testCases.add(bound)
+                elif alias.name in _KNOWN_DECORATORS:
+                    self.decorators[bound] = alias.name
+        elif isinstance(node, ast.ClassDef):
+            if not top:
+                raise _Dynamic
+            cls = self.classDef(node)
+            # a class defined again only replaces the earlier one
+            self.classes.pop(node.name, None)
+            self.bind(node.name)
+            self.classes[node.name] = cls
+        elif isinstance(node, _FUNCTIONS):
+            self.scan(node.decorator_list)
+            self.bind(node.name)
+        elif isinstance(node, ast.If) and _isMainGuard(node):
+            pass
+        elif isinstance(node, _BLOCKS):
+            self.scan([getattr(node, name) for name in ('test', 'items')
+                       if hasattr(node, name)])
+            for name in ('body', 'orelse', 'finalbody'):
+                for child in getattr(node, name, ()):
+                    self.statement(child, top=False)
+            for handler in getattr(node, 'handlers', ()):
+                for child in handler.body:
+                    self.statement(child, top=False)
+        elif isinstance(node, (ast.Assign, ast.AugAssign)) or \
+             type(node).__name__ == 'AnnAssign':
+            targets = getattr(node, 'targets', None) or [node.target]
+            value = node.value
+            if isinstance(value, ast.Name) and value.id in self.classes:
+                # an alias makes the loader find the class twice
+                raise _Dynamic
+            self.scan([value])
+            for target in targets:
+                self.target(target)
+        elif isinstance(node, ast.Delete):
+            for target in node.targets:
+                self.target(target)
+        elif isinstance(node, ast.Expr):
+            self.scan([node.value])
+        elif isinstance(node, (ast.Pass, ast.Global, ast.Assert)):
+            self.scan([node])
+        else:
+            # raise, loops, exec and friends
+            raise _Dynamic
+
+    def target(self, node):
+        if isinstance(node, ast.Name):
+            self.bind(node.id)
+        elif isinstance(node, (ast.Tuple, ast.List)):
+            for element in node.elts:
+                self.target(element)
+        elif type(node).__name__ == 'Starred':
+            self.target(node.value)
+        else:
+            root = node
+            while isinstance(root, (ast.Attribute, ast.Subscript)):
+                root = root.value
+            if not isinstance(root, ast.Name) or root.id in self.classes:
+                # setting attributes on a class can add tests
+                raise _Dynamic
+            self.scan([node])
+
+    def scan(self, nodes):
+        for node in nodes:
+            if node is None:
+                continue
+            for child in ast.walk(node):
+                if (isinstance(child, ast.Call) and
+                    isinstance(child.func, ast.Name) and
+                    child.func.id in _DYNAMIC_CALLS):
+                    raise _Dynamic
+
+    def decoratorName(self, node):
+        """Return the name of the unittest decorator node is, or None."""
+        if isinstance(node, ast.Name):
+            return self.decorators.get(node.id)
+        if (isinstance(node, ast.Attribute) and
+            isinstance(node.value, ast.Name) and
+            node.value.id in self.modules and
+            node.attr in _KNOWN_DECORATORS):
+            return node.attr
+        return None
+
+    def skipReason(self, decorator):
+        """Return (True, reason) for skip decorators, reason is None when it
+        depends on a condition, or (False, None)."""
+        if not isinstance(decorator, ast.Call):
+            return False, None
+        kind = self.decoratorName(decorator.func)
+        if kind not in _SKIP_DECORATORS:
+            return False, None
+        if kind != 'skip' or not decorator.args:
+            return True, None
+        return True, _string(decorator.args[0])
+
+    def base(self, node, cls):
+        if isinstance(node, ast.Name):
+            if node.id in self.testCases:
+                cls.isTest = True
+            elif node.id in self.classes:
+                base = self.classes[node.id]
+                cls.isTest = cls.isTest or base.isTest
+                cls.skip = cls.skip or base.skip
+                cls.methods.update(base.methods)
+            elif node.id in self.imported or not hasattr(builtins, node.id):
+                raise _Dynamic
+        elif (isinstance(node, ast.Attribute) and
+              isinstance(node.value, ast.Name) and
+              node.value.id in self.modules and
+              node.attr.endswith('TestCase')):
+            cls.isTest = True
+        else:
+            raise _Dynamic
+
+    def classDef(self, node):
+        if getattr(node, 'keywords', None) or getattr(node, 'starargs', None):
+            # metaclasses can make up test methods
+            raise _Dynamic
+        cls = _Class()
+        # later bases lose to earlier ones in the MRO
+        for base in reversed(node.bases):
+            self.base(base, cls)
+        for decorator in node.decorator_list:
+            isSkip, reason = self.skipReason(decorator)
+            if not isSkip:
+                raise _Dynamic
+            if reason is not None:
+                cls.skip = reason
+        self.scan(node.decorator_list)
+        for child in node.body:
+            if isinstance(child, _FUNCTIONS):
+                self.scan(child.decorator_list)
+                isTest = (child.name.startswith(self.prefix) or
+                          child.name == 'runTest')
+                skip = None
+                for decorator in child.decorator_list:
+                    if _isParametrize(decorator):
+                        # the cases are only known at run time
+                        raise _Dynamic
+                    isSkip, reason = self.skipReason(decorator)
+                    if isSkip:
+                        if reason is not None:
+                            skip = reason
+                    elif (isTest and
+                          self.decoratorName(decorator) != 'expectedFailure'):
+                        # other decorators may replace the test, even by None
+                        raise _Dynamic
+                cls.methods[child.name] = skip
+            elif isinstance(child, ast.Assign):
+                self.scan([child.value])
+                for target in child.targets:
+                    if not isinstance(target, ast.Name):
+                        raise _Dynamic
+                    if target.id.startswith(self.prefix) or \
+                       target.id == 'runTest':
+                        if type(child.value).__name__ not in _LITERALS:
+                            raise _Dynamic
+                        # a plain value is not callable, so it is no test
+                    cls.methods.pop(target.id, None)
+            elif isinstance(child, (ast.Expr, ast.Pass)) or \
+                 type(child).__name__ == 'AnnAssign':
+                self.scan([child])
+            elif isinstance(child, ast.ClassDef):
+                continue
+            else:
+                raise _Dynamic
+        return cls
+
+
+def collectModule(source, prefix='test', filename='<unknown>'):
+    """Find the test classes of a module from its source.
+
+    Returns a list of (class name, [(method name, skip reason)]) in the
+    order loadTestsFromModule finds the classes, with methods unsorted. The
+    skip reason is None unless the test is unconditionally skipped.
+
+    Returns None if the module has to be imported to know its tests: it
+    defines load_tests, imports test classes, builds classes or methods at
+    import time or does not parse.
+    """
+    try:
+        tree = ast.parse(source, filename)
+    except (SyntaxError, ValueError, TypeError):
+        return None
+    try:
+        return _Collector(prefix).collect(tree)
+    except _Dynamic:
+        return None
@@ -0,0 +1,485 @@
+"""A compact binary stream of test events
+
+Outcomes are written as they happen, as length-prefixed frames after a
+short versioned header. Tests are identified by their id() and errors are
+sent as formatted tracebacks, so neither TestCase objects nor tracebacks
+have to be pickled. The stream can go to a pipe, as in unittest2.parallel,
+or to a file that can be replayed into any TestResult later, even if the run
+that wrote it crashed part way.
+"""
+
+import struct
+import time
+import traceback
+
+import six
+
+from unittest2 import case, result
+
+__unittest = True
+
+
+MAGIC = six.b('U2EV')
+VERSION = 1
+HEADER = MAGIC + struct.pack('>B', VERSION)
+
+# Outcomes of a subtest in an addSubTest event.
+SUBTEST_SUCCESS, SUBTEST_FAILURE, SUBTEST_ERROR = range(3)
+
+# name: (code, fields) where the fields are s for text, o for optional
+# text, f for a float and i for an unsigned int.
+_EVENTS = {
+    'startTest': (1, 'ssof'),
+    'stopTest': (2, 'sf'),
+    'addSuccess': (3, 's'),
+    'addFailure': (4, 'ss'),
+    'addError': (5, 'ss'),
+    'addSkip': (6, 'ss'),
+    'addExpectedFailure': (7, 'ss'),
+    'addUnexpectedSuccess': (8, 's'),
+    'addSubTest': (9, 'sssio'),
+    'chunkDone': (10, 'if'),
+    'addDuration': (11, 'sff'),
+    'startFixture': (12, 's'),
+    'stopFixture': (13, 'sff'),
+}
+_CODES = dict((code, (name, fields))
+              for name, (code, fields) in _EVENTS.items())
+
+_FRAME = struct.Struct('>I')
+_CODE = struct.Struct('>B')
+_LENGTH = struct.Struct('>I')
+_FLOAT = struct.Struct('>d')
+_NONE = 0xFFFFFFFF
+
+
+def _encodeText(value):
+    if isinstance(value, six.binary_type):
+        value = value.decode('utf-8', 'replace')
+    elif not isinstance(value, six.text_type):
+        value = six.text_type(value)
+    data = value.encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+
+def encode(event):
+    """Return the frame for event, a tuple of its name and fields."""
+    code, fields = _EVENTS[event[0]]
+    parts = [_CODE.pack(code)]
+    for kind, value in zip(fields, event[1:]):
+        if kind == 'f':
+            parts.append(_FLOAT.pack(value))
+        elif kind == 'i':
+            parts.append(_LENGTH.pack(value))
+        elif kind == 'o' and value is None:
+            parts.append(_LENGTH.pack(_NONE))
+        else:
+            parts.append(_encodeText(value))
+    payload = six.b('').join(parts)
+    return _FRAME.pack(len(payload)) + payload
+
+
+def decode(payload):
+    """Return the event in the payload of a frame, or None for events this
+    version does not know about."""
+    code = _CODE.unpack_from(payload, 0)[0]
+    if code not in _CODES:
+        return None
+    name, fields = _CODES[code]
+    event = [name]
+    offset = _CODE.size
+    for kind in fields:
+        if kind == 'f':
+            event.append(_FLOAT.unpack_from(payload, offset)[0])
+            offset += _FLOAT.size
+            continue
+        length = _LENGTH.unpack_from(payload, offset)[0]
+        offset += _LENGTH.size
+        if kind == 'i':
+            event.append(length)
+        elif length == _NONE:
+            event.append(None)
+        else:
+            event.append(payload[offset:offset + length].decode('utf-8'))
+            offset += length
+    return tuple(event)
+
+
+class EventWriter(object):
+    """Writes events to a binary file-like object, flushing after each one
+    so nothing is lost if the process dies."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.stream.write(HEADER)
+        self.stream.flush()
+
+    def write(self, event):
+        self.stream.write(encode(event))
+        self.stream.flush()
+
+
+class EventReader(object):
+    """Decodes a stream of events fed to it in arbitrary pieces."""
+
+    def __init__(self):
+        self._buffer = six.b('')
+        self._header = False
+
+    def feed(self, data):
+        """Return the events completed by data."""
+        buf = self._buffer + data
+        offset = 0
+        if not self._header:
+            if len(buf) < len(HEADER):
+                self._buffer = buf
+                return []
+            if buf[:len(MAGIC)] != MAGIC:
+                raise ValueError('not a unittest2 event stream')
+            version = _CODE.unpack_from(buf, len(MAGIC))[0]
+            if version != VERSION:
+                raise ValueError('unsupported event stream version %d'
+                                 % (version,))
+            self._header = True
+            offset = len(HEADER)
+        events = []
+        while len(buf) - offset >= _FRAME.size:
+            length = _FRAME.unpack_from(buf, offset)[0]
+            end = offset + _FRAME.size + length
+            if len(buf) < end:
+                break
+            event = decode(buf[offset + _FRAME.size:end])
+            if event is not None:
+                events.append(event)
+            offset = end
+        self._buffer = buf[offset:]
+        return events
+
+
+def _describe(test):
+    return test.id(), str(test), test.shortDescription()
+
+
+def _durationEvent(name, test, elapsed, cpu):
+    if cpu is None:
+        # not measured, sent as NaN
+        cpu = float('nan')
+    return (name, test.id(), elapsed, cpu)
+
+
+class EventStreamResult(result.TestResult):
+    """A TestResult that writes every outcome to an EventWriter.
+
+    Errors are formatted here, while the traceback is still alive, and
+    only the text is written. Subtests that pass are only written if
+    subTestSuccess is true.
+    """
+
+    def __init__(self, writer, subTestSuccess=False):
+        super(EventStreamResult, self).__init__()
+        self.writer = writer
+        self._started = None
+        self._wantsSubTestSuccess = subTestSuccess
+
+    def startTest(self, test):
+        super(EventStreamResult, self).startTest(test)
+        self._started = time.time()
+        self.writer.write(('startTest',) + _describe(test) + (self._started,))
+
+    def stopTest(self, test):
+        elapsed = time.time() - self._started
+        super(EventStreamResult, self).stopTest(test)
+        self.writer.write(('stopTest', test.id(), elapsed))
+
+    @result.failfast
+    def addError(self, test, err):
+        self.writer.write(('addError', test.id(),
+                           self._exc_info_to_string(err, test)))
+        self._mirrorOutput = True
+
+    @result.failfast
+    def addFailure(self, test, err):
+        self.writer.write(('addFailure', test.id(),
+                           self._exc_info_to_string(err, test)))
+        self._mirrorOutput = True
+
+    def addSubTest(self, test, subtest, err):
+        if err is None:
+            outcome, text = SUBTEST_SUCCESS, None
+        else:
+            if getattr(self, 'failfast', False):
+                self.stop()
+            outcome = SUBTEST_ERROR
+            if issubclass(err[0], test.failureException):
+                outcome = SUBTEST_FAILURE
+            text = self._exc_info_to_string(err, test)
+            self._mirrorOutput = True
+        self.writer.write(('addSubTest', test.id(), subtest.id(),
+                           str(subtest), outcome, text))
+
+    def addSuccess(self, test):
+        self.writer.write(('addSuccess', test.id()))
+
+    def addSkip(self, test, reason):
+        self.writer.write(('addSkip', test.id(), reason))
+
+    def addExpectedFailure(self, test, err):
+        self.writer.write(('addExpectedFailure', test.id(),
+                           self._exc_info_to_string(err, test)))
+
+    @result.failfast
+    def addUnexpectedSuccess(self, test):
+        self.writer.write(('addUnexpectedSuccess', test.id()))
+
+    def addDuration(self, test, elapsed, cpu=None):
+        self.writer.write(_durationEvent('addDuration', test, elapsed, cpu))
+
+    def startFixture(self, fixture):
+        self.writer.write(('startFixture', fixture.id()))
+
+    def stopFixture(self, fixture, elapsed, cpu=None):
+        # the reader's stopFixture adds the duration
+        self.writer.write(_durationEvent('stopFixture', fixture, elapsed,
+                                         cpu))
+
+
+class RecordingResult(object):
+    """Passes everything on to result, and writes the outcomes to an
+    EventWriter as well."""
+
+    def __init__(self, result, writer):
+        object.__setattr__(self, '_result', result)
+        object.__setattr__(self, '_writer', writer)
+        object.__setattr__(self, '_started', None)
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+    def __setattr__(self, name, value):
+        # TestSuite keeps its fixture state on the result
+        setattr(self._result, name, value)
+
+    @property
+    def _wantsSubTestSuccess(self):
+        # subtests that pass are only written if result wants them
+        return case._recordsSubTestSuccess(self._result)
+
+    def _format(self, test, err):
+        exc_info_to_string = getattr(self._result, '_exc_info_to_string',
+                                     None)
+        if exc_info_to_string is not None:
+            return exc_info_to_string(err, test)
+        return ''.join(traceback.format_exception(*err))
+
+    def startTest(self, test):
+        self._result.startTest(test)
+        object.__setattr__(self, '_started', time.time())
+        self._writer.write(('startTest',) + _describe(test) + (self._started,))
+
+    def stopTest(self, test):
+        elapsed = time.time() - self._started
+        self._result.stopTest(test)
+        self._writer.write(('stopTest', test.id(), elapsed))
+
+    def addError(self, test, err):
+        self._result.addError(test, err)
+        self._writer.write(('addError', test.id(), self._format(test, err)))
+
+    def addFailure(self, test, err):
+        self._result.addFailure(test, err)
+        self._writer.write(('addFailure', test.id(), self._format(test, err)))
+
+    def addSubTest(self, test, subtest, err):
+        self._result.addSubTest(test, subtest, err)
+        if err is None:
+            outcome, text = SUBTEST_SUCCESS, None
+        else:
+            outcome = SUBTEST_ERROR
+            if issubclass(err[0], test.failureException):
+                outcome = SUBTEST_FAILURE
+            text = self._format(test, err)
+        self._writer.write(('addSubTest', test.id(), subtest.id(),
+                            str(subtest), outcome, text))
+
+    def addSuccess(self, test):
+        self._result.addSuccess(test)
+        self._writer.write(('addSuccess', test.id()))
+
+    def addSkip(self, test, reason):
+        self._result.addSkip(test, reason)
+        self._writer.write(('addSkip', test.id(), reason))
+
+    def addExpectedFailure(self, test, err):
+        self._result.addExpectedFailure(test, err)
+        self._writer.write(('addExpectedFailure', test.id(),
+                            self._format(test, err)))
+
+    def addUnexpectedSuccess(self, test):
+        self._result.addUnexpectedSuccess(test)
+        self._writer.write(('addUnexpectedSuccess', test.id()))
+
+    def addDuration(self, test, elapsed, cpu=None):
+        addDuration = getattr(self._result, 'addDuration', None)
+        if addDuration is not None:
+            case._callAddDuration(self._result, addDuration, test, elapsed,
+                                  cpu)
+        self._writer.write(_durationEvent('addDuration', test, elapsed, cpu))
+
+    def startFixture(self, fixture):
+        startFixture = getattr(self._result, 'startFixture', None)
+        if startFixture is not None:
+            startFixture(fixture)
+        self._writer.write(('startFixture', fixture.id()))
+
+    def stopFixture(self, fixture, elapsed, cpu=None):
+        stopFixture = getattr(self._result, 'stopFixture', None)
+        if stopFixture is not None:
+            stopFixture(fixture, elapsed, cpu)
+        self._writer.write(_durationEvent('stopFixture', fixture, elapsed,
+                                          cpu))
+
+
+class RemoteTest(object):
+    """
+    Stands in for a test whose events were read from a stream. As far as a
+    TestResult is concerned, this looks exactly like the original test.
+    """
+
+    __slots__ = ('_id', '_description', '_short_description')
+
+    failureException = AssertionError
+
+    def __init__(self, test_id, description=None, short_description=None):
+        self._id = test_id
+        if description is None:
+            description = test_id
+        self._description = description
+        self._short_description = short_description
+
+    def id(self):
+        return self._id
+
+    def shortDescription(self):
+        return self._short_description
+
+    def __str__(self):
+        return self._description
+
+    def __repr__(self):
+        return "<RemoteTest id=%r>" % (self._id,)
+
+    def countTestCases(self):
+        return 1
+
+
+class Replayer(object):
+    """Feeds decoded events into a TestResult.
+
+    The events of a test are held back until it stops, so tests read from
+    several streams at once can be replayed without mixing up their output.
+    If writer is given, the events are written to it as they are replayed.
+    """
+
+    def __init__(self, result, writer=None):
+        self.result = result
+        self.writer = writer
+        self.pending = None
+        self.durations = {}
+
+    def feed(self, event):
+        name = event[0]
+        if name == 'chunkDone':
+            return
+        if name == 'startTest':
+            self.pending = [event]
+        elif self.pending is not None and event[1] == self.pending[0][1]:
+            self.pending.append(event)
+            if name == 'stopTest':
+                pending, self.pending = self.pending, None
+                self._replayTest(pending)
+        else:
+            # an error or timing of a fixture
+            self._replay(RemoteTest(event[1]), event)
+
+    def _replayTest(self, events):
+        test = RemoteTest(*events[0][1:4])
+        for event in events:
+            self._replay(test, event)
+
+    def _replay(self, test, event):
+        if self.writer is not None:
+            self.writer.write(event)
+        name, args = event[0], event[2:]
+        result = self.result
+        if name == 'startTest':
+            result.startTest(test)
+        elif name == 'stopTest':
+            self.durations[test.id()] = args[0]
+            result.stopTest(test)
+        elif name in ('addError', 'addFailure', 'addExpectedFailure'):
+            exctype = Exception
+            if name == 'addFailure':
+                exctype = test.failureException
+            getattr(result, name)(test, (exctype, args[0], None))
+        elif name == 'addSubTest':
+            subtest = RemoteTest(args[0], args[1])
+            outcome, text = args[2], args[3]
+            err = None
+            if outcome == SUBTEST_FAILURE:
+                err = (test.failureException, text, None)
+            elif outcome == SUBTEST_ERROR:
+                err = (Exception, text, None)
+            result.addSubTest(test, subtest, err)
+        elif name == 'addSkip':
+            result.addSkip(test, args[0])
+        elif name == 'addDuration':
+            addDuration = getattr(result, name, None)
+            if addDuration is not None:
+                elapsed, cpu = args
+                case._callAddDuration(result, addDuration, test, elapsed,
+                                      None if cpu != cpu else cpu)
+        elif name in ('startFixture', 'stopFixture'):
+            method = getattr(result, name, None)
+            if method is not None:
+                if args:
+                    elapsed, cpu = args
+                    method(test, elapsed, None if cpu != cpu else cpu)
+                else:
+                    method(test)
+        else:
+            getattr(result, name)(test)
+
+    def interrupted(self, message):
+        """Report that the stream ended part way, with message.
+
+        A test that had started is finished with an error, otherwise the
+        error is reported against a placeholder named 'interrupted'.
+        """
+        if self.pending is None:
+            self._replay(RemoteTest('interrupted'),
+                         ('addError', 'interrupted', message))
+            return
+        pending, self.pending = self.pending, None
+        test_id = pending[0][1]
+        pending.append(('addError', test_id, message))
+        pending.append(('stopTest', test_id, 0.0))
+        self._replayTest(pending)
+
+
+def replay(stream, result, bufsize=65536):
+    """Replay the events read from a binary file-like object into result.
+
+    A test left unfinished at the end of the stream, for example by a run
+    that crashed, is reported as an error.
+    """
+    reader = EventReader()
+    replayer = Replayer(result)
+    while True:
+        data = stream.read(bufsize)
+        if not data:
+            break
+        for event in reader.feed(data):
+            replayer.feed(event)
+    if replayer.pending is not None:
+        replayer.interrupted('the event stream ended before the test did')
+    return result
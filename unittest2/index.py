@@ -0,0 +1,135 @@
+"""A persistent index of the tests found by discovery"""
+
+import json
+import os
+import sys
+
+__unittest = True
+
+
+# Where TestLoader.discoverTestIds keeps its index, relative to the top level
+# directory of the project.
+INDEX_FILE = '.unittest2-index.json'
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+def _sourceFile(module):
+    path = getattr(module, '__file__', None)
+    if not path:
+        return None
+    if path.lower().endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    return os.path.abspath(path)
+
+
+class DiscoveryIndex(object):
+    """Records, per source file visited by discovery, its mtime and size, the
+    test ids found in it and whether it defines load_tests.
+
+    An entry stays valid while the file, and the files defining the base
+    classes of its TestCase classes, keep their mtime and size. Entries are
+    only trusted for files without load_tests, as those build their suites
+    at run time. prefix is the loader's testMethodPrefix, a different one
+    discards the index.
+    """
+
+    version = 1
+
+    def __init__(self, path, prefix='test'):
+        self.path = os.path.abspath(path)
+        self.root = os.path.dirname(self.path)
+        self.prefix = prefix
+        self.entries = {}
+        self.changed = False
+        self.load()
+
+    def load(self):
+        try:
+            f = open(self.path)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return
+        if (not isinstance(data, dict) or
+            data.get('version') != self.version or
+            data.get('prefix') != self.prefix):
+            return
+        self.entries = data.get('files', {})
+
+    def save(self):
+        if not self.changed:
+            return
+        data = {'version': self.version, 'prefix': self.prefix,
+                'files': self.entries}
+        temp = '%s.%d' % (self.path, os.getpid())
+        try:
+            f = open(temp, 'w')
+            try:
+                json.dump(data, f, sort_keys=True)
+            finally:
+                f.close()
+            if os.path.exists(self.path) and os.name == 'nt':
+                os.remove(self.path)
+            os.rename(temp, self.path)
+        except (IOError, OSError):
+            # the index is only an optimisation
+            if os.path.exists(temp):
+                os.remove(temp)
+        self.changed = False
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _path(self, key):
+        return os.path.normpath(os.path.join(self.root, key))
+
+    def lookup(self, path):
+        """Return the entry for the source file at path if it is still
+        valid, otherwise None."""
+        entry = self.entries.get(self._key(path))
+        if entry is None or _stamp(path) != entry['stamp']:
+            return None
+        for dep, stamp in entry['deps'].items():
+            if _stamp(self._path(dep)) != stamp:
+                return None
+        return entry
+
+    def testIds(self, entry):
+        """The ids of the tests in a valid entry, in discovery order."""
+        return ['%s.%s' % (class_id, name)
+                for class_id, names in entry['classes'] for name in names]
+
+    def record(self, path, module, classes):
+        """Record the tests found in module, loaded from the file at path.
+
+        classes is a list of (class, test method names) in discovery order.
+        """
+        from unittest2.util import strclass
+        own = os.path.abspath(path)
+        deps = {}
+        for cls, _ in classes:
+            for base in cls.__mro__:
+                source = _sourceFile(sys.modules.get(base.__module__))
+                if source is None or source == own or \
+                   self._key(source) in deps:
+                    continue
+                stamp = _stamp(source)
+                if stamp is not None:
+                    deps[self._key(source)] = stamp
+        self.entries[self._key(path)] = {
+            'stamp': _stamp(path),
+            'module': module.__name__,
+            'load_tests': hasattr(module, 'load_tests'),
+            'classes': [[strclass(cls), list(names)] for cls, names in classes],
+            'deps': deps,
+        }
+        self.changed = True
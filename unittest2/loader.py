@@ -1,5 +1,6 @@
 """Loading unittests."""
 
+import functools
 import os
 import re
 import sys
@@ -8,9 +9,12 @@ import types
 import unittest
 import warnings
 
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
 
-from unittest2 import case, suite, util
+import six
+
+from unittest2 import case, collect, suite, util
+from unittest2.index import DiscoveryIndex, INDEX_FILE
 from unittest2.compatibility import raise_from
 
 try:
@@ -35,6 +39,12 @@ def _CmpToKey(mycmp):
 # we would need to avoid loading the same tests multiple times
 # from '.py', '.pyc' *and* '.pyo'
 VALID_MODULE_NAME = re.compile(r'[_a-z]\w*\.py$', re.IGNORECASE)
+VALID_PACKAGE_NAME = re.compile(r'[_a-z]\w*$', re.IGNORECASE)
+
+try:
+    _scandir = os.scandir
+except AttributeError:
+    _scandir = None
 
 
 def _make_failed_import_test(name, suiteClass):
@@ -64,11 +74,110 @@ def _make_skipped_test(methodname, exception, suiteClass):
     TestClass = type("ModuleSkipped", (case.TestCase,), attrs)
     return suiteClass((TestClass(methodname),))
 
+def _flatten(test):
+    if isinstance(test, unittest.TestSuite):
+        tests = []
+        for t in test:
+            tests.extend(_flatten(t))
+        return tests
+    return [test]
+
+_compiled_patterns = {}
+_MAXCACHE = 100
+
+def _compile_patterns(patterns):
+    """Compile glob patterns, and regular expressions prefixed with 're:',
+    into one regular expression to match against '/' separated paths.
+
+    Globs without a '/' match the last part of a path, others the whole
+    path. Regular expressions may match anywhere in the path.
+    """
+    if isinstance(patterns, six.string_types):
+        patterns = [patterns]
+    key = tuple(patterns)
+    if key not in _compiled_patterns:
+        if len(_compiled_patterns) >= _MAXCACHE:
+            _compiled_patterns.clear()
+        parts = []
+        for pattern in patterns:
+            if pattern.startswith('re:'):
+                parts.append('.*?(?:%s)' % pattern[3:])
+                continue
+            glob = pattern.replace(os.path.sep, '/').rstrip('/')
+            regex = translate(glob)
+            if regex.endswith('(?ms)'):
+                # Python 2 puts the flags at the end
+                regex = regex[:-5]
+            if '/' not in glob:
+                regex = '(?:.*/)?' + regex
+            parts.append(regex)
+        _compiled_patterns[key] = re.compile(
+            '|'.join('(?:%s)' % part for part in parts), re.S)
+    return _compiled_patterns[key]
+
+
+class _PathEntry(object):
+    """The parts of os.DirEntry discovery uses, for a path found without
+    os.scandir. Nothing is cached."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+
+def _list_dir(path):
+    """Return the entries of a directory sorted by name. With os.scandir
+    the file type usually comes with the listing, without a stat call."""
+    if _scandir is None:
+        return [_PathEntry(os.path.join(path, name))
+                for name in sorted(os.listdir(path))]
+    iterator = _scandir(path)
+    try:
+        entries = list(iterator)
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+    entries.sort(key=lambda entry: entry.name)
+    return entries
+
+def _isParametrized(testCaseClass, name):
+    return hasattr(getattr(testCaseClass, name, None), '__unittest_params__')
+
 def _jython_aware_splitext(path):
     if path.lower().endswith('$py.class'):
         return path[:-9]
     return os.path.splitext(path)[0]
 
+class _ListedTest(object):
+    """Stands in for a test listed from the discovery index or the module
+    source; it has an id but its module was never imported."""
+
+    def __init__(self, test_id, skipReason=None):
+        self._id = test_id
+        self.skipReason = skipReason
+
+    def id(self):
+        return self._id
+
+    def countTestCases(self):
+        return 1
+
+    def __call__(self, result):
+        raise TypeError('%s was listed without importing its module and '
+                        'cannot be run' % self._id)
+
+    def __str__(self):
+        return self._id
+
+    def __repr__(self):
+        return '<_ListedTest %s>' % self._id
 
 
 class TestLoader(unittest.TestLoader):
@@ -79,7 +188,14 @@ class TestLoader(unittest.TestLoader):
     testMethodPrefix = 'test'
     sortTestMethodsUsing = staticmethod(util.three_way_cmp)
     suiteClass = suite.TestSuite
+    # put case.TestHandle objects in suites rather than TestCase instances
+    testHandles = False
     _top_level_dir = None
+    _exclude = _include = None
+    _lazy = False
+    _index_file = None
+    _index = None
+    _static = False
 
     def __init__(self):
         super(TestLoader, self).__init__()
@@ -94,11 +210,25 @@ class TestLoader(unittest.TestLoader):
             raise TypeError("Test cases should not be derived from "
                             "TestSuite. Maybe you meant to derive from "
                             "TestCase?")
+        testCaseNames = self._loadableNames(testCaseClass)
+        if self.testHandles:
+            makeTest = functools.partial(case.TestHandle, testCaseClass)
+        else:
+            makeTest = testCaseClass
+        tests = []
+        for name in testCaseNames:
+            if _isParametrized(testCaseClass, name):
+                # the cases are made as the suite runs
+                tests.append(suite.ParametrizedSuite(testCaseClass, name))
+            else:
+                tests.append(makeTest(name))
+        return self.suiteClass(tests)
+
+    def _loadableNames(self, testCaseClass):
         testCaseNames = self.getTestCaseNames(testCaseClass)
         if not testCaseNames and hasattr(testCaseClass, 'runTest'):
             testCaseNames = ['runTest']
-        loaded_suite = self.suiteClass(map(testCaseClass, testCaseNames))
-        return loaded_suite
+        return testCaseNames
 
     # XXX After Python 3.5, remove backward compatibility hacks for
     # use_load_tests deprecation via *args and **kws.  See issue 16662.
@@ -151,7 +281,10 @@ class TestLoader(unittest.TestLoader):
 
         The method optionally resolves the names relative to a given module.
         """
-        parts = name.split('.')
+        # the id of a parametrized case, in brackets, may contain dots
+        path, bracket, caseId = name.partition('[')
+        parts = path.split('.')
+        parts[-1] += bracket + caseId
         error_case, error_message = None, None
         if module is None:
             parts_copy = parts[:]
@@ -171,7 +304,15 @@ class TestLoader(unittest.TestLoader):
                         return error_case
             parts = parts[1:]
         obj = module
-        for part in parts:
+        for index, part in enumerate(parts):
+            if (index == len(parts) - 1 and part.endswith(']') and
+                isinstance(obj, type) and issubclass(obj, case.TestCase) and
+                not hasattr(obj, part)):
+                # one case of a parametrized test, like test_parse[17]
+                try:
+                    return self.suiteClass([obj(part)])
+                except ValueError:
+                    pass
             try:
                 parent, obj = obj, getattr(obj, part)
             except AttributeError as e:
@@ -198,6 +339,10 @@ class TestLoader(unittest.TestLoader):
             return self.loadTestsFromModule(obj)
         elif isinstance(obj, type) and issubclass(obj, unittest.TestCase):
             return self.loadTestsFromTestCase(obj)
+        elif (isinstance(parent, type) and issubclass(parent, case.TestCase)
+              and _isParametrized(parent, parts[-1])):
+            return self.suiteClass([
+                suite.ParametrizedSuite(parent, parts[-1])])
         elif ((hasattr(types, 'UnboundMethodType')
               and isinstance(obj, types.UnboundMethodType)) and
               isinstance(parent, type) and
@@ -246,7 +391,8 @@ class TestLoader(unittest.TestLoader):
             testFnNames.sort(key=_CmpToKey(self.sortTestMethodsUsing))
         return testFnNames
 
-    def discover(self, start_dir, pattern='test*.py', top_level_dir=None):
+    def discover(self, start_dir, pattern='test*.py', top_level_dir=None,
+                 exclude=None, include=None, lazy=None):
         """Find and return all test modules from the specified start
         directory, recursing into subdirectories to find them and return all
         tests found within them. Only test files that match the pattern will
@@ -273,7 +419,39 @@ class TestLoader(unittest.TestLoader):
 
         Paths are sorted before being imported to ensure reproducible execution
         order even on filesystems with non-alphabetical ordering like ext3/4.
+
+        pattern may also be a list of patterns, test files matching any of
+        them are loaded. exclude and include are lists of globs, or regular
+        expressions prefixed with 're:', matched against paths relative to
+        the top level directory using '/' as separator; globs without a '/'
+        match file and directory names. Excluded directories are not
+        searched at all, and excluded files are not loaded. Files matching
+        an include pattern are loaded even if they don't match pattern.
+
+        If lazy is true, test modules (but not packages) are imported when
+        their suite is first iterated, normally as it starts running, rather
+        than here. Import errors then show up while the tests run.
+
+        Calls from load_tests during discovery use these options unless
+        they pass their own. They are not kept for later calls.
+
+        If the top level directory has a sessionfixtures.py it is imported
+        first. Its setUpSession and tearDownSession, like those of a top
+        level package, run once around all the tests.
         """
+        previous = self._exclude, self._include, self._lazy
+        if lazy is not None:
+            self._lazy = lazy
+        if exclude is not None:
+            self._exclude = _compile_patterns(exclude) if exclude else None
+        if include is not None:
+            self._include = _compile_patterns(include) if include else None
+        try:
+            return self._discover(start_dir, pattern, top_level_dir)
+        finally:
+            self._exclude, self._include, self._lazy = previous
+
+    def _discover(self, start_dir, pattern, top_level_dir):
         set_implicit_top = False
         if top_level_dir is None and self._top_level_dir is not None:
             # make top_level_dir optional if called from load_tests in a package
@@ -291,6 +469,7 @@ class TestLoader(unittest.TestLoader):
             # modules and development versions?
             sys.path.insert(0, top_level_dir)
         self._top_level_dir = top_level_dir
+        sessionErrors = self._importSessionModule(top_level_dir)
 
         is_not_importable = False
         is_namespace = False
@@ -354,8 +533,133 @@ class TestLoader(unittest.TestLoader):
 
         if not is_namespace:
             tests = list(self._find_tests(start_dir, pattern))
+        return self.suiteClass(sessionErrors + tests)
+
+    def _importSessionModule(self, top_level_dir):
+        """Import the session fixtures module in top_level_dir, if there is
+        one. Returns a list with a failing test if it couldn't be."""
+        name = suite.SESSION_MODULE
+        if (self._static or name in sys.modules or
+            not os.path.exists(os.path.join(top_level_dir, name + '.py'))):
+            return []
+        try:
+            __import__(name)
+        except:
+            error_case, error_message = _make_failed_import_test(
+                name, self.suiteClass)
+            self.errors.append(error_message)
+            return [error_case]
+        return []
+
+    def discoverTestIds(self, start_dir, pattern='test*.py',
+                        top_level_dir=None, index_file=INDEX_FILE,
+                        exclude=None, include=None):
+        """Return the ids of the tests discover() would find, in the same
+        order, for runs that only list or select tests.
+
+        Each module's classes and test names are kept in an index at
+        index_file (relative to the top level directory), keyed by the mtime
+        and size of the file. Modules whose entry is still valid are not
+        imported; modules that define load_tests always are. Pass
+        index_file=None to import everything.
+        """
+        return [test.id() for test in self._list_tests(
+            start_dir, pattern, top_level_dir, index_file, False,
+            exclude, include)]
+
+    def collectTests(self, start_dir, pattern='test*.py', top_level_dir=None,
+                     index_file=INDEX_FILE, exclude=None, include=None):
+        """Like discoverTestIds, but test modules are parsed rather than
+        imported to find their TestCase classes and test methods, so module
+        level code is not run.
+
+        Returns the tests in discovery order, as stand-ins that have an id()
+        and a skipReason (None unless the test is unconditionally skipped)
+        but cannot be run. Modules that define load_tests, import test
+        classes or build tests at import time are imported as usual, and
+        their real tests returned.
+        """
+        return self._list_tests(start_dir, pattern, top_level_dir,
+                                index_file, True, exclude, include)
+
+    def _list_tests(self, start_dir, pattern, top_level_dir, index_file,
+                    static, exclude, include):
+        self._index_file = index_file
+        self._static = static
+        try:
+            tests = self.discover(start_dir, pattern, top_level_dir,
+                                  exclude, include)
+            if self._index is not None:
+                self._index.save()
+        finally:
+            self._index_file = None
+            self._index = None
+            self._static = False
+        return _flatten(tests)
+
+    def _get_index(self):
+        if self._index_file is None:
+            return None
+        if self._index is None:
+            self._index = DiscoveryIndex(
+                os.path.join(self._top_level_dir, self._index_file),
+                self.testMethodPrefix)
+        return self._index
+
+    def _listed(self, source, name):
+        if self._static:
+            tests = self._from_source(source, name)
+            if tests is not None:
+                return tests
+        return self._from_index(source, name)
+
+    def _from_source(self, source, name):
+        try:
+            f = open(source, 'rb')
+            try:
+                text = f.read()
+            finally:
+                f.close()
+        except (IOError, OSError):
+            return None
+        found = collect.collectModule(text, self.testMethodPrefix, source)
+        if found is None:
+            return None
+        tests = []
+        for class_name, methods in found:
+            if self.sortTestMethodsUsing:
+                methods.sort(key=_CmpToKey(
+                    lambda a, b: self.sortTestMethodsUsing(a[0], b[0])))
+            for method, reason in methods:
+                tests.append(_ListedTest(
+                    '%s.%s.%s' % (name, class_name, method), reason))
         return self.suiteClass(tests)
 
+    def _from_index(self, source, name):
+        index = self._get_index()
+        if index is None:
+            return None
+        entry = index.lookup(source)
+        if entry is None or entry['load_tests'] or entry['module'] != name:
+            return None
+        return self.suiteClass(
+            [_ListedTest(test_id) for test_id in index.testIds(entry)])
+
+    def _record_in_index(self, source, module):
+        index = self._get_index()
+        if index is None:
+            return
+        classes = []
+        for name in dir(module):
+            obj = getattr(module, name)
+            if isinstance(obj, type) and issubclass(obj, unittest.TestCase):
+                names = self._loadableNames(obj)
+                if any(_isParametrized(obj, name) for name in names):
+                    # the cases can change without the module changing
+                    return
+                classes.append((obj, names))
+        index.record(source, module, classes)
+
     def _get_directory_containing_module(self, module_name):
         module = sys.modules[module_name]
         full_path = os.path.abspath(module.__file__)
@@ -386,12 +690,15 @@ class TestLoader(unittest.TestLoader):
 
     def _match_path(self, path, full_path, pattern):
         # override this method to use alternative matching strategy
-        return fnmatch(path, pattern)
+        if isinstance(pattern, six.string_types):
+            return fnmatch(path, pattern)
+        return _compile_patterns(pattern).match(path) is not None
 
-    def _find_tests(self, start_dir, pattern, namespace=False):
+    def _find_tests(self, start_dir, pattern, namespace=False, name=None):
         """Used by discovery. Yields test suites it loads."""
         # Handle the __init__ in this package
-        name = self._get_name_from_path(start_dir)
+        if name is None:
+            name = self._get_name_from_path(start_dir)
         # name is '.' when start_dir == top_level_dir (and top_level_dir is by
         # definition not a package).
         if name != '.' and name not in self._loading_packages:
@@ -405,76 +712,122 @@ class TestLoader(unittest.TestLoader):
                 # Either an error occured, or load_tests was used by the
                 # package.
                 return
-        # Handle the contents.
-        paths = sorted(os.listdir(start_dir))
-        for path in paths:
-            full_path = os.path.join(start_dir, path)
+        # Handle the contents. Names of the entries are derived from the name
+        # of this directory rather than from their paths.
+        exclude = self._exclude
+        prefix = '' if name == '.' else name.replace('.', '/') + '/'
+        for entry in _list_dir(start_dir):
+            if exclude is not None and exclude.match(prefix + entry.name):
+                continue
+            full_path = entry.path
+            entry_name = _jython_aware_splitext(entry.name)
+            if name != '.':
+                entry_name = name + '.' + entry_name
             tests, should_recurse = self._find_test_path(
-                full_path, pattern, namespace)
+                full_path, pattern, namespace, entry, entry_name)
             if tests is not None:
                 yield tests
             if should_recurse:
                 # we found a package that didn't use load_tests.
-                name = self._get_name_from_path(full_path)
-                self._loading_packages.add(name)
+                self._loading_packages.add(entry_name)
                 try:
-                    path_tests = self._find_tests(full_path, pattern, namespace)
+                    path_tests = self._find_tests(full_path, pattern, namespace,
+                                                  entry_name)
                     for test in path_tests:
                         yield test
                 finally:
-                    self._loading_packages.discard(name)
-
-    def _find_test_path(self, full_path, pattern, namespace=False):
+                    self._loading_packages.discard(entry_name)
+
+    def _load_tests_from_file(self, full_path, name, pattern):
+        try:
+            module = self._get_module_from_name(name)
+        except case.SkipTest as e:
+            return _make_skipped_test(name, e, self.suiteClass)
+        except:
+            error_case, error_message = \
+                _make_failed_import_test(name, self.suiteClass)
+            self.errors.append(error_message)
+            return error_case
+        mod_file = os.path.abspath(getattr(module, '__file__', full_path))
+        # resolving links is only needed if the paths differ
+        if (_jython_aware_splitext(mod_file).lower() !=
+            _jython_aware_splitext(full_path).lower()):
+            realpath = _jython_aware_splitext(os.path.realpath(mod_file))
+            fullpath_noext = _jython_aware_splitext(
+                os.path.realpath(full_path))
+            if realpath.lower() != fullpath_noext.lower():
+                module_dir = os.path.dirname(realpath)
+                mod_name = _jython_aware_splitext(os.path.basename(full_path))
+                expected_dir = os.path.dirname(full_path)
+                msg = ("%r module incorrectly imported from %r. Expected "
+                       "%r. Is this module globally installed?")
+                raise ImportError(msg % (mod_name, module_dir, expected_dir))
+        self._record_in_index(full_path, module)
+        return self.loadTestsFromModule(module, pattern=pattern)
+
+    def _load_lazily(self, full_path, name, pattern):
+        # runs from inside the test run, so report errors as tests
+        try:
+            return self._load_tests_from_file(full_path, name, pattern)
+        except ImportError as e:
+            error_case, error_message = _make_failed_test(
+                'ModuleImportFailure', name, e, self.suiteClass, str(e))
+            self.errors.append(error_message)
+            return error_case
+
+    def _find_test_path(self, full_path, pattern, namespace=False, entry=None,
+                        name=None):
         """Used by discovery.
 
         Loads tests from a single file, or a directories' __init__.py when
-        passed the directory.
+        passed the directory. entry is the os.DirEntry for full_path if the
+        caller has one and name its module name if known.
 
         Returns a tuple (None_or_tests_from_file, should_recurse).
         """
-        basename = os.path.basename(full_path)
-        if os.path.isfile(full_path):
+        if entry is None:
+            entry = _PathEntry(full_path)
+        basename = entry.name
+        if entry.is_file():
             if not VALID_MODULE_NAME.match(basename):
                 # valid Python identifiers only
                 return None, False
             if not self._match_path(basename, full_path, pattern):
-                return None, False
+                if self._include is None:
+                    return None, False
+                if name is None:
+                    name = self._get_name_from_path(full_path)
+                if not self._include.match(
+                        name.replace('.', '/') + os.path.splitext(basename)[1]):
+                    return None, False
             # if the test file matches, load it
-            name = self._get_name_from_path(full_path)
-            try:
-                module = self._get_module_from_name(name)
-            except case.SkipTest as e:
-                return _make_skipped_test(name, e, self.suiteClass), False
-            except:
-                error_case, error_message = \
-                    _make_failed_import_test(name, self.suiteClass)
-                self.errors.append(error_message)
-                return error_case, False
-            else:
-                mod_file = os.path.abspath(
-                    getattr(module, '__file__', full_path))
-                realpath = _jython_aware_splitext(
-                    os.path.realpath(mod_file))
-                fullpath_noext = _jython_aware_splitext(
-                    os.path.realpath(full_path))
-                if realpath.lower() != fullpath_noext.lower():
-                    module_dir = os.path.dirname(realpath)
-                    mod_name = _jython_aware_splitext(
-                        os.path.basename(full_path))
-                    expected_dir = os.path.dirname(full_path)
-                    msg = ("%r module incorrectly imported from %r. Expected "
-                           "%r. Is this module globally installed?")
-                    raise ImportError(
-                        msg % (mod_name, module_dir, expected_dir))
-                return self.loadTestsFromModule(module, pattern=pattern), False
-        elif os.path.isdir(full_path):
+            if name is None:
+                name = self._get_name_from_path(full_path)
+            tests = self._listed(full_path, name)
+            if tests is not None:
+                return tests, False
+            if self._lazy and self._index_file is None and not self._static:
+                load = functools.partial(self._load_lazily, full_path, name,
+                                         pattern)
+                return suite.LazySuite(load, name), False
+            return self._load_tests_from_file(full_path, name, pattern), False
+        elif entry.is_dir():
+            if not VALID_PACKAGE_NAME.match(basename):
+                # can't be imported, so don't look for an __init__.py
+                return None, False
             if (not namespace and
                 not os.path.isfile(os.path.join(full_path, '__init__.py'))):
                 return None, False
 
             load_tests = None
             tests = None
-            name = self._get_name_from_path(full_path)
+            if name is None:
+                name = self._get_name_from_path(full_path)
+            init_file = os.path.join(full_path, '__init__.py')
+            if not namespace:
+                tests = self._listed(init_file, name)
+                if tests is not None:
+                    return tests, True
             try:
                 package = self._get_module_from_name(name)
             except case.SkipTest as e:
@@ -486,6 +839,8 @@ class TestLoader(unittest.TestLoader):
                 return error_case, False
             else:
                 load_tests = getattr(package, 'load_tests', None)
+                if not namespace:
+                    self._record_in_index(init_file, package)
                 # Mark this package as being in load_tests (possibly ;))
                 self._loading_packages.add(name)
                 try:
@@ -7,7 +7,7 @@ import types
 
 import six
 
-from unittest2 import loader, runner
+from unittest2 import loader, parallel, runner
 try:
     from unittest2.signals import installHandler
 except ImportError:
@@ -59,14 +59,19 @@ class TestProgram(object):
     # defaults for testing
     module=None
     verbosity = 1
-    failfast = catchbreak = buffer = progName = None
+    failfast = catchbreak = buffer = progName = workers = None
+    preload = collect_only = lazy = group_fixtures = False
+    event_log = exclude = include = durations = durations_file = None
     _discovery_parser = None
+    _collect_errors = ()
 
     def __init__(self, module='__main__', defaultTest=None,
                  argv=None, testRunner=None,
                  testLoader=loader.defaultTestLoader, exit=True,
                  verbosity=1, failfast=None, catchbreak=None, buffer=None,
-                 tb_locals=False):
+                 tb_locals=False, workers=None, preload=False,
+                 event_log=None, durations=None, group_fixtures=False,
+                 durations_file=None):
         if isinstance(module, six.string_types):
             self.module = __import__(module)
             for part in module.split('.')[1:]:
@@ -82,6 +87,12 @@ class TestProgram(object):
         self.catchbreak = catchbreak
         self.buffer = buffer
         self.tb_locals = tb_locals
+        self.workers = workers
+        self.preload = preload
+        self.event_log = event_log
+        self.durations = durations
+        self.group_fixtures = group_fixtures
+        self.durations_file = durations_file
         self.defaultTest = defaultTest
         self.testRunner = testRunner
         self.testLoader = testLoader
@@ -158,6 +169,29 @@ class TestProgram(object):
         parser.add_argument('--locals', dest='tb_locals',
                             action='store_true',
                             help='Show local variables in tracebacks')
+        parser.add_argument('-j', '--workers', dest='workers', type=int,
+                            help='Run tests in N worker processes')
+        parser.add_argument('--durations-file', dest='durations_file',
+                            metavar='FILE', nargs='?',
+                            const=parallel.DURATIONS_FILE,
+                            help='Balance worker processes using the test '
+                                 'durations kept in FILE by earlier runs '
+                                 '(default %s)' % parallel.DURATIONS_FILE)
+        parser.add_argument('--preload', dest='preload', action='store_true',
+                            help='Import the modules the tests import before '
+                                 'starting worker processes')
+        parser.add_argument('--event-log', dest='event_log', metavar='FILE',
+                            help='Also write the outcomes to FILE as they '
+                                 'happen, for replaying later')
+        parser.add_argument('--durations', dest='durations', type=int,
+                            metavar='N',
+                            help='Show the N slowest tests and fixtures '
+                                 '(N=0 for all)')
+        parser.add_argument('--group-fixtures', dest='group_fixtures',
+                            action='store_true',
+                            help='Reorder the tests so that fixtures and '
+                                 'resources are set up as few times as '
+                                 'possible')
         if self.failfast is None:
             parser.add_argument('-f', '--failfast', dest='failfast',
                                 action='store_true',
@@ -201,6 +235,23 @@ class TestProgram(object):
         parser.add_argument('-t', '--top-level-directory', dest='top',
                             help='Top level directory of project (defaults to '
                                  'start directory)')
+        parser.add_argument('--exclude', dest='exclude', action='append',
+                            metavar='PATTERN',
+                            help='Skip files and directories matching '
+                                 'PATTERN, a glob or a regular expression '
+                                 "prefixed with 're:' (can be repeated)")
+        parser.add_argument('--include', dest='include', action='append',
+                            metavar='PATTERN',
+                            help='Also load test files matching PATTERN '
+                                 '(can be repeated)')
+        parser.add_argument('--lazy', dest='lazy', action='store_true',
+                            help='Import each test module just before its '
+                                 'tests run')
+        parser.add_argument('--collect-only', dest='collect_only',
+                            action='store_true',
+                            help='Print the ids of the tests found, reading '
+                                 'test modules instead of importing them '
+                                 'where possible')
         for arg in ('start', 'pattern', 'top'):
             parser.add_argument(arg, nargs='?',
                                 default=argparse.SUPPRESS,
@@ -220,22 +271,74 @@ class TestProgram(object):
             self._discovery_parser.parse_args(argv, self)
 
         loader = self.testLoader if Loader is None else Loader()
-        self.test = loader.discover(self.start, self.pattern, self.top)
+        # only pass the filters when used, so loaders that predate them work
+        filters = {}
+        if self.exclude:
+            filters['exclude'] = self.exclude
+        if self.include:
+            filters['include'] = self.include
+        if self.lazy and not self.collect_only:
+            filters['lazy'] = True
+        if self.collect_only:
+            self.test = loader.collectTests(self.start, self.pattern, self.top,
+                                            **filters)
+            self._collect_errors = list(getattr(loader, 'errors', ()))
+        else:
+            self.test = loader.discover(self.start, self.pattern, self.top,
+                                        **filters)
+
+    def _printCollected(self):
+        for test in self.test:
+            reason = getattr(test, 'skipReason', None)
+            if reason is not None and self.verbosity > 1:
+                print('%s (skipped: %s)' % (test.id(), reason))
+            else:
+                print(test.id())
+        for error in self._collect_errors:
+            sys.stderr.write(error + '\n')
+        if self.exit:
+            sys.exit(bool(self._collect_errors))
 
     def runTests(self):
+        if self.collect_only:
+            self._printCollected()
+            return
         if self.catchbreak:
             installHandler()
         if self.testRunner is None:
             self.testRunner = runner.TextTestRunner
         if isinstance(self.testRunner, six.class_types):
+            # only pass newer options when used, so runners that predate
+            # them keep working
+            options = {}
+            if self.workers is not None:
+                options['workers'] = self.workers
+            if self.durations_file is not None:
+                options['durations_file'] = self.durations_file
+            if self.preload:
+                options['preload'] = True
+            if self.event_log is not None:
+                options['event_log'] = self.event_log
+            if self.durations is not None:
+                options['durations'] = self.durations
+            if self.group_fixtures:
+                options['group_fixtures'] = True
             try:
                 try:
                     testRunner = self.testRunner(verbosity=self.verbosity,
                                                  failfast=self.failfast,
                                                  buffer=self.buffer,
-                                                 tb_locals=self.tb_locals)
+                                                 tb_locals=self.tb_locals,
+                                                 **options)
                 except TypeError:
-                    # didn't accept the tb_locals argument
+                    # didn't accept the tb_locals argument, or a newer one
+                    if self.tb_locals:
+                        options['tb_locals'] = True
+                    if options:
+                        # rather than run without what was asked for
+                        self.usageExit('%s does not accept: %s' % (
+                            self.testRunner.__name__,
+                            ', '.join(sorted(options))))
                     testRunner = self.testRunner(verbosity=self.verbosity,
                                                  failfast=self.failfast,
                                                  buffer=self.buffer)
@@ -0,0 +1,488 @@
+"""Running a test suite in several worker processes"""
+
+import ast
+import collections
+import errno
+import gc
+import json
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+
+import six
+
+from unittest2 import case, events, suite, util
+from unittest2.result import TestResult
+
+try:
+    from unittest2.signals import interruptOnTerminate, registerResult
+except ImportError:
+    def interruptOnTerminate():
+        pass
+    def registerResult(_):
+        pass
+
+__unittest = True
+
+
+# Where --durations-file keeps durations between parallel runs if no file
+# is named, relative to the current directory.
+DURATIONS_FILE = '.unittest2-durations.json'
+
+
+def canFork():
+    """Whether this platform can run tests in forked worker processes."""
+    return hasattr(os, 'fork')
+
+
+def _flatten(test, tests):
+    # a parametrized suite is kept whole, so its tests are only made in the
+    # worker that runs it
+    if suite._isnotsuite(test) or isinstance(test, suite.ParametrizedSuite):
+        tests.append(test)
+    else:
+        for child in test:
+            _flatten(child, tests)
+    return tests
+
+
+def _class(test):
+    return suite._testClass(test)
+
+
+def _findChunks(test):
+    """Split a suite into fixture-safe chunks.
+
+    A chunk is a run of consecutive tests from the same class, so that a
+    chunk never needs setUpClass or setUpModule more than once. The chunks
+    are returned in the order the tests would run serially.
+    """
+    chunks = []
+    previousClass = None
+    for each in _flatten(test, []):
+        if not chunks or _class(each) is not previousClass:
+            chunks.append([])
+        chunks[-1].append(each)
+        previousClass = _class(each)
+    return chunks
+
+
+def _hasClassFixtures(cls):
+    return (suite._hasFixture(cls, 'setUpClass') or
+            suite._hasFixture(cls, 'tearDownClass'))
+
+
+def _splitLarge(chunks, estimates, workers):
+    """Split chunks much bigger than the average share of a worker.
+
+    Only classes without setUpClass or tearDownClass are split, as the
+    pieces may end up in different workers.
+    """
+    target = sum(estimates) / (workers * 4.0)
+    new_chunks, new_estimates = [], []
+    for chunk, estimate in zip(chunks, estimates):
+        pieces = 1
+        if (target > 0 and estimate > target and
+            not _hasClassFixtures(_class(chunk[0]))):
+            pieces = min(len(chunk), int(estimate / target) + 1)
+        size = -(-len(chunk) // pieces)
+        for start in range(0, len(chunk), size):
+            piece = chunk[start:start + size]
+            new_chunks.append(piece)
+            new_estimates.append(estimate * len(piece) / len(chunk))
+    return new_chunks, new_estimates
+
+
+def _importsOf(module):
+    """Names of the modules imported anywhere in the source of module."""
+    path = getattr(module, '__file__', None)
+    if not path:
+        return []
+    if path.lower().endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    try:
+        f = open(path)
+        try:
+            tree = ast.parse(f.read(), path)
+        finally:
+            f.close()
+    except (IOError, OSError, SyntaxError, ValueError, TypeError):
+        return []
+    package = module.__name__
+    if not hasattr(module, '__path__'):
+        package = package.rpartition('.')[0]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if not node.level:
+                names.append(node.module)
+                continue
+            parts = package.split('.')
+            if node.level > 1:
+                parts = parts[:-(node.level - 1)]
+            if node.module:
+                parts.append(node.module)
+            names.append('.'.join(parts))
+    return [name for name in names if name]
+
+
+def preload(test, modules=True):
+    """Import modules in this process, so workers forked from it later share
+    them copy-on-write instead of each importing them again.
+
+    modules is a sequence of module names, or True for every module imported
+    by the modules the tests in test come from, including imports inside
+    functions. Modules that fail to import are left to the workers.
+    """
+    if modules is True:
+        names = set()
+        for name in set(_class(each).__module__
+                        for each in _flatten(test, [])):
+            if name in sys.modules:
+                names.update(_importsOf(sys.modules[name]))
+        modules = sorted(names)
+    for name in modules:
+        if name in sys.modules:
+            continue
+        try:
+            __import__(name)
+        except Exception:
+            pass
+
+
+class DurationStore(object):
+    """Durations recorded on earlier runs, kept in a small JSON file.
+
+    tests maps TestCase.id() to the seconds the test took. classes maps a
+    class name to the time its chunk took on top of its tests, which is
+    mostly setUpClass and tearDownClass.
+    """
+
+    version = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        self.classes = {}
+        self.load()
+
+    def load(self):
+        try:
+            f = open(self.path)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            # missing or corrupt: start again
+            return
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return
+        self.tests.update(data.get('tests', {}))
+        self.classes.update(data.get('classes', {}))
+
+    def save(self):
+        data = {'version': self.version,
+                'tests': self.tests, 'classes': self.classes}
+        temp = '%s.%d' % (self.path, os.getpid())
+        try:
+            f = open(temp, 'w')
+            try:
+                json.dump(data, f, sort_keys=True)
+            finally:
+                f.close()
+            if os.path.exists(self.path) and os.name == 'nt':
+                os.remove(self.path)
+            os.rename(temp, self.path)
+        except (IOError, OSError):
+            # the store is only an optimisation
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def estimate(self, chunks):
+        """Return the expected cost of each chunk.
+
+        Tests that have not been seen before count as the mean duration of
+        the ones that have, so with an empty store this is the test count.
+        """
+        known = [d for d in self.tests.values() if d > 0]
+        default = known and sum(known) / len(known) or 1.0
+        estimates = []
+        for chunk in chunks:
+            cost = self.classes.get(util.strclass(_class(chunk[0])), 0.0)
+            for test in chunk:
+                if isinstance(test, suite.ParametrizedSuite):
+                    # its time is recorded with its class, see record()
+                    cost += default
+                else:
+                    cost += self.tests.get(test.id(), default)
+            estimates.append(cost)
+        return estimates
+
+    def record(self, chunk, elapsed, durations):
+        """Record a chunk that took elapsed seconds, given the durations of
+        its tests. The time of a parametrized suite is counted with its
+        class, rather than keeping the duration of each of its tests."""
+        overhead = elapsed
+        for test in chunk:
+            if isinstance(test, suite.ParametrizedSuite):
+                continue
+            test_id = test.id()
+            if test_id in durations:
+                self.tests[test_id] = durations[test_id]
+                overhead -= durations[test_id]
+        self.classes[util.strclass(_class(chunk[0]))] = max(overhead, 0.0)
+
+
+def _module(chunk):
+    return _class(chunk[0]).__module__
+
+
+class _Queue(object):
+    """Chunks waiting for a worker, longest first.
+
+    A worker is offered more chunks from the module it is already in while
+    there are any, so setUpModule is not repeated needlessly.
+    """
+
+    def __init__(self, chunks, estimates):
+        order = sorted(range(len(chunks)), key=lambda i: -estimates[i])
+        self._order = collections.deque(order)
+        self._byModule = {}
+        for index in order:
+            self._byModule.setdefault(
+                _module(chunks[index]), collections.deque()).append(index)
+        self._taken = set()
+
+    def _pop(self, queue):
+        while queue:
+            index = queue.popleft()
+            if index not in self._taken:
+                self._taken.add(index)
+                return index
+        return None
+
+    def take(self, module=None):
+        """Return the index of the next chunk to run, or None when done."""
+        index = self._pop(self._byModule.get(module))
+        if index is None:
+            index = self._pop(self._order)
+        return index
+
+
+def _runWorker(chunks, tasks, stream, parent_result):
+    writer = events.EventWriter(stream)
+    worker_result = events.EventStreamResult(
+        writer, case._recordsSubTestSuccess(parent_result))
+    worker_result.failfast = getattr(parent_result, 'failfast', False)
+    worker_result.buffer = getattr(parent_result, 'buffer', False)
+    worker_result.tb_locals = getattr(parent_result, 'tb_locals', False)
+    registerResult(worker_result)
+    # Run the chunks one by one as the parent hands them out, as parts of a
+    # single run so class and module fixtures carry over between chunks.
+    worker_result._testRunEntered = True
+    top = suite.TestSuite()
+    # session fixtures are set up once in each worker, and torn down even
+    # when the parent terminates it
+    interruptOnTerminate()
+    try:
+        for line in iter(tasks.readline, six.b('')):
+            if worker_result.shouldStop:
+                break
+            index = int(line)
+            started = time.time()
+            suite.TestSuite(chunks[index])(worker_result)
+            writer.write(('chunkDone', index, time.time() - started))
+        top._tearDownPreviousClass(None, worker_result)
+        top._handleModuleTearDown(worker_result)
+        top._releaseResources(worker_result)
+    except:
+        # stopped, most likely by the parent, which no longer reads the
+        # events: tear the sessions down without reporting to it
+        quiet = TestResult()
+        quiet._sessions = getattr(worker_result, '_sessions', None)
+        top._tearDownSessions(quiet)
+        for fixture, error in quiet.errors:
+            sys.stderr.write('%s\n%s' % (fixture, error))
+        raise
+    top._tearDownSessions(worker_result)
+
+
+class _Worker(object):
+    """The parent's end of a worker process."""
+
+    def __init__(self, chunks, parent_result, others, writer=None):
+        task_read, task_write = os.pipe()
+        event_read, event_write = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                # the pipes of other workers must not be kept open here
+                for other in others:
+                    other.tasks.close()
+                    os.close(other.fd)
+                os.close(task_write)
+                os.close(event_read)
+                tasks = os.fdopen(task_read, 'rb')
+                stream = os.fdopen(event_write, 'wb')
+                _runWorker(chunks, tasks, stream, parent_result)
+                stream.close()
+                status = 0
+            except KeyboardInterrupt:
+                # terminated by the parent, or Ctrl-C, which it also gets
+                pass
+            except:
+                # unless the parent stopped reading, having terminated it
+                if getattr(sys.exc_info()[1], 'errno', None) != errno.EPIPE:
+                    traceback.print_exc()
+            finally:
+                os._exit(status)
+        os.close(task_read)
+        os.close(event_write)
+        self.pid = pid
+        self.fd = event_read
+        self.tasks = os.fdopen(task_write, 'wb')
+        self.replayer = events.Replayer(parent_result, writer)
+        self.reader = events.EventReader()
+        self.chunk = None
+
+    def assign(self, index):
+        self.chunk = index
+        if index is None:
+            self.tasks.close()
+        else:
+            self.tasks.write(six.b('%d\n' % index))
+            self.tasks.flush()
+
+    def read(self):
+        """Return the events that have fully arrived, or None at the end."""
+        data = os.read(self.fd, 65536)
+        if not data:
+            return None
+        return self.reader.feed(data)
+
+    def close(self, kill=False):
+        if not self.tasks.closed:
+            self.tasks.close()
+        os.close(self.fd)
+        if kill:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except OSError:
+                pass
+        return _exitStatus(os.waitpid(self.pid, 0)[1])
+
+
+def _exitStatus(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _select(fds):
+    while True:
+        try:
+            return select.select(fds, [], [])[0]
+        except (select.error, OSError):
+            # retry if interrupted by a signal, e.g. the -c handler
+            if sys.exc_info()[1].args[0] != errno.EINTR:
+                raise
+
+
+def runTests(test, result, workers, durations_file=None, preload_modules=None,
+             writer=None):
+    """Run test, a TestCase or TestSuite, in at most workers processes.
+
+    The suite is split into chunks of consecutive tests from one class, so
+    setUpClass and setUpModule run once in each worker that gets tests from
+    that class or module. Large chunks from classes without class fixtures
+    are split further. Idle workers take the next chunk from a shared
+    queue, longest first, and outcomes are replayed into result as each
+    test finishes. result ends up with the same counts, failures and skips
+    as a serial run.
+
+    If durations_file is given, chunk sizes are estimated from the durations
+    recorded there by earlier runs, and the file is updated with the
+    durations of this run. Otherwise every test counts the same.
+
+    preload_modules is passed to preload() before the workers are forked.
+    If writer, an events.EventWriter, is given the events are also written to
+    it in the order they are replayed.
+
+    Falls back to running in this process if fork is not available.
+    """
+    chunks = _findChunks(test)
+    workers = min(workers, len(chunks))
+    if workers < 2 or not canFork():
+        if writer is not None:
+            test(events.RecordingResult(result, writer))
+        else:
+            test(result)
+        return result
+
+    store = None
+    if durations_file is not None:
+        store = DurationStore(durations_file)
+        estimates = store.estimate(chunks)
+    else:
+        estimates = [len(chunk) for chunk in chunks]
+    chunks, estimates = _splitLarge(chunks, estimates, workers)
+    queue = _Queue(chunks, estimates)
+
+    if preload_modules:
+        preload(test, preload_modules)
+    running = {}
+    try:
+        # Keep the collector off the objects the workers inherit, or it
+        # would write to, and so copy, every page of them in each worker.
+        frozen = hasattr(gc, 'freeze')
+        if frozen:
+            gc.collect()
+            gc.freeze()
+        try:
+            for _ in range(workers):
+                worker = _Worker(chunks, result, list(running.values()),
+                                 writer)
+                running[worker.fd] = worker
+                worker.assign(queue.take())
+        finally:
+            if frozen:
+                gc.unfreeze()
+        while running and not result.shouldStop:
+            for fd in _select(list(running)):
+                worker = running[fd]
+                received = worker.read()
+                if received is None:
+                    del running[fd]
+                    status = worker.close()
+                    if status != 0:
+                        worker.replayer.interrupted(
+                            'worker process exited with status %d, the rest '
+                            'of its chunk was not run' % (status,))
+                    continue
+                for event in received:
+                    if event[0] != 'chunkDone':
+                        worker.replayer.feed(event)
+                        continue
+                    if store is not None:
+                        store.record(chunks[event[1]], event[2],
+                                     worker.replayer.durations)
+                    if result.shouldStop:
+                        worker.assign(None)
+                    else:
+                        worker.assign(queue.take(_module(chunks[event[1]])))
+    finally:
+        # stopped early: failfast, an interrupt or an error in this process
+        for worker in running.values():
+            worker.close(kill=True)
+    if store is not None:
+        store.save()
+    return result
@@ -1,8 +1,10 @@
 """Test result object"""
 
+import linecache
 import sys
 import unittest
 
+import six
 from six.moves import StringIO
 import traceback2 as traceback
 
@@ -23,6 +25,52 @@ def failfast(method):
 STDOUT_LINE = '\nStdout:\n%s'
 STDERR_LINE = '\nStderr:\n%s'
 
+
+def _frames(tb, limit):
+    """The code and line number of each frame of tb, in one flat tuple."""
+    if limit is None:
+        limit = getattr(sys, 'tracebacklimit', None)
+    frames = []
+    while tb is not None and (limit is None or len(frames) < 2 * limit):
+        frames.append(tb.tb_frame.f_code)
+        frames.append(tb.tb_lineno)
+        tb = tb.tb_next
+    return tuple(frames)
+
+
+class _Traceback(object):
+    """The traceback of an error, formatted when str() is first called.
+
+    Until then it holds the exception as a TracebackException without its
+    stack, the code and line number of each frame and the output captured
+    with it.
+    """
+
+    __slots__ = ('_summary', '_frames', '_output', '_text')
+
+    def __init__(self, summary, frames, output):
+        self._summary = summary
+        self._frames = frames
+        self._output = output
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            summary = self._summary
+            frames = self._frames
+            if frames:
+                stack = [(code.co_filename, lineno, code.co_name, None)
+                         for code, lineno in zip(frames[::2], frames[1::2])]
+                for filename in set(frame[0] for frame in stack):
+                    linecache.checkcache(filename)
+                summary.stack = traceback.StackSummary.from_list(stack)
+            lines = list(summary.format())
+            lines.extend(self._output)
+            self._text = ''.join(lines)
+            self._summary = self._frames = self._output = None
+        return self._text
+
+
 class TestResult(unittest.TestResult):
     """Holder for test result information.
 
@@ -32,7 +80,15 @@ class TestResult(unittest.TestResult):
     Each instance holds the total number of tests run, and collections of
     failures and errors that occurred among those test runs. The collections
     contain tuples of (testcase, exceptioninfo), where exceptioninfo is the
-    formatted traceback of the error that occurred.
+    formatted traceback of the error that occurred. Those of expected
+    failures are kept in a compact form, and only formatted when
+    expectedFailures is next used.
+
+    collectedDurations holds a (name, elapsed, cpu) tuple for each test and
+    fixture run, with the wall clock and CPU seconds it took. Fixtures are
+    the class and module fixtures and the functions of shared resources.
+    fixturesRun and fixtureTime count the fixtures and the seconds spent
+    in them.
     """
     _previousTestClass = None
     _moduleSetUpFailed = False
@@ -45,6 +101,9 @@ class TestResult(unittest.TestResult):
         self.skipped = []
         self.expectedFailures = []
         self.unexpectedSuccesses = []
+        self.collectedDurations = []
+        self.fixturesRun = 0
+        self.fixtureTime = 0.0
         self.shouldStop = False
         self.buffer = False
         self.tb_locals = False
@@ -143,14 +202,48 @@ class TestResult(unittest.TestResult):
 
     def addExpectedFailure(self, test, err):
         """Called when an expected failure/error occured."""
-        self.expectedFailures.append(
-            (test, self._exc_info_to_string(err, test)))
+        # these aren't printed, so are formatted only if someone looks
+        self._unformattedExpectedFailures.append(
+            (test, self._exc_info_to_traceback(err, test)))
+
+    @property
+    def expectedFailures(self):
+        unformatted = self._unformattedExpectedFailures
+        if unformatted:
+            self._expectedFailures.extend(
+                (test, str(formatted)) for test, formatted in unformatted)
+            del unformatted[:]
+        return self._expectedFailures
+
+    @expectedFailures.setter
+    def expectedFailures(self, expectedFailures):
+        self._expectedFailures = expectedFailures
+        self._unformattedExpectedFailures = []
 
     @failfast
     def addUnexpectedSuccess(self, test):
         """Called when a test was expected to fail, but succeed."""
         self.unexpectedSuccesses.append(test)
 
+    def addDuration(self, test, elapsed, cpu=None):
+        """Called when a test or a fixture has finished, with the wall
+        clock and CPU seconds it took. Tests are timed between startTest and
+        stopTest, fixtures by stopFixture."""
+        self.collectedDurations.append((str(test), elapsed, cpu))
+
+    def startFixture(self, fixture):
+        """Called when a class, module or resource fixture is about to be
+        run. str(fixture) names it, as in 'setUpClass (module.Class)' or
+        'setUpResource (name)'."""
+
+    def stopFixture(self, fixture, elapsed, cpu=None):
+        """Called when a class, module or resource fixture has been run,
+        whether or not it failed, with the wall clock and CPU seconds it
+        took."""
+        self.fixturesRun += 1
+        self.fixtureTime += elapsed
+        self.addDuration(fixture, elapsed, cpu)
+
     def wasSuccessful(self):
         """Tells whether or not this result was a success."""
         # The hasattr check is for test_result's OldResult test.  That
@@ -166,7 +259,15 @@ class TestResult(unittest.TestResult):
 
     def _exc_info_to_string(self, err, test):
         """Converts a sys.exc_info()-style tuple of values into a string."""
+        return str(self._exc_info_to_traceback(err, test))
+
+    def _exc_info_to_traceback(self, err, test):
+        """Like _exc_info_to_string, but the string is only formatted when
+        it is first used."""
         exctype, value, tb = err
+        if tb is None and isinstance(value, six.string_types):
+            # already formatted, e.g. by a worker process
+            return value
         # Skip test runner traceback levels
         while tb and self._is_relevant_tb_level(tb):
             tb = tb.tb_next
@@ -175,9 +276,17 @@ class TestResult(unittest.TestResult):
             length = self._count_relevant_tb_levels(tb)
         else:
             length = None
-        tb_e = traceback.TracebackException(
-            exctype, value, tb, limit=length, capture_locals=self.tb_locals)
-        msgLines = list(tb_e.format())
+        if self.tb_locals:
+            tb_e = traceback.TracebackException(
+                exctype, value, tb, limit=length, capture_locals=True)
+            frames = None
+        else:
+            # the frames are summed up more cheaply than TracebackException
+            # does, and their lines of source looked up only if needed
+            tb_e = traceback.TracebackException(exctype, value, None,
+                                                limit=length)
+            frames = _frames(tb, length)
+        outputLines = []
 
         if self.buffer:
             output = sys.stdout.getvalue()
@@ -185,12 +294,16 @@ class TestResult(unittest.TestResult):
             if output:
                 if not output.endswith('\n'):
                     output += '\n'
-                msgLines.append(STDOUT_LINE % output)
+                outputLines.append(STDOUT_LINE % output)
             if error:
                 if not error.endswith('\n'):
                     error += '\n'
-                msgLines.append(STDERR_LINE % error)
-        return ''.join(msgLines)
+                outputLines.append(STDERR_LINE % error)
+        formatted = _Traceback(tb_e, frames, tuple(outputLines))
+        if self.tb_locals:
+            # the reprs of the locals take more room than the text
+            str(formatted)
+        return formatted
 
     def _is_relevant_tb_level(self, tb):
         return '__unittest' in tb.tb_frame.f_globals
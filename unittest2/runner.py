@@ -1,12 +1,14 @@
 """Running tests"""
 
+import heapq
+import operator
 import sys
 import time
 import unittest
 
 from six import u
 
-from unittest2 import result
+from unittest2 import events, parallel, result, suite
 
 try:
     from unittest2.signals import registerResult
@@ -33,6 +35,15 @@ class _WritelnDecorator(object):
         self.write(u('\n')) # text-mode streams translate to \r\n if needed
 
 
+def _countExpectedFailures(result):
+    """The number of expected failures of result, counted without
+    formatting the ones it hasn't formatted yet."""
+    unformatted = getattr(result, '_unformattedExpectedFailures', None)
+    if unformatted is None:
+        return len(result.expectedFailures)
+    return len(result._expectedFailures) + len(unformatted)
+
+
 class TextTestResult(result.TestResult):
     """A test result class that can print formatted text results to a stream.
 
@@ -133,12 +144,31 @@ class TextTestRunner(unittest.TextTestRunner):
 
     It prints out the names of tests as they are run, errors as they
     occur, and a summary of the results at the end of the test run.
+
+    If workers is greater than one the tests are spread across that many
+    worker processes, see unittest2.parallel. If durations_file is given,
+    test durations are kept there to balance later parallel runs.
+    preload names modules to import before the workers are started, or is
+    True for the modules imported by the test modules.
+
+    If event_log is a path, every outcome is also written there as it
+    happens, in the format of unittest2.events, so the run can be replayed
+    later even if it crashes.
+
+    If durations is given, the slowest that many tests and fixtures are
+    listed at the end, or all of them if it is 0.
+
+    If group_fixtures is true the tests are regrouped by the resources
+    they need, module and class before they are run, see
+    unittest2.suite.groupByFixtures.
     """
     resultclass = TextTestResult
 
     def __init__(self, stream=sys.stderr, descriptions=True, verbosity=1,
                  failfast=False, buffer=False, resultclass=None,
-                 tb_locals=False):
+                 tb_locals=False, workers=None,
+                 durations_file=None, preload=None,
+                 event_log=None, durations=None, group_fixtures=False):
         """Construct a TextTestRunner.
 
         Subclasses should accept **kwargs to ensure compatibility as the
@@ -150,12 +180,45 @@ class TextTestRunner(unittest.TextTestRunner):
         self.failfast = failfast
         self.buffer = buffer
         self.tb_locals = tb_locals
+        self.workers = workers
+        self.durations_file = durations_file
+        self.preload = preload
+        self.event_log = event_log
+        self.durations = durations
+        self.group_fixtures = group_fixtures
         if resultclass is not None:
             self.resultclass = resultclass
 
     def _makeResult(self):
         return self.resultclass(self.stream, self.descriptions, self.verbosity)
 
+    def _printDurations(self, result):
+        collected = getattr(result, 'collectedDurations', None)
+        if not collected:
+            return
+        key = operator.itemgetter(1)
+        if self.durations > 0:
+            slowest = heapq.nlargest(self.durations, collected, key=key)
+        else:
+            slowest = sorted(collected, key=key, reverse=True)
+        self.stream.writeln(u("Slowest test durations"))
+        if hasattr(result, 'separator2'):
+            self.stream.writeln(result.separator2)
+        self.stream.writeln(u("%-10s %-10s %s") % ("wall", "cpu", "test"))
+        hidden = False
+        for name, elapsed, cpu in slowest:
+            if self.verbosity < 2 and elapsed < 0.001:
+                hidden = True
+                continue
+            cpu = "-" if cpu is None else "%.3fs" % cpu
+            self.stream.writeln(u("%-10s %-10s %s") %
+                                ("%.3fs" % elapsed, cpu, name))
+        if hidden:
+            self.stream.writeln(u("\n(durations < 0.001s were hidden; "
+                                  "use -v to show these durations)"))
+        else:
+            self.stream.writeln()
+
     def run(self, test):
         "Run the given test case or test suite."
         result = self._makeResult()
@@ -164,13 +227,28 @@ class TextTestRunner(unittest.TextTestRunner):
         result.tb_locals = self.tb_locals
         registerResult(result)
 
+        saved = None
+        if self.group_fixtures:
+            test, saved = suite.groupByFixtures(test)
         startTime = time.time()
         startTestRun = getattr(result, 'startTestRun', None)
         if startTestRun is not None:
             startTestRun()
+        log = writer = None
+        if self.event_log is not None:
+            log = open(self.event_log, 'wb')
+            writer = events.EventWriter(log)
         try:
-            test(result)
+            if self.workers is not None and self.workers > 1:
+                parallel.runTests(test, result, self.workers,
+                                  self.durations_file, self.preload, writer)
+            elif writer is not None:
+                test(events.RecordingResult(result, writer))
+            else:
+                test(result)
         finally:
+            if log is not None:
+                log.close()
             stopTestRun = getattr(result, 'stopTestRun', None)
             if stopTestRun is not None:
                 stopTestRun()
@@ -178,22 +256,33 @@ class TextTestRunner(unittest.TextTestRunner):
                 result.printErrors()
         stopTime = time.time()
         timeTaken = stopTime - startTime
+        if self.durations is not None:
+            self._printDurations(result)
         if hasattr(result, 'separator2'):
             self.stream.writeln(result.separator2)
         run = result.testsRun
         self.stream.writeln(u("Ran %d test%s in %.3fs") %
                             (run, run != 1 and "s" or "", timeTaken))
+        fixtures = getattr(result, 'fixturesRun', 0)
+        if fixtures:
+            self.stream.writeln(u("Ran %d fixture%s in %.3fs") %
+                                (fixtures, fixtures != 1 and "s" or "",
+                                 result.fixtureTime))
+        if saved is not None:
+            self.stream.writeln(u("Grouping tests by fixture saved %d "
+                                  "setup%s") %
+                                (saved, saved != 1 and "s" or ""))
         self.stream.writeln()
 
         expectedFails = unexpectedSuccesses = skipped = 0
         try:
-            results = map(len, (result.expectedFailures,
-                                result.unexpectedSuccesses,
+            results = map(len, (result.unexpectedSuccesses,
                                 result.skipped))
+            expectedFails = _countExpectedFailures(result)
         except AttributeError:
             pass
         else:
-            expectedFails, unexpectedSuccesses, skipped = results
+            unexpectedSuccesses, skipped = results
         infos = []
         if not result.wasSuccessful():
             self.stream.write(u("FAILED"))
@@ -54,6 +54,17 @@ def installHandler():
         signal.signal(signal.SIGINT, _interrupt_handler)
 
 
+def _interruptOnce(signum, frame):
+    # ignore it from now on, so the cleanup this starts isn't cut short
+    signal.signal(signum, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+def interruptOnTerminate():
+    """Make SIGTERM raise KeyboardInterrupt, once, so a terminated run
+    still tears down its session fixtures."""
+    signal.signal(signal.SIGTERM, _interruptOnce)
+
+
 def removeHandler(method=None):
     if method is not None:
         @wraps(method)
@@ -9,6 +9,19 @@ from unittest2 import case, util
 
 __unittest = True
 
+# stands for the value of a live resource that failed to be made
+_FAILED = object()
+
+# The module, importable from the top level directory, whose setUpSession
+# and tearDownSession apply to every test. Discovery imports it.
+SESSION_MODULE = 'sessionfixtures'
+
+# the class fixtures TestCase inherits, which do nothing and aren't reported
+_noopFixtures = frozenset(
+    getattr(fixture, '__func__', fixture) for fixture in (
+        case.TestCase.setUpClass, case.TestCase.tearDownClass,
+        unittest.TestCase.setUpClass, unittest.TestCase.tearDownClass))
+
 
 class BaseTestSuite(unittest.TestSuite):
     """A simple test suite that doesn't provide class or module shared fixtures.
@@ -100,6 +113,12 @@ class TestSuite(BaseTestSuite):
     runner, such as TextTestRunner. It will run the individual test cases
     in the order in which they were added, aggregating the results. When
     subclassing, do not forget to call the base class constructor.
+
+    Besides class and module fixtures it runs session fixtures: the
+    setUpSession and tearDownSession functions of the top level package
+    of a test's module, and of the sessionfixtures module if it has been
+    imported. Each is set up before the first test it applies to and torn
+    down at the end of the run, even if the run is interrupted.
     """
 
 
@@ -108,31 +127,42 @@ class TestSuite(BaseTestSuite):
         if getattr(result, '_testRunEntered', False) is False:
             result._testRunEntered = topLevel = True
 
-        for index, test in enumerate(self):
-            if result.shouldStop:
-                break
-
-            if _isnotsuite(test):
-                self._tearDownPreviousClass(test, result)
-                self._handleModuleFixture(test, result)
-                self._handleClassSetUp(test, result)
-                result._previousTestClass = test.__class__
-
-                if (getattr(test.__class__, '_classSetupFailed', False) or
-                    getattr(result, '_moduleSetUpFailed', False)):
-                    continue
-
-            if not debug:
-                test(result)
-            else:
-                test.debug()
-
-            if self._cleanup:
-                self._removeTestAtIndex(index)
-
-        if topLevel:
-            self._tearDownPreviousClass(None, result)
-            self._handleModuleTearDown(result)
+        try:
+            for index, test in enumerate(self):
+                if result.shouldStop:
+                    break
+
+                if isinstance(test, case.TestHandle):
+                    test = test.instantiate()
+
+                if _isnotsuite(test):
+                    self._tearDownPreviousClass(test, result)
+                    self._handleModuleFixture(test, result)
+                    self._handleClassSetUp(test, result)
+                    result._previousTestClass = test.__class__
+
+                    if (getattr(test.__class__, '_classSetupFailed', False) or
+                        getattr(result, '_moduleSetUpFailed', False)):
+                        continue
+                    if not self._handleResources(test, result):
+                        continue
+
+                if not debug:
+                    test(result)
+                else:
+                    test.debug()
+
+                if self._cleanup:
+                    self._removeTestAtIndex(index)
+
+            if topLevel:
+                self._tearDownPreviousClass(None, result)
+                self._handleModuleTearDown(result)
+                self._releaseResources(result)
+        finally:
+            # even if the run was interrupted
+            if topLevel:
+                self._tearDownSessions(result)
         return result
 
     def debug(self):
@@ -161,6 +191,9 @@ class TestSuite(BaseTestSuite):
 
         setUpClass = getattr(currentClass, 'setUpClass', None)
         if setUpClass is not None:
+            className = util.strclass(currentClass)
+            errorName = 'setUpClass (%s)' % className
+            timing = self._startFixture(result, setUpClass, errorName)
             try:
                 setUpClass()
             except Exception:
@@ -168,9 +201,8 @@ class TestSuite(BaseTestSuite):
                 if isinstance(result, _DebugResult):
                     raise
                 currentClass._classSetupFailed = True
-                className = util.strclass(currentClass)
-                errorName = 'setUpClass (%s)' % className
                 self._addClassOrModuleLevelException(result, e, errorName)
+            self._stopFixture(result, timing)
 
     def _get_previous_module(self, result):
         previousModule = None
@@ -190,12 +222,18 @@ class TestSuite(BaseTestSuite):
 
 
         result._moduleSetUpFailed = False
+        if not self._handleSessionSetUp(currentModule, result):
+            # the module's tests are skipped, as if setUpModule had failed
+            result._moduleSetUpFailed = True
+            return
         try:
             module = sys.modules[currentModule]
         except KeyError:
             return
         setUpModule = getattr(module, 'setUpModule', None)
         if setUpModule is not None:
+            errorName = 'setUpModule (%s)' % currentModule
+            timing = self._startFixture(result, setUpModule, errorName)
             try:
                 setUpModule()
             except Exception:
@@ -203,8 +241,154 @@ class TestSuite(BaseTestSuite):
                 if isinstance(result, _DebugResult):
                     raise
                 result._moduleSetUpFailed = True
-                errorName = 'setUpModule (%s)' % currentModule
                 self._addClassOrModuleLevelException(result, e, errorName)
+            self._stopFixture(result, timing)
+
+    def _handleSessionSetUp(self, moduleName, result):
+        """Set up the sessions the tests of moduleName belong to, if they
+        haven't been already. Returns False if one of them failed."""
+        sessions = getattr(result, '_sessions', None)
+        if sessions is None:
+            sessions = result._sessions = []
+        for holder in _sessionHolders(moduleName):
+            for session in sessions:
+                if session[0] is holder:
+                    break
+            else:
+                session = [holder, False]
+                sessions.append(session)
+                setUpSession = getattr(holder, 'setUpSession', None)
+                if setUpSession is None:
+                    session[1] = True
+                else:
+                    errorName = 'setUpSession (%s)' % holder.__name__
+                    timing = self._startFixture(result, setUpSession,
+                                                errorName)
+                    try:
+                        setUpSession()
+                        session[1] = True
+                    except Exception:
+                        e = sys.exc_info()[1]
+                        if isinstance(result, _DebugResult):
+                            raise
+                        self._addClassOrModuleLevelException(result, e,
+                                                             errorName)
+                    finally:
+                        self._stopFixture(result, timing)
+            if not session[1]:
+                return False
+        return True
+
+    def _tearDownSessions(self, result):
+        """Tear down the sessions that were set up, latest first."""
+        sessions = getattr(result, '_sessions', None)
+        while sessions:
+            holder, succeeded = sessions.pop()
+            tearDownSession = getattr(holder, 'tearDownSession', None)
+            if not succeeded or tearDownSession is None:
+                continue
+            errorName = 'tearDownSession (%s)' % holder.__name__
+            timing = self._startFixture(result, tearDownSession, errorName)
+            try:
+                tearDownSession()
+            except Exception:
+                e = sys.exc_info()[1]
+                if isinstance(result, _DebugResult):
+                    raise
+                self._addClassOrModuleLevelException(result, e, errorName)
+            finally:
+                self._stopFixture(result, timing)
+
+    def _handleResources(self, test, result):
+        """Clean the live resources test doesn't need, then make or reset
+        the ones it does and set them on it. Returns False if one of them
+        couldn't be made."""
+        needed = getattr(test, 'resources', ())
+        live = getattr(result, '_liveResources', None)
+        if live is None:
+            if not needed:
+                return True
+            live = result._liveResources = {}
+        self._releaseResources(result,
+                               set(resource for _, resource in needed))
+        for name, resource in needed:
+            if resource in live:
+                value = live[resource]
+                if value is _FAILED:
+                    return False
+                if resource.reset is not None:
+                    reset, _ = self._callResource(result, resource.reset,
+                                                  'resetResource', resource,
+                                                  value)
+                    if not reset:
+                        # start again with a new one
+                        del live[resource]
+                        self._cleanResource(result, resource, value)
+            if resource not in live:
+                made, value = self._callResource(result, resource.make,
+                                                 'setUpResource', resource)
+                live[resource] = value if made else _FAILED
+                if not made:
+                    return False
+            setattr(test, name, live[resource])
+        return True
+
+    def _releaseResources(self, result, keep=()):
+        """Clean the live resources not in keep, latest made first."""
+        live = getattr(result, '_liveResources', None)
+        if not live:
+            return
+        for resource in reversed(list(live)):
+            if resource not in keep:
+                self._cleanResource(result, resource, live.pop(resource))
+
+    def _cleanResource(self, result, resource, value):
+        if value is not _FAILED and resource.clean is not None:
+            self._callResource(result, resource.clean, 'tearDownResource',
+                               resource, value)
+
+    def _callResource(self, result, function, kind, resource, *args):
+        """Call one of the functions of a resource, reporting its errors
+        against kind (resource). Returns whether it succeeded and what it
+        returned."""
+        errorName = '%s (%s)' % (kind, resource)
+        timing = self._startFixture(result, function, errorName)
+        try:
+            value = function(*args)
+        except Exception:
+            e = sys.exc_info()[1]
+            if isinstance(result, _DebugResult):
+                raise
+            self._addClassOrModuleLevelException(result, e, errorName)
+            return False, None
+        finally:
+            self._stopFixture(result, timing)
+        return True, value
+
+    def _startFixture(self, result, function, name):
+        """Tell result that the fixture function, called name, is about to
+        be run. Returns what _stopFixture needs, or None if the fixture is
+        not reported. Results without stopFixture only get its duration."""
+        if getattr(function, '__func__', None) in _noopFixtures:
+            return None
+        stopFixture = getattr(result, 'stopFixture', None)
+        if stopFixture is None and getattr(result, 'addDuration', None) is None:
+            return None
+        fixture = _ErrorHolder(name)
+        startFixture = getattr(result, 'startFixture', None)
+        if stopFixture is not None and startFixture is not None:
+            startFixture(fixture)
+        return stopFixture, fixture, util.clocks()
+
+    def _stopFixture(self, result, timing):
+        if timing is None:
+            return
+        stopFixture, fixture, started = timing
+        if stopFixture is None:
+            case._addDuration(result, fixture, started)
+            return
+        now, cpuNow = util.clocks()
+        stopFixture(fixture, now - started[0], cpuNow - started[1])
 
     def _addClassOrModuleLevelException(self, result, exception, errorName):
         error = _ErrorHolder(errorName)
@@ -228,14 +412,16 @@ class TestSuite(BaseTestSuite):
 
         tearDownModule = getattr(module, 'tearDownModule', None)
         if tearDownModule is not None:
+            errorName = 'tearDownModule (%s)' % previousModule
+            timing = self._startFixture(result, tearDownModule, errorName)
             try:
                 tearDownModule()
             except Exception:
                 e = sys.exc_info()[1]
                 if isinstance(result, _DebugResult):
                     raise
-                errorName = 'tearDownModule (%s)' % previousModule
                 self._addClassOrModuleLevelException(result, e, errorName)
+            self._stopFixture(result, timing)
 
     def _tearDownPreviousClass(self, test, result):
         previousClass = getattr(result, '_previousTestClass', None)
@@ -251,15 +437,99 @@ class TestSuite(BaseTestSuite):
 
         tearDownClass = getattr(previousClass, 'tearDownClass', None)
         if tearDownClass is not None:
+            className = util.strclass(previousClass)
+            errorName = 'tearDownClass (%s)' % className
+            timing = self._startFixture(result, tearDownClass, errorName)
             try:
                 tearDownClass()
             except Exception:
                 e = sys.exc_info()[1]
                 if isinstance(result, _DebugResult):
                     raise
-                className = util.strclass(previousClass)
-                errorName = 'tearDownClass (%s)' % className
                 self._addClassOrModuleLevelException(result, e, errorName)
+            self._stopFixture(result, timing)
+
+
+class LazySuite(TestSuite):
+    """A TestSuite that gets its tests by calling load() the first time it is
+    iterated, which for discovered modules imports the module. Tests can't
+    be added before that.
+
+    description is used in the repr so the suite can be told apart before
+    it is loaded.
+    """
+
+    def __init__(self, load, description=None):
+        super(LazySuite, self).__init__()
+        self._load = load
+        self.description = description
+
+    def __repr__(self):
+        if self._load is not None:
+            return "<%s %s (not loaded)>" % (util.strclass(self.__class__),
+                                             self.description)
+        return super(LazySuite, self).__repr__()
+
+    def __iter__(self):
+        if self._load is not None:
+            load, self._load = self._load, None
+            self.addTests(load())
+        return super(LazySuite, self).__iter__()
+
+    def addTest(self, test):
+        if self._load is not None:
+            raise TypeError("can't add tests to a LazySuite before it is "
+                            "loaded")
+        super(LazySuite, self).addTest(test)
+
+
+class ParametrizedSuite(TestSuite):
+    """The cases of a method decorated with case.parametrize.
+
+    The tests are made from the parameters as the suite is iterated, and
+    not kept, so a large table of parameters is never held as tests. Each
+    pass over the suite reads the parameters again. Tests can't be added.
+
+    Parameters given as a plain iterator aren't read to count the tests,
+    as they could then not be run, so until the suite has been run they
+    count as none.
+    """
+
+    def __init__(self, testCaseClass, methodName):
+        super(ParametrizedSuite, self).__init__()
+        self.testCaseClass = testCaseClass
+        self.methodName = methodName
+        self._parameters = getattr(testCaseClass, methodName).__unittest_params__
+        # number of cases found by the last full pass
+        self._count = None
+
+    def __repr__(self):
+        return "<%s %s.%s>" % (util.strclass(self.__class__),
+                               util.strclass(self.testCaseClass),
+                               self.methodName)
+
+    def __iter__(self):
+        count = 0
+        for caseId, args in self._parameters:
+            test = self.testCaseClass(self.methodName)
+            test._useParameters(self.methodName, caseId, args)
+            count += 1
+            yield test
+        self._count = count
+
+    def countTestCases(self):
+        if self._count is None:
+            if self._parameters.readOnce:
+                return 0
+            self._count = sum(1 for _ in self._parameters)
+        return self._count
+
+    def addTest(self, test):
+        raise TypeError("can't add tests to a ParametrizedSuite")
+
+    def _removeTestAtIndex(self, index):
+        # the tests aren't held
+        pass
 
 
 class _ErrorHolder(object):
@@ -271,6 +541,8 @@ class _ErrorHolder(object):
     # Inspired by the ErrorHolder from Twisted:
     # http://twistedmatrix.com/trac/browser/trunk/twisted/trial/runner.py
 
+    __slots__ = ('description',)
+
     # attribute used by TestResult._exc_info_to_string
     failureException = None
 
@@ -309,6 +581,154 @@ def _isnotsuite(test):
     return False
 
 
+def _sessionHolders(moduleName):
+    """The modules whose session fixtures apply to the tests of moduleName:
+    the session module, if it has been imported, and the top level package
+    moduleName is in."""
+    holders = []
+    candidates = [sys.modules.get(SESSION_MODULE)]
+    topLevel = sys.modules.get(moduleName.partition('.')[0])
+    if hasattr(topLevel, '__path__'):
+        candidates.append(topLevel)
+    for module in candidates:
+        if (module is not None and module not in holders and
+            (hasattr(module, 'setUpSession') or
+             hasattr(module, 'tearDownSession'))):
+            holders.append(module)
+    return holders
+
+
+def _testClass(test):
+    if isinstance(test, (case.TestHandle, ParametrizedSuite)):
+        return test.testCaseClass
+    return test.__class__
+
+
+def _flattenForGrouping(test, tests):
+    # parametrized suites are kept whole, so their tests aren't all made
+    if _isnotsuite(test) or isinstance(test, ParametrizedSuite):
+        tests.append(test)
+    else:
+        for child in test:
+            _flattenForGrouping(child, tests)
+    return tests
+
+
+def _hasFixture(owner, name):
+    fixture = getattr(owner, name, None)
+    return (fixture is not None and
+            getattr(fixture, '__func__', fixture) not in _noopFixtures)
+
+
+def _resourcesOf(cls):
+    return frozenset(resource for _, resource in getattr(cls, 'resources', ()))
+
+
+def _countFixtureSetUps(classes):
+    """How many times setUpClass, setUpModule and the make of a resource
+    are called when tests of the given classes are run in that order."""
+    setUps = 0
+    previousClass = previousModule = None
+    live = frozenset()
+    for cls in classes:
+        if cls is previousClass:
+            continue
+        module = cls.__module__
+        if (module != previousModule and
+            _hasFixture(sys.modules.get(module), 'setUpModule')):
+            setUps += 1
+        if _hasFixture(cls, 'setUpClass'):
+            setUps += 1
+        needed = _resourcesOf(cls)
+        setUps += len(needed - live)
+        previousClass, previousModule, live = cls, module, needed
+    return setUps
+
+
+def _switchCost(previous, kind, hasSetUpModule):
+    """The cost of running the tests of a kind of class right after those
+    of the previous kind: a setUpModule if the module changes, and making
+    and cleaning the resources that differ. setUpClass is left out, as it
+    is run whichever class comes next."""
+    module, resources = kind
+    cost = 0
+    if module != previous[0] and hasSetUpModule[module]:
+        cost += 1
+    changed = previous[1] ^ resources
+    return cost + sum(resource.cost for resource in changed)
+
+
+def _orderByFixtures(classes):
+    """Order classes, grouped by module, so that switching from one to the
+    next sets up modules and makes resources as cheaply as possible.
+
+    Finding the cheapest order is the travelling salesman problem, so
+    classes of a module that need the same resources are kept together,
+    and starting from the first of them, each next group is the cheapest
+    to switch to from the one before. If no class needs resources, the
+    grouping by module is already the cheapest.
+    """
+    resourcesOf = dict((cls, _resourcesOf(cls)) for cls in classes)
+    if not any(six.itervalues(resourcesOf)):
+        return classes
+    kinds, classesOf = [], {}
+    for cls in classes:
+        kind = (cls.__module__, resourcesOf[cls])
+        if kind not in classesOf:
+            classesOf[kind] = []
+            kinds.append(kind)
+        classesOf[kind].append(cls)
+    hasSetUpModule = dict(
+        (module, _hasFixture(sys.modules.get(module), 'setUpModule'))
+        for module, _ in kinds)
+    ordered, remaining = kinds[:1], kinds[1:]
+    while remaining:
+        costs = [_switchCost(ordered[-1], kind, hasSetUpModule)
+                 for kind in remaining]
+        # the first of equally cheap kinds is taken
+        ordered.append(remaining.pop(costs.index(min(costs))))
+    return [cls for kind in ordered for cls in classesOf[kind]]
+
+
+def _groupByClass(tests, testsOf):
+    """Add the tests of each class to testsOf, and return the classes in
+    the order they should run: grouped by module, in order of appearance."""
+    modules, classesOf = [], {}
+    for test in tests:
+        cls = _testClass(test)
+        if cls not in testsOf:
+            testsOf[cls] = []
+            if cls.__module__ not in classesOf:
+                classesOf[cls.__module__] = []
+                modules.append(cls.__module__)
+            classesOf[cls.__module__].append(cls)
+        testsOf[cls].append(test)
+    return [cls for module in modules for cls in classesOf[module]]
+
+
+def groupByFixtures(test):
+    """Regroup the tests of a suite by module and class, and by the
+    resources they need.
+
+    Each class is run once, where its first test was, with the tests kept
+    in their order within it, so that class and module fixtures are not
+    set up again for tests that were interleaved. Classes are then ordered
+    to keep the cost of setUpModule and of making and cleaning resources,
+    see case.Resource, low. Returns a flat TestSuite and the number of
+    setUpClass, setUpModule and resource make calls saved; if none are,
+    the tests are left in their order.
+    """
+    tests = _flattenForGrouping(test, [])
+    testsOf = {}
+    classes = _orderByFixtures(_groupByClass(tests, testsOf))
+    saved = (_countFixtureSetUps(_testClass(test) for test in tests) -
+             _countFixtureSetUps(classes))
+    if saved <= 0:
+        return TestSuite(tests), 0
+    grouped = TestSuite(test for cls in classes for test in testsOf[cls])
+    return grouped, saved
+
+
 class _DebugResult(object):
     "Used by the TestSuite to hold previous class when running in debug."
     _previousTestClass = None
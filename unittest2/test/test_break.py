@@ -41,6 +41,17 @@ class TestBreak(unittest2.TestCase):
 
         self.assertTrue(unittest2.signals._interrupt_handler.called)
 
+    def testInterruptOnTerminate(self):
+        self.addCleanup(signal.signal, signal.SIGTERM,
+                        signal.getsignal(signal.SIGTERM))
+        unittest2.signals.interruptOnTerminate()
+
+        pid = os.getpid()
+        self.assertRaises(KeyboardInterrupt, os.kill, pid, signal.SIGTERM)
+        # only once, so cleanup isn't interrupted in turn
+        self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_IGN)
+        os.kill(pid, signal.SIGTERM)
+
     def testRegisterResult(self):
         result = unittest2.TestResult()
         unittest2.registerResult(result)
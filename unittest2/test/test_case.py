@@ -419,6 +419,96 @@ class Test_TestCase(unittest2.TestCase, EqualityMixin, HashingMixin):
         expected = ['a1', 'a2', 'b1']
         self.assertEqual(events, expected)
 
+    def test_subtest_successes_not_kept(self):
+        # TestResult ignores passing subtests, so they aren't held until
+        # the end of the test
+        pending = []
+
+        class Foo(unittest2.TestCase):
+            def test(self):
+                for i in range(3):
+                    with self.subTest(i=i):
+                        pass
+                pending.extend(self._outcome.errors)
+
+        result = unittest2.TestResult()
+        Foo('test').run(result)
+        self.assertEqual(pending, [])
+        self.assertTrue(result.wasSuccessful())
+
+        events = []
+        Foo('test').run(LoggingResult(events))
+        self.assertEqual(len(pending), 3)
+        self.assertEqual(events.count('addSubTestSuccess'), 3)
+
+    def test_maxSubTestFailures(self):
+        events = []
+
+        class Foo(unittest2.TestCase):
+            maxSubTestFailures = 2
+            def test(self):
+                for i in range(5):
+                    with self.subTest(i=i):
+                        events.append(i)
+                        self.assertNotEqual(i % 2, 0)
+                events.append('end')
+
+        result = unittest2.TestResult()
+        Foo('test').run(result)
+        self.assertEqual(events, [0, 1, 2])
+        self.assertEqual([test.params['i'] for test, _ in result.failures],
+                         [0, 2])
+
+        # errors count too, skips don't
+        del events[:]
+        class Bar(unittest2.TestCase):
+            maxSubTestFailures = 1
+            def test(self):
+                with self.subTest(i=0):
+                    self.skipTest('skip')
+                with self.subTest(i=1):
+                    events.append(1)
+                    raise ValueError
+                with self.subTest(i=2):
+                    events.append(2)
+
+        result = unittest2.TestResult()
+        Bar('test').run(result)
+        self.assertEqual(events, [1])
+        self.assertEqual(len(result.skipped), 1)
+        self.assertEqual(len(result.errors), 1)
+
+    def test_subtest_nested_params(self):
+        descriptions = []
+
+        class Foo(unittest2.TestCase):
+            def test(self):
+                with self.subTest(a=1, b=2):
+                    with self.subTest('inner', b=3):
+                        descriptions.append(self._subtest._subDescription())
+                        descriptions.append(dict(self._subtest.params))
+                    descriptions.append(self._subtest._subDescription())
+                descriptions.append(self._subtest)
+
+        Foo('test').run(unittest2.TestResult())
+        self.assertEqual(descriptions, ['[inner] (a=1, b=3)', {'a': 1, 'b': 3},
+                                        '(a=1, b=2)', None])
+
+    def test_subtest_state(self):
+        class MyException(Exception):
+            pass
+
+        class Foo(unittest2.TestCase):
+            failureException = MyException
+            def test(self):
+                pass
+
+        test = Foo('test')
+        subtest = unittest2.case._SubTest(test, 'msg', {'i': 1})
+        self.assertIs(subtest.failureException, MyException)
+        self.assertEqual(subtest.id(), test.id() + ' [msg] (i=1)')
+        self.assertFalse(hasattr(subtest, '__dict__') and subtest.__dict__)
+
     # "This class attribute gives the exception raised by the test() method.
     # If a test framework needs to use a specialized exception, possibly to
     # carry additional information, it must subclass this exception in
@@ -563,6 +653,48 @@ class Test_TestCase(unittest2.TestCase, EqualityMixin, HashingMixin):
         # from this TestCase instance but since its a local nothing else
         # will ever notice that.
 
+    def testAddTypeEqualityFuncIsPerInstance(self):
+        class SadSnake(object):
+            pass
+        def AllSnakesCreatedEqual(a, b, msg=None):
+            return type(a) is type(b) is SadSnake
+        other = Test.Foo('test1')
+        self.addTypeEqualityFunc(SadSnake, AllSnakesCreatedEqual)
+        self.assertEqual(SadSnake(), SadSnake())
+        self.assertRaises(self.failureException, other.assertEqual,
+                          SadSnake(), SadSnake())
+        # the default functions are still there
+        self.assertIs(six.get_method_function(
+                          self._getAssertEqualityFunc([], [])),
+                      six.get_unbound_function(unittest2.TestCase.assertListEqual))
+
+    def testAddClassTypeEqualityFunc(self):
+        class SadSnake(object):
+            pass
+        calls = []
+        class Base(unittest2.TestCase):
+            def runTest(self):
+                pass
+            def assertSnakeEqual(self, a, b, msg=None):
+                calls.append(type(self).__name__)
+        class Derived(Base):
+            pass
+
+        # resolved before the function is added, must not go stale
+        Derived('runTest')._getAssertEqualityFunc(1, 1)
+        Base.addClassTypeEqualityFunc(SadSnake, 'assertSnakeEqual')
+        Derived('runTest').assertEqual(SadSnake(), SadSnake())
+        Base('runTest').assertEqual(SadSnake(), SadSnake())
+        self.assertRaises(self.failureException, self.assertEqual,
+                          SadSnake(), SadSnake())
+        self.assertEqual(calls, ['Derived', 'Base'])
+
+        # subclasses override what they inherit
+        Derived.addClassTypeEqualityFunc(dict, 'assertSnakeEqual')
+        Derived('runTest').assertEqual({}, {1: 2})
+        self.assertRaises(self.failureException,
+                          Base('runTest').assertEqual, {}, {1: 2})
+
     def testAssertIs(self):
         thing = object()
         self.assertIs(thing, thing)
@@ -772,6 +904,42 @@ class Test_TestCase(unittest2.TestCase, EqualityMixin, HashingMixin):
         self.assertRaises(self.failureException, self.assertItemsEqual,
                           [2j, None], [None, 3j])
 
+    def testAssertItemsEqualUnorderableMessage(self):
+        # complex numbers can't be ordered, even on Python 2
+        expected = [{'a': [1]}, 2j, {'a': [1]}, [3], {'b': 2}, [3], 3j]
+        actual = [[3], {'a': [1]}, 3j, {'b': 3}, [3], [3], 2j]
+        with self.assertRaises(self.failureException) as cm:
+            self.assertItemsEqual(expected, actual)
+        self.assertEqual(str(cm.exception).splitlines(), [
+            'Expected, but missing:',
+            "    [{'b': 2}, {'a': [1]}]",
+            'Unexpected, but present:',
+            "    [{'b': 3}, [3]]"])
+
+    def testUnorderableItemsDifference(self):
+        from unittest2.util import (
+            unorderable_items_difference, unorderable_list_difference)
+
+        class Unhashable(object):
+            def __init__(self, value):
+                self.value = value
+            def __eq__(self, other):
+                return self.value == getattr(other, 'value', None)
+            __hash__ = None
+
+        one = Unhashable(1)
+        items = [1, 1.0, True, 'a', [1], [True], (1, [2]), {'a': [1]},
+                 set([1]), frozenset([1]), bytearray(b('x')), b('x'),
+                 one, Unhashable(1), Unhashable(2), [one], None]
+        for expected, actual in [
+                (items, items[::-1]),
+                (items[::2], items[::3]),
+                (items[:9] * 2, items[4:]),
+                (items[::-2] + items, items[1::2])]:
+            self.assertEqual(
+                unorderable_items_difference(expected, actual),
+                unorderable_list_difference(list(expected), list(actual)))
+
     def testAssertSetEqual(self):
         set1 = set()
         set2 = set()
@@ -950,10 +1118,9 @@ test case
         seq2 = 'b' + 'x' * 80**2
         diff = '\n'.join(difflib.ndiff(pprint.pformat(seq1).splitlines(),
                                        pprint.pformat(seq2).splitlines()))
-        # the +1 is the leading \n added by assertSequenceEqual
-        omitted = unittest2.case.DIFF_OMITTED % (len(diff) + 1,)
-
         self.maxDiff = len(diff)//2
+        # the diff isn't made to the end to find its length
+        omitted = unittest2.case.DIFF_TOO_LONG % (self.maxDiff,)
         try:
             self.assertSequenceEqual(seq1, seq2)
         except self.failureException:
@@ -986,6 +1153,112 @@ test case
         self.assertGreater(len(msg), len(diff))
         self.assertNotIn(omitted, msg)
 
+    def testLongDiffNotMade(self):
+        formatted = []
+        def pformatLines(obj):
+            formatted.append(obj)
+            return pprint.pformat(obj).splitlines()
+        original = unittest2.case._pformatLines
+        unittest2.case._pformatLines = pformatLines
+        try:
+            seq1 = list(range(50000))
+            seq2 = seq1[:25000] + [-1] + seq1[25001:]
+            with self.assertRaises(self.failureException) as cm:
+                self.assertListEqual(seq1, seq2)
+            self.assertIn(unittest2.case.DIFF_TOO_LONG % self.maxDiff,
+                          str(cm.exception))
+            self.assertEqual(formatted, [])
+
+            # short enough to try, abandoned once too long
+            self.maxDiff = 60
+            with self.assertRaises(self.failureException) as cm:
+                self.assertDictEqual(dict.fromkeys('abcdef', 1),
+                                     dict.fromkeys('abcdef', 2))
+            self.assertIn(unittest2.case.DIFF_TOO_LONG % 60,
+                          str(cm.exception))
+            self.assertEqual(len(formatted), 2)
+        finally:
+            unittest2.case._pformatLines = original
+
+    def testDiffOfLongSequences(self):
+        self.maxDiff = None
+        seq1 = list(range(2000))
+        seq2 = seq1[:1000] + [-1] + seq1[1001:]
+        with self.assertRaises(self.failureException) as cm:
+            self.assertListEqual(seq1, seq2)
+        lines = str(cm.exception).splitlines()
+        self.assertIn('-  1000,', lines)
+        self.assertIn('+  -1,', lines)
+        self.assertEqual(len([line for line in lines
+                              if line.startswith(('- ', '+ '))]), 2)
+
+    def testNdiff(self):
+        a = ['a', 'b', 'c', 'd', 'e']
+        b = ['a', 'b', 'x', 'd', 'e']
+        self.assertEqual(list(unittest2.case._ndiff(a, b)),
+                         list(difflib.ndiff(a, b)))
+        self.assertEqual(list(unittest2.case._ndiff(a, a)),
+                         list(difflib.ndiff(a, a)))
+        self.assertEqual(list(unittest2.case._ndiff(a, a[:2])),
+                         list(difflib.ndiff(a, a[:2])))
+        self.assertEqual(list(unittest2.case._ndiff([], a)),
+                         list(difflib.ndiff([], a)))
+
+        # large inputs are split at lines found once in each
+        a = ['line %d' % i for i in range(3000)]
+        b = [line + ' changed' if i % 7 == 0 else line
+             for i, line in enumerate(a)]
+        b[10:10] = ['line 20', 'inserted']
+        diff = list(unittest2.case._ndiff(a, b))
+        self.assertEqual(list(difflib.restore(diff, 1)), a)
+        self.assertEqual(list(difflib.restore(diff, 2)), b)
+
+    def testMaxRepr(self):
+        self.maxRepr = 20
+        with self.assertRaises(self.failureException) as cm:
+            self.assertIn(-1, list(range(10**6)))
+        self.assertEqual(str(cm.exception),
+                         '-1 not found in [0, 1, 2, 3, 4, 5, 6...]')
+        with self.assertRaises(self.failureException) as cm:
+            self.assertIsNone({'key': 'x' * 10**6})
+        self.assertEqual(str(cm.exception),
+                         "{'key': 'xxxxxxxxxxx...'} is not None")
+
+        self.maxRepr = None
+        with self.assertRaises(self.failureException) as cm:
+            self.assertIn(-1, list(range(10)))
+        self.assertEqual(str(cm.exception),
+                         '-1 not found in [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]')
+
+    def testMaxReprSequenceElements(self):
+        self.maxRepr = 20
+        self.maxDiff = 0
+        big = list(range(10**5))
+        with self.assertRaises(self.failureException) as cm:
+            self.assertSequenceEqual([big], [big[1:]])
+        self.assertIn('First differing element 0:\n'
+                      '[0, 1, 2, 3, 4, 5, 6...]\n'
+                      '[1, 2, 3, 4, 5, 6, 7...]\n', str(cm.exception))
+        with self.assertRaises(self.failureException) as cm:
+            self.assertSequenceEqual([1, big], [1])
+        self.assertIn('First extra element 1:\n[0, 1, 2, 3, 4, 5, 6...]\n',
+                      str(cm.exception))
+
+    def testMaxReprMakesNoMore(self):
+        made = []
+
+        class Item(object):
+            def __repr__(self):
+                made.append(self)
+                return 'Item()'
+
+        self.maxRepr = 30
+        with self.assertRaises(self.failureException) as cm:
+            self.assertNotIn(1, [1] + [Item()] * 10**5)
+        self.assertEqual(len(made), 4)
+        self.assertTrue(str(cm.exception).endswith(
+            ' unexpectedly found in [1, Item(), Item(), Item(), It...]'))
+
     def testTruncateMessage(self):
         self.maxDiff = 1
         message = self._truncateMessage('foo', 'bar')
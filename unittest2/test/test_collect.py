@@ -0,0 +1,241 @@
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+
+from six.moves import StringIO
+
+import unittest2
+from unittest2.collect import collectModule
+
+
+def _collect(source, prefix='test'):
+    found = collectModule(textwrap.dedent(source), prefix)
+    if found is None:
+        return None
+    return [(name, sorted(methods)) for name, methods in found]
+
+
+class TestCollectModule(unittest2.TestCase):
+
+    def test_test_cases(self):
+        found = _collect('''
+            import unittest2 as unittest
+            from unittest2 import TestCase
+
+            class Helper(object):
+                def test_helper(self): pass
+
+            class ZTest(TestCase):
+                def test_z(self): pass
+                def helper(self): pass
+
+            class ATest(Helper, unittest.TestCase):
+                def test_b(self): pass
+                def test_a(self): pass
+
+            class Plain(object):
+                def test_not_collected(self): pass
+            ''')
+        self.assertEqual(found, [
+            ('ATest', [('test_a', None), ('test_b', None),
+                       ('test_helper', None)]),
+            ('ZTest', [('test_z', None)])])
+
+    def test_inherited_and_overridden(self):
+        found = _collect('''
+            import unittest
+            class Base(unittest.TestCase):
+                def test_base(self): pass
+                def test_data(self): pass
+            class Derived(Base):
+                test_data = [1, 2]
+                def test_derived(self): pass
+            ''')
+        self.assertEqual(found, [
+            ('Base', [('test_base', None), ('test_data', None)]),
+            ('Derived', [('test_base', None), ('test_derived', None)])])
+
+    def test_run_test(self):
+        found = _collect('''
+            import unittest2
+            class Single(unittest2.TestCase):
+                def runTest(self): pass
+            ''')
+        self.assertEqual(found, [('Single', [('runTest', None)])])
+
+    def test_prefix(self):
+        found = _collect('''
+            import unittest2
+            class Checks(unittest2.TestCase):
+                def check_a(self): pass
+                def test_b(self): pass
+            ''', prefix='check')
+        self.assertEqual(found, [('Checks', [('check_a', None)])])
+
+    def test_skips(self):
+        found = _collect('''
+            import unittest2
+            from unittest2 import skip, skipIf
+
+            @unittest2.skip('whole class')
+            class Skipped(unittest2.TestCase):
+                def test_a(self): pass
+
+            class Some(unittest2.TestCase):
+                @skip('broken')
+                def test_a(self): pass
+                @skipIf(True, 'maybe')
+                def test_b(self): pass
+                @unittest2.expectedFailure
+                def test_c(self): pass
+                @property
+                def helper(self): pass
+            ''')
+        self.assertEqual(found, [
+            ('Skipped', [('test_a', 'whole class')]),
+            ('Some', [('test_a', 'broken'), ('test_b', None),
+                      ('test_c', None)])])
+
+    def test_main_guard_and_conditional_imports(self):
+        found = _collect('''
+            try:
+                import unittest2 as unittest
+            except ImportError:
+                import unittest
+            import os
+            HERE = os.path.dirname(__file__)
+
+            class Some(unittest.TestCase):
+                def test_a(self): pass
+
+            if __name__ == '__main__':
+                unittest.main()
+            ''')
+        self.assertEqual(found, [('Some', [('test_a', None)])])
+
+    def test_dynamic_modules(self):
+        for source in [
+                'def load_tests(loader, tests, pattern): return tests',
+                'from unittest2 import *',
+                'from .base import BaseTests',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase): pass\n'
+                'Some.test_a = lambda self: None',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase): pass\n'
+                'setattr(Some, "test_a", lambda self: None)',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase): pass\n'
+                'Other = Some',
+                'import unittest2\n'
+                'for i in range(3): pass',
+                'import unittest2\n'
+                'raise unittest2.SkipTest("no")',
+                'import unittest2\n'
+                'if True:\n'
+                '    class Some(unittest2.TestCase): pass',
+                'import unittest2, helpers\n'
+                'class Some(helpers.Base): pass',
+                'import unittest2\n'
+                '@parametrize\n'
+                'class Some(unittest2.TestCase): pass',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase):\n'
+                '    for i in range(3): pass',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase):\n'
+                '    test_alias = helper',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase):\n'
+                '    @unittest2.parametrize(range(3))\n'
+                '    def test_a(self, i): pass',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase):\n'
+                '    @helper\n'
+                '    def test_a(self): pass',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase):\n'
+                '    def test_a(self): pass\n'
+                'Some = wrap(Some)',
+                'import unittest2\n'
+                'class Some(unittest2.TestCase):\n'
+                '    def test_a(self): pass\n'
+                'del Some',
+                'not python (']:
+            self.assertIsNone(_collect(source), source)
+
+
+class TestCollectTests(unittest2.TestCase):
+
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+        self.addCleanup(self.forget)
+        os.makedirs(os.path.join(self.top, 'u2col'))
+        self.write('u2col/__init__.py', '')
+        self.write('u2col/test_static.py',
+                   'import unittest2\n'
+                   'import u2col_missing\n'
+                   'class Static(unittest2.TestCase):\n'
+                   '    def test_b(self): pass\n'
+                   '    @unittest2.skip("later")\n'
+                   '    def test_a(self): pass\n')
+        self.write('u2col/test_dynamic.py',
+                   'import unittest2\n'
+                   'class Dynamic(unittest2.TestCase): pass\n'
+                   'for i in range(2):\n'
+                   '    setattr(Dynamic, "test_%d" % i, lambda self: None)\n')
+
+    def forget(self):
+        if self.top in sys.path:
+            sys.path.remove(self.top)
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'u2col':
+                del sys.modules[name]
+
+    def write(self, name, text):
+        with open(os.path.join(self.top, name), 'w') as f:
+            f.write(text)
+
+    def test_collect_tests(self):
+        loader = unittest2.TestLoader()
+        tests = loader.collectTests(self.top, top_level_dir=self.top,
+                                    index_file=None)
+
+        self.assertEqual([test.id() for test in tests], [
+            'u2col.test_dynamic.Dynamic.test_0',
+            'u2col.test_dynamic.Dynamic.test_1',
+            'u2col.test_static.Static.test_a',
+            'u2col.test_static.Static.test_b'])
+        self.assertEqual(tests[2].skipReason, 'later')
+        self.assertIsNone(tests[3].skipReason)
+        # module level code of the static module was never run
+        self.assertNotIn('u2col.test_static', sys.modules)
+        self.assertIn('u2col.test_dynamic', sys.modules)
+        self.assertEqual(loader.errors, [])
+
+    def test_command_line(self):
+        out = StringIO()
+        original = sys.stdout
+        sys.stdout = out
+        try:
+            program = unittest2.TestProgram(
+                module=None, exit=False,
+                argv=['unit2', 'discover', '--collect-only', '-v',
+                      '-s', self.top, '-t', self.top],
+                testLoader=unittest2.TestLoader())
+        finally:
+            sys.stdout = original
+
+        self.assertEqual(out.getvalue().splitlines(), [
+            'u2col.test_dynamic.Dynamic.test_0',
+            'u2col.test_dynamic.Dynamic.test_1',
+            'u2col.test_static.Static.test_a (skipped: later)',
+            'u2col.test_static.Static.test_b'])
+        self.assertFalse(hasattr(program, 'result'))
+
+
+if __name__ == '__main__':
+    unittest2.main()
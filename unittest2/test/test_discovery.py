@@ -1,7 +1,9 @@
 import os.path
 from os.path import abspath
 import re
+import shutil
 import sys
+import tempfile
 import types
 try:
     import builtins
@@ -28,6 +30,13 @@ class TestableTestProgram(unittest2.TestProgram):
 class TestDiscovery(unittest2.TestCase):
 
     # Heavily mocked tests so I can avoid hitting the filesystem
+    def setUp(self):
+        # list directories with the os.listdir and os.path functions the
+        # tests replace
+        self.addCleanup(setattr, unittest2.loader, '_scandir',
+                        unittest2.loader._scandir)
+        unittest2.loader._scandir = None
+
     def test_get_name_from_path(self):
         loader = unittest2.TestLoader()
 
@@ -834,5 +843,332 @@ class TestDiscovery(unittest2.TestCase):
                          .format(package))
 
 
+class TestDiscoveryIndex(unittest2.TestCase):
+
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+        self.addCleanup(self.forget)
+        self.write('u2idx/__init__.py', '')
+        self.write('u2idx/base.py',
+                   'import unittest2\n'
+                   'class Base(unittest2.TestCase):\n'
+                   '    def test_base(self): pass\n')
+        self.write('u2idx/test_one.py',
+                   'from u2idx.base import Base\n'
+                   'class One(Base):\n'
+                   '    def test_b(self): pass\n'
+                   '    def test_a(self): pass\n')
+        self.write('u2idx/test_loaded.py',
+                   'import unittest2\n'
+                   'class Loaded(unittest2.TestCase):\n'
+                   '    def test_x(self): pass\n'
+                   'def load_tests(loader, tests, pattern):\n'
+                   '    return tests\n')
+
+    def forget(self):
+        if self.top in sys.path:
+            sys.path.remove(self.top)
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'u2idx':
+                del sys.modules[name]
+
+    def write(self, name, text):
+        path = os.path.join(self.top, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def listIds(self):
+        loader = unittest2.TestLoader()
+        imported = []
+        original = loader._get_module_from_name
+        def _get_module_from_name(name):
+            imported.append(name)
+            return original(name)
+        loader._get_module_from_name = _get_module_from_name
+        ids = loader.discoverTestIds(self.top, top_level_dir=self.top)
+        self.forget()
+        return ids, imported
+
+    def test_ids_match_discover(self):
+        ids, imported = self.listIds()
+
+        suite = unittest2.TestLoader().discover(self.top, top_level_dir=self.top)
+        self.assertEqual(ids, [test.id() for test in _flatten(suite)])
+        self.assertEqual(ids, ['u2idx.test_loaded.Loaded.test_x',
+                               'u2idx.base.Base.test_base',
+                               'u2idx.test_one.One.test_a',
+                               'u2idx.test_one.One.test_b',
+                               'u2idx.test_one.One.test_base'])
+        self.assertEqual(imported, ['u2idx', 'u2idx.test_loaded',
+                                    'u2idx.test_one'])
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.top, unittest2.loader.INDEX_FILE)))
+
+    def test_valid_entries_not_imported(self):
+        first, _ = self.listIds()
+        second, imported = self.listIds()
+
+        self.assertEqual(second, first)
+        # only the module with load_tests is imported again
+        self.assertEqual(imported, ['u2idx.test_loaded'])
+
+    def test_changed_files_imported(self):
+        self.listIds()
+        self.write('u2idx/test_one.py',
+                   'from u2idx.base import Base\n'
+                   'class One(Base):\n'
+                   '    def test_c(self): pass\n')
+        ids, imported = self.listIds()
+        self.assertIn('u2idx.test_one.One.test_c', ids)
+        self.assertIn('u2idx.test_one', imported)
+
+    def test_changed_base_class_imported(self):
+        self.listIds()
+        self.write('u2idx/base.py',
+                   'import unittest2\n'
+                   'class Base(unittest2.TestCase):\n'
+                   '    def test_base(self): pass\n'
+                   '    def test_more(self): pass\n')
+        ids, imported = self.listIds()
+        self.assertIn('u2idx.test_one.One.test_more', ids)
+        self.assertIn('u2idx.test_one', imported)
+
+    def test_listed_tests_cannot_run(self):
+        self.listIds()
+        loader = unittest2.TestLoader()
+        loader._index_file = unittest2.loader.INDEX_FILE
+        loader._top_level_dir = self.top
+        sys.path.insert(0, self.top)
+        tests, _ = loader._find_test_path(
+            os.path.join(self.top, 'u2idx', 'test_one.py'), 'test*.py')
+        test = list(tests)[0]
+        self.assertEqual(test.id(), 'u2idx.base.Base.test_base')
+        self.assertRaises(TypeError, test, unittest2.TestResult())
+
+
+@unittest2.skipIf(unittest2.loader._scandir is None, 'requires os.scandir')
+class TestScandirWalk(unittest2.TestCase):
+
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+        self.addCleanup(self.forget)
+        for name in ['u2walk/__init__.py', 'u2walk/test_b.py',
+                     'u2walk/test_a.py', 'u2walk/data.txt',
+                     'u2walk/sub/__init__.py', 'u2walk/sub/test_c.py',
+                     'u2walk/plain/test_d.py',
+                     'u2walk/not-a-package/__init__.py',
+                     'u2walk/not-a-package/test_e.py']:
+            path = os.path.join(self.top, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                if not name.endswith('__init__.py'):
+                    f.write('import unittest2\n'
+                            'class T(unittest2.TestCase):\n'
+                            '    def test_it(self): pass\n')
+
+    def forget(self):
+        if self.top in sys.path:
+            sys.path.remove(self.top)
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'u2walk':
+                del sys.modules[name]
+
+    def discover(self):
+        suite = unittest2.TestLoader().discover(self.top, top_level_dir=self.top)
+        self.forget()
+        return [test.id() for test in _flatten(suite)]
+
+    def test_same_tests_as_listdir(self):
+        original = os.path.isfile
+        checked = []
+        def isfile(path):
+            checked.append(os.path.relpath(path, self.top))
+            return original(path)
+        os.path.isfile = isfile
+        try:
+            found = self.discover()
+        finally:
+            os.path.isfile = original
+
+        self.assertEqual(found, ['u2walk.sub.test_c.T.test_it',
+                                 'u2walk.test_a.T.test_it',
+                                 'u2walk.test_b.T.test_it'])
+        # only directories with importable names are checked for a package
+        self.assertEqual(sorted(checked), [
+            os.path.join('u2walk', '__init__.py'),
+            os.path.join('u2walk', 'plain', '__init__.py'),
+            os.path.join('u2walk', 'sub', '__init__.py')])
+
+        self.addCleanup(setattr, unittest2.loader, '_scandir',
+                        unittest2.loader._scandir)
+        unittest2.loader._scandir = None
+        self.assertEqual(self.discover(), found)
+
+
+class TestDiscoveryFilters(unittest2.TestCase):
+
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+        self.addCleanup(self.forget)
+        for name in ['u2filt/__init__.py', 'u2filt/test_a.py',
+                     'u2filt/check_b.py', 'u2filt/test_slow.py',
+                     'u2filt/vendor/__init__.py', 'u2filt/vendor/test_v.py',
+                     'u2filt/sub/__init__.py', 'u2filt/sub/test_c.py',
+                     'u2filt/sub/data/__init__.py',
+                     'u2filt/sub/data/test_d.py']:
+            path = os.path.join(self.top, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                if not name.endswith('__init__.py'):
+                    f.write('import unittest2\n'
+                            'class T(unittest2.TestCase):\n'
+                            '    def test_it(self): pass\n')
+
+    def forget(self):
+        if self.top in sys.path:
+            sys.path.remove(self.top)
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'u2filt':
+                del sys.modules[name]
+
+    def discover(self, pattern='test*.py', **kwargs):
+        loader = unittest2.TestLoader()
+        listed = []
+        original = unittest2.loader._list_dir
+        def _list_dir(path):
+            listed.append(os.path.relpath(path, self.top).replace(os.sep, '/'))
+            return original(path)
+        unittest2.loader._list_dir = _list_dir
+        try:
+            suite = loader.discover(self.top, pattern, self.top, **kwargs)
+        finally:
+            unittest2.loader._list_dir = original
+        self.forget()
+        modules = [test.id().rsplit('.', 2)[0] for test in _flatten(suite)]
+        return modules, listed
+
+    def test_exclude_prunes_directories(self):
+        modules, listed = self.discover(exclude=['vendor', 'u2filt/sub/data'])
+        self.assertEqual(modules, ['u2filt.sub.test_c', 'u2filt.test_a',
+                                   'u2filt.test_slow'])
+        self.assertNotIn('u2filt/vendor', listed)
+        self.assertNotIn('u2filt/sub/data', listed)
+        self.assertNotIn('u2filt.vendor', sys.modules)
+
+    def test_exclude_files_and_regex(self):
+        modules, _ = self.discover(exclude=['test_slow.py', r're:^u2filt/su'])
+        self.assertEqual(modules, ['u2filt.test_a', 'u2filt.vendor.test_v'])
+
+    def test_include(self):
+        modules, _ = self.discover(include=['check_*.py'],
+                                   exclude=['vendor', 'sub'])
+        self.assertEqual(modules, ['u2filt.check_b', 'u2filt.test_a',
+                                   'u2filt.test_slow'])
+
+    def test_options_not_kept(self):
+        loader = unittest2.TestLoader()
+        loader.discover(self.top, top_level_dir=self.top,
+                        exclude=['vendor', 'sub'], lazy=True)
+        self.forget()
+        suite = loader.discover(self.top, top_level_dir=self.top)
+        self.assertEqual(suite.countTestCases(), 5)
+
+    def test_several_patterns(self):
+        modules, _ = self.discover(['check_*.py', 'test_a.py'],
+                                   exclude=['vendor', 'sub'])
+        self.assertEqual(modules, ['u2filt.check_b', 'u2filt.test_a'])
+
+    def test_lazy(self):
+        self.addCleanup(setattr, sys, 'path', list(sys.path))
+        with open(os.path.join(self.top, 'u2filt', 'test_broken.py'),
+                  'w') as f:
+            f.write('raise ImportError("broken")\n')
+        loader = unittest2.TestLoader()
+        suite = loader.discover(self.top, top_level_dir=self.top,
+                                exclude=['vendor', 'sub'], lazy=True)
+        self.assertNotIn('u2filt.test_a', sys.modules)
+        self.assertEqual(loader.errors, [])
+
+        imported = []
+        class Result(unittest2.TestResult):
+            def startTest(self, test):
+                imported.append(sorted(name for name in sys.modules
+                                       if name.startswith('u2filt.test_')))
+                unittest2.TestResult.startTest(self, test)
+        result = Result()
+        suite.run(result)
+
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('broken', loader.errors[0])
+        # each module is imported when its tests start
+        self.assertEqual(imported, [['u2filt.test_a'], ['u2filt.test_a'],
+                                    ['u2filt.test_a', 'u2filt.test_slow']])
+
+    def test_session_module(self):
+        self.addCleanup(sys.modules.pop, 'sessionfixtures', None)
+        with open(os.path.join(self.top, 'sessionfixtures.py'), 'w') as f:
+            f.write('calls = []\n'
+                    'def setUpSession(): calls.append("setUp")\n'
+                    'def tearDownSession(): calls.append("tearDown")\n')
+        loader = unittest2.TestLoader()
+        suite = loader.discover(self.top, top_level_dir=self.top,
+                                exclude=['vendor', 'sub'])
+        calls = sys.modules['sessionfixtures'].calls
+        self.assertEqual(calls, [])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(calls, ['setUp', 'tearDown'])
+
+    def test_session_module_fails_to_import(self):
+        self.addCleanup(sys.modules.pop, 'sessionfixtures', None)
+        with open(os.path.join(self.top, 'sessionfixtures.py'), 'w') as f:
+            f.write('raise ImportError("no session")\n')
+        loader = unittest2.TestLoader()
+        suite = loader.discover(self.top, top_level_dir=self.top,
+                                exclude=['vendor', 'sub'])
+        self.forget()
+
+        self.assertEqual(len(loader.errors), 1)
+        self.assertIn('no session', loader.errors[0])
+        self.assertEqual([test.id() for test in _flatten(suite)][0],
+                         'unittest2.loader.ModuleImportFailure.sessionfixtures')
+
+    def test_command_line(self):
+        program = TestableTestProgram()
+        class Loader(object):
+            args = []
+            def discover(self, start_dir, pattern, top_level_dir, **kwargs):
+                self.args.append((start_dir, pattern, top_level_dir, kwargs))
+                return 'tests'
+
+        program._do_discovery(['--exclude', 'vendor', '--exclude', 're:x$',
+                               '--include', '*_check.py', '--lazy'],
+                              Loader=Loader)
+        self.assertEqual(Loader.args, [
+            ('.', 'test*.py', None, {'exclude': ['vendor', 're:x$'],
+                                     'include': ['*_check.py'],
+                                     'lazy': True})])
+
+
+def _flatten(suite):
+    for test in suite:
+        if isinstance(test, unittest2.TestSuite):
+            for t in _flatten(test):
+                yield t
+        else:
+            yield test
+
+
 if __name__ == '__main__':
     unittest2.main()
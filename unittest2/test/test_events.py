@@ -0,0 +1,201 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+
+from six.moves import StringIO
+
+import unittest2
+from unittest2 import events, parallel
+
+
+def _outcomesSuite():
+    class Outcomes(unittest2.TestCase):
+        def test_pass(self):
+            pass
+        def test_fail(self):
+            self.fail('broken')
+        def test_error(self):
+            raise ValueError('oops')
+        @unittest2.skip('not today')
+        def test_skip(self):
+            pass
+        @unittest2.expectedFailure
+        def test_expected(self):
+            self.fail('expected')
+        @unittest2.expectedFailure
+        def test_unexpected(self):
+            pass
+        def test_subtests(self):
+            for i in range(3):
+                with self.subTest(i=i):
+                    self.assertNotEqual(i, 1)
+    Outcomes.setUpClass = classmethod(lambda cls: None)
+    return unittest2.TestLoader().loadTestsFromTestCase(Outcomes)
+
+
+def _summary(result):
+    return dict(
+        testsRun=result.testsRun,
+        failures=sorted(test.id() for test, _ in result.failures),
+        errors=sorted(test.id() for test, _ in result.errors),
+        skipped=sorted((test.id(), reason) for test, reason in result.skipped),
+        expectedFailures=sorted(test.id()
+                                for test, _ in result.expectedFailures),
+        unexpectedSuccesses=sorted(test.id()
+                                   for test in result.unexpectedSuccesses),
+        fixturesRun=result.fixturesRun)
+
+
+class TestEncoding(unittest2.TestCase):
+
+    def test_round_trip(self):
+        for event in [
+                ('startTest', 'a.B.test_c', 'test_c (a.B)', None, 12.5),
+                ('startTest', 'a.B.test_c', 'test_c (a.B)', u'd\xe9sc', 1.0),
+                ('stopTest', 'a.B.test_c', 0.25),
+                ('addSuccess', 'a.B.test_c'),
+                ('addFailure', 'a.B.test_c', 'Traceback\n'),
+                ('addSkip', 'a.B.test_c', u'r\xe9ason'),
+                ('addSubTest', 'a.B.test_c', 'a.B.test_c (i=1)',
+                 'test_c (a.B) (i=1)', events.SUBTEST_FAILURE, 'text'),
+                ('addSubTest', 'a.B.test_c', 'a.B.test_c (i=1)',
+                 'test_c (a.B) (i=1)', events.SUBTEST_SUCCESS, None),
+                ('chunkDone', 7, 1.5),
+                ('addDuration', 'a.B.test_c', 0.5, 0.25),
+                ('startFixture', 'setUpClass (a.B)'),
+                ('stopFixture', 'setUpClass (a.B)', 0.5, 0.25)]:
+            frame = events.encode(event)
+            length = struct.unpack('>I', frame[:4])[0]
+            self.assertEqual(length, len(frame) - 4)
+            self.assertEqual(events.decode(frame[4:]), event)
+
+    def test_reader_accepts_pieces(self):
+        data = events.HEADER + events.encode(('addSuccess', 'x.Y.test_z')) + \
+            events.encode(('stopTest', 'x.Y.test_z', 1.0))
+        reader = events.EventReader()
+        decoded = []
+        for i in range(len(data)):
+            decoded.extend(reader.feed(data[i:i + 1]))
+        self.assertEqual(decoded, [('addSuccess', 'x.Y.test_z'),
+                                   ('stopTest', 'x.Y.test_z', 1.0)])
+
+    def test_reader_checks_header(self):
+        self.assertRaises(ValueError, events.EventReader().feed,
+                          b'nope' + b'\x01')
+        self.assertRaises(ValueError, events.EventReader().feed,
+                          events.MAGIC + b'\x63')
+
+    def test_unknown_events_skipped(self):
+        unknown = b'\xfe\x00\x00'
+        data = (events.HEADER + struct.pack('>I', len(unknown)) + unknown +
+                events.encode(('addSuccess', 'x.Y.test_z')))
+        self.assertEqual(events.EventReader().feed(data),
+                         [('addSuccess', 'x.Y.test_z')])
+
+
+class TestReplay(unittest2.TestCase):
+
+    def record(self):
+        stream = io.BytesIO()
+        result = events.EventStreamResult(events.EventWriter(stream))
+        _outcomesSuite().run(result)
+        return stream.getvalue()
+
+    def test_replay_matches_direct_run(self):
+        data = self.record()
+        direct = unittest2.TestResult()
+        _outcomesSuite().run(direct)
+
+        replayed = events.replay(io.BytesIO(data), unittest2.TestResult())
+
+        self.assertEqual(_summary(replayed), _summary(direct))
+        text = dict((test.id().rpartition('.')[2], err)
+                    for test, err in replayed.failures)
+        self.assertIn('AssertionError: broken', text['test_fail'])
+        self.assertEqual(
+            sorted(name for name, _, _ in replayed.collectedDurations),
+            sorted(name for name, _, _ in direct.collectedDurations))
+
+    def test_replay_into_text_result(self):
+        stream = StringIO()
+        result = unittest2.TextTestResult(unittest2.runner._WritelnDecorator(
+            stream), True, 2)
+
+        events.replay(io.BytesIO(self.record()), result)
+
+        test = [test for test in _outcomesSuite()
+                if test.id().endswith('.test_pass')][0]
+        self.assertIn('%s ... ok' % test, stream.getvalue())
+
+    def test_subtest_successes_only_if_wanted(self):
+        class SubTestResult(unittest2.TestResult):
+            def addSubTest(self, test, subtest, err):
+                pass
+
+        def outcomes(makeResult):
+            stream = io.BytesIO()
+            _outcomesSuite().run(makeResult(events.EventWriter(stream)))
+            return [event[4] for event
+                    in events.EventReader().feed(stream.getvalue())
+                    if event[0] == 'addSubTest']
+
+        self.assertEqual(outcomes(events.EventStreamResult),
+                         [events.SUBTEST_FAILURE])
+        self.assertEqual(
+            outcomes(lambda writer: events.EventStreamResult(writer, True)),
+            [events.SUBTEST_SUCCESS, events.SUBTEST_FAILURE,
+             events.SUBTEST_SUCCESS])
+        self.assertEqual(
+            outcomes(lambda writer: events.RecordingResult(
+                unittest2.TestResult(), writer)),
+            [events.SUBTEST_FAILURE])
+        self.assertEqual(
+            outcomes(lambda writer: events.RecordingResult(
+                SubTestResult(), writer)),
+            [events.SUBTEST_SUCCESS, events.SUBTEST_FAILURE,
+             events.SUBTEST_SUCCESS])
+
+    def test_truncated_stream(self):
+        data = events.HEADER + events.encode(
+            ('startTest', 'a.B.test_c', 'test_c (a.B)', None, 0.0))
+        data += events.encode(('addSuccess', 'a.B.test_c'))[:-3]
+
+        result = events.replay(io.BytesIO(data), unittest2.TestResult())
+
+        self.assertEqual(result.testsRun, 1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][0].id(), 'a.B.test_c')
+
+
+class TestEventLog(unittest2.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, 'events')
+
+    def check_log(self, **kwargs):
+        runner = unittest2.TextTestRunner(stream=StringIO(),
+                                          event_log=self.path, **kwargs)
+        result = runner.run(unittest2.TestSuite([_outcomesSuite(),
+                                                 _outcomesSuite()]))
+
+        f = open(self.path, 'rb')
+        try:
+            replayed = events.replay(f, unittest2.TestResult())
+        finally:
+            f.close()
+        self.assertEqual(_summary(replayed), _summary(result))
+
+    def test_serial(self):
+        self.check_log()
+
+    @unittest2.skipUnless(parallel.canFork(), 'requires os.fork')
+    def test_parallel(self):
+        self.check_log(workers=2)
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -1522,5 +1522,177 @@ class Test_TestLoader(unittest2.TestCase):
         ref_suite = unittest.TestSuite([MyTestCase('test')])
         self.assertEqual(list(suite), [ref_suite])
 
+
+class Test_TestHandles(unittest2.TestCase):
+
+    def loader(self):
+        loader = unittest2.TestLoader()
+        loader.testHandles = True
+        return loader
+
+    def test_suite_holds_handles(self):
+        class Foo(unittest2.TestCase):
+            def test_1(self):
+                "First test."
+            def test_2(self): pass
+
+        suite = self.loader().loadTestsFromTestCase(Foo)
+
+        tests = list(suite)
+        self.assertTrue(all(isinstance(test, unittest2.case.TestHandle)
+                            for test in tests))
+        self.assertEqual(suite, unittest2.TestSuite([Foo('test_1'),
+                                                     Foo('test_2')]))
+        self.assertEqual(suite.countTestCases(), 2)
+        self.assertEqual([test.id() for test in tests],
+                         [Foo('test_1').id(), Foo('test_2').id()])
+        self.assertEqual(str(tests[0]), str(Foo('test_1')))
+        self.assertEqual(tests[0].shortDescription(), 'First test.')
+        self.assertEqual(hash(tests[0]), hash(Foo('test_1')))
+        self.assertNotEqual(tests[0], Foo('test_2'))
+
+    def test_overridden_id(self):
+        class Foo(unittest2.TestCase):
+            def id(self):
+                return 'custom ' + self._testMethodName
+            def test_1(self): pass
+
+        test = list(self.loader().loadTestsFromTestCase(Foo))[0]
+        self.assertEqual(test.id(), 'custom test_1')
+
+    def test_run_with_fixtures(self):
+        events = []
+        instances = []
+        class Foo(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                events.append('setUpClass')
+            @classmethod
+            def tearDownClass(cls):
+                events.append('tearDownClass')
+            def test_1(self):
+                instances.append(self)
+                events.append('test_1')
+            def test_2(self):
+                events.append('test_2')
+                self.fail('no')
+
+        suite = self.loader().loadTestsFromTestCase(Foo)
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(events, ['setUpClass', 'test_1', 'test_2',
+                                  'tearDownClass'])
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(result.failures[0][0].id(), Foo('test_2').id())
+        # the instance is not kept in the suite after it ran
+        self.assertEqual(list(suite), [None, None])
+
+
+class Test_Parametrize(unittest2.TestCase):
+
+    def setUp(self):
+        self.reads = reads = []
+        def params():
+            for name, value in [('one', 1), ('two', 2), ('three', 3)]:
+                reads.append(name)
+                yield name, value
+
+        class Foo(unittest2.TestCase):
+            @unittest2.parametrize(params, ids=lambda item: item[0])
+            def test_number(self, name, value):
+                self.assertNotEqual(name, 'two')
+            def test_plain(self):
+                pass
+        self.Foo = Foo
+        self.module = types.ModuleType('m')
+        self.module.Foo = Foo
+
+    def test_loadTestsFromTestCase(self):
+        suite = unittest2.TestLoader().loadTestsFromTestCase(self.Foo)
+        self.assertEqual(self.reads, [])
+        self.assertEqual([test.id().split('.')[-1] for test in
+                          unittest2.loader._flatten(suite)],
+                         ['test_number[one]', 'test_number[two]',
+                          'test_number[three]', 'test_plain'])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual([str(test) for test, _ in result.failures],
+                         [str(self.Foo('test_number[two]'))])
+
+    def test_loadTestsFromName(self):
+        loader = unittest2.TestLoader()
+        suite = loader.loadTestsFromName('Foo.test_number[two]', self.module)
+        self.assertEqual(list(suite), [self.Foo('test_number[two]')])
+        # the cases after the one asked for are not read
+        self.assertEqual(self.reads[:2], ['one', 'two'])
+        self.assertEqual(self.reads.count('three'), 0)
+
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(len(result.failures), 1)
+
+    def test_loadTestsFromName_method(self):
+        loader = unittest2.TestLoader()
+        suite = loader.loadTestsFromName('Foo.test_number', self.module)
+        self.assertEqual(self.reads, [])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(len(result.failures), 1)
+
+    def test_loadTestsFromName_unknown_case(self):
+        loader = unittest2.TestLoader()
+        suite = loader.loadTestsFromName('Foo.test_number[four]', self.module)
+        self.assertEqual(len(loader.errors), 1)
+        self.assertIn('test_number[four]', loader.errors[0])
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(len(result.errors), 1)
+        self.assertRaises(ValueError, self.Foo, 'test_plain[one]')
+
+    def test_loadTestsFromName_id_with_dots(self):
+        class Foo(unittest2.TestCase):
+            @unittest2.parametrize([1.5, 2.5], ids=str)
+            def test(self, value):
+                pass
+        self.module.Foo = Foo
+        loader = unittest2.TestLoader()
+        suite = loader.loadTestsFromName('Foo.test[2.5]', self.module)
+        self.assertEqual(loader.errors, [])
+        self.assertEqual(list(suite), [Foo('test[2.5]')])
+
+    def test_argument_forms(self):
+        calls = []
+        class Foo(unittest2.TestCase):
+            @unittest2.parametrize([1, (2, 3), [4]])
+            def test(self, *args):
+                calls.append(args)
+
+        unittest2.TestLoader().loadTestsFromTestCase(Foo).run(
+            unittest2.TestResult())
+        self.assertEqual(calls, [(1,), (2, 3), ([4],)])
+
+    def test_skip_and_expected_failure(self):
+        class Foo(unittest2.TestCase):
+            @unittest2.parametrize([1, 2])
+            @unittest2.expectedFailure
+            def test_fails(self, i):
+                self.fail()
+            @unittest2.parametrize([1])
+            @unittest2.skip('no')
+            def test_skipped(self, i):
+                pass
+
+        result = unittest2.TestResult()
+        unittest2.TestLoader().loadTestsFromTestCase(Foo).run(result)
+        self.assertEqual(len(result.expectedFailures), 2)
+        self.assertEqual(len(result.skipped), 1)
+
+
 if __name__ == '__main__':
     unittest2.main()
@@ -1,8 +1,10 @@
+import io
 import unittest
 
 from six.moves import StringIO
 
 import unittest2
+from unittest2 import events
 from unittest2.test.support import resultFactory
 
 
@@ -41,6 +43,61 @@ class TestUnittest(unittest2.TestCase):
         self.assertEqual(result.testsRun, 1)
         self.assertEqual(len(result.errors), 0)
 
+    def test_old_result_durations(self):
+        class Result(unittest.TestResult):
+            # as in the standard library, without the CPU time
+            def addDuration(self, test, elapsed):
+                self.durations = [(str(test), elapsed)]
+        class Test(unittest2.TestCase):
+            def testOne(self):
+                pass
+
+        result = Result()
+        Test('testOne').run(result)
+        self.assertEqual([name for name, _ in result.durations],
+                         [str(Test('testOne'))])
+
+    def test_old_result_fixture_durations(self):
+        class Result(unittest.TestResult):
+            # without stopFixture, so fixtures only get durations
+            def __init__(self):
+                super(Result, self).__init__()
+                self.durations = []
+            def addDuration(self, test, elapsed):
+                self.durations.append(str(test))
+        class Test(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+            def testOne(self):
+                pass
+
+        result = Result()
+        unittest2.TestSuite([Test('testOne')]).run(result)
+        self.assertEqual(result.durations,
+                         ['setUpClass (%s)' % unittest2.util.strclass(Test),
+                          str(Test('testOne'))])
+
+    def test_old_result_durations_event_log(self):
+        class Result(unittest.TestResult):
+            def __init__(self):
+                super(Result, self).__init__()
+                self.durations = []
+            def addDuration(self, test, elapsed):
+                self.durations.append(test.id())
+        class Test(unittest2.TestCase):
+            def testOne(self):
+                pass
+
+        stream = io.BytesIO()
+        result = Result()
+        Test('testOne').run(events.RecordingResult(
+            result, events.EventWriter(stream)))
+        self.assertEqual(result.durations, [Test('testOne').id()])
+
+        replayed = events.replay(io.BytesIO(stream.getvalue()), Result())
+        self.assertEqual(replayed.durations, [Test('testOne').id()])
+
     def test_multiple_inheritance_setup(self):
         test = self
         test.setup_called = False
@@ -0,0 +1,443 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+from six.moves import StringIO
+
+import unittest2
+from unittest2 import events, parallel
+
+
+def _record(path, line):
+    f = open(path, 'a')
+    try:
+        f.write('%s %d\n' % (line, os.getpid()))
+    finally:
+        f.close()
+
+
+def _makeModule(name, log):
+    module = types.ModuleType(name)
+    def setUpModule():
+        _record(log, 'setUpModule')
+    module.setUpModule = setUpModule
+    sys.modules[name] = module
+    return module
+
+
+def _makeClass(module, name, log, **methods):
+    def setUpClass(cls):
+        _record(log, 'setUpClass %s' % cls.__name__)
+    attrs = {'__module__': module.__name__,
+             'setUpClass': classmethod(setUpClass)}
+    attrs.update(methods)
+    return type(name, (unittest2.TestCase,), attrs)
+
+
+def _passing(self):
+    pass
+
+
+@unittest2.skipUnless(parallel.canFork(), 'requires os.fork')
+class TestParallelRun(unittest2.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.log = os.path.join(self.tempdir, 'log')
+        self.module = _makeModule('unittest2_parallel_fixtures', self.log)
+        self.addCleanup(sys.modules.pop, self.module.__name__)
+
+    def readLog(self):
+        f = open(self.log)
+        try:
+            return [line.split() for line in f]
+        finally:
+            f.close()
+
+    def runSuite(self, suite, **kwargs):
+        kwargs.setdefault('durations_file',
+                          os.path.join(self.tempdir, 'durations'))
+        runner = unittest2.TextTestRunner(stream=StringIO(), **kwargs)
+        return runner.run(suite)
+
+    def test_outcomes_merged(self):
+        def test_fail(self):
+            self.fail('broken')
+        def test_error(self):
+            raise ValueError('oops')
+        @unittest2.skip('not today')
+        def test_skip(self):
+            pass
+        @unittest2.expectedFailure
+        def test_expected(self):
+            self.fail('expected')
+        @unittest2.expectedFailure
+        def test_unexpected(self):
+            pass
+        def test_subtests(self):
+            for i in range(3):
+                with self.subTest(i=i):
+                    self.assertNotEqual(i, 1)
+        One = _makeClass(self.module, 'One', self.log, test_a=_passing,
+                         test_fail=test_fail, test_error=test_error)
+        Two = _makeClass(self.module, 'Two', self.log, test_skip=test_skip,
+                         test_expected=test_expected,
+                         test_unexpected=test_unexpected)
+        Three = _makeClass(self.module, 'Three', self.log,
+                           test_subtests=test_subtests)
+        loader = unittest2.TestLoader()
+        def makeSuite():
+            return unittest2.TestSuite(
+                loader.loadTestsFromTestCase(cls) for cls in (One, Two, Three))
+
+        serial = self.runSuite(makeSuite())
+        result = self.runSuite(makeSuite(), workers=3)
+
+        self.assertEqual(result.testsRun, serial.testsRun)
+        for attr in ('failures', 'errors', 'skipped', 'expectedFailures',
+                     'unexpectedSuccesses'):
+            self.assertEqual(len(getattr(result, attr)),
+                             len(getattr(serial, attr)), attr)
+        self.assertEqual(sorted(test.id() for test, _ in result.failures),
+                         sorted(test.id() for test, _ in serial.failures))
+        self.assertIn('broken', dict((t.id(), e) for t, e in result.failures)[
+            'unittest2_parallel_fixtures.One.test_fail'])
+        self.assertIn("ValueError: oops", result.errors[0][1])
+        self.assertEqual(result.skipped[0][1], 'not today')
+
+    def test_fixtures_once_per_worker(self):
+        classes = [_makeClass(self.module, 'Test%d' % i, self.log,
+                              test_one=_passing, test_two=_passing)
+                   for i in range(4)]
+        loader = unittest2.TestLoader()
+        suite = unittest2.TestSuite(
+            loader.loadTestsFromTestCase(cls) for cls in classes)
+
+        result = self.runSuite(suite, workers=2)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(result.testsRun, 8)
+        lines = self.readLog()
+        classSetUps = sorted(line[1] for line in lines
+                             if line[0] == 'setUpClass')
+        self.assertEqual(classSetUps, ['Test0', 'Test1', 'Test2', 'Test3'])
+        modulePids = [line[1] for line in lines if line[0] == 'setUpModule']
+        self.assertEqual(len(modulePids), 2)
+        self.assertEqual(len(set(modulePids)), 2)
+
+    def test_parametrized(self):
+        @unittest2.parametrize(range(5))
+        def test_each(self, i):
+            self.assertNotEqual(i, 3)
+        A = _makeClass(self.module, 'A', self.log, test_each=test_each)
+        B = _makeClass(self.module, 'B', self.log, test_b=_passing)
+        suite = unittest2.TestSuite([
+            unittest2.TestLoader().loadTestsFromTestCase(cls)
+            for cls in (A, B)])
+
+        result = self.runSuite(suite, workers=2)
+
+        self.assertEqual(result.testsRun, 6)
+        self.assertEqual([test.id() for test, _ in result.failures],
+                         ['unittest2_parallel_fixtures.A.test_each[3]'])
+
+    def test_durations_recorded(self):
+        One = _makeClass(self.module, 'One', self.log, test_a=_passing)
+        Two = _makeClass(self.module, 'Two', self.log, test_b=_passing)
+        suite = unittest2.TestSuite([One('test_a'), Two('test_b')])
+        path = os.path.join(self.tempdir, 'durations')
+
+        self.runSuite(suite, workers=2, durations_file=path)
+
+        store = parallel.DurationStore(path)
+        self.assertEqual(sorted(store.tests),
+                         ['unittest2_parallel_fixtures.One.test_a',
+                          'unittest2_parallel_fixtures.Two.test_b'])
+        self.assertEqual(sorted(store.classes),
+                         ['unittest2_parallel_fixtures.One',
+                          'unittest2_parallel_fixtures.Two'])
+
+    def test_worker_crash_reported(self):
+        def test_exit(self):
+            os._exit(3)
+        Test = _makeClass(self.module, 'Crash', self.log, test_exit=test_exit)
+        Other = _makeClass(self.module, 'Other', self.log, test_ok=_passing)
+        suite = unittest2.TestSuite([Test('test_exit'), Other('test_ok')])
+
+        result = self.runSuite(suite, workers=2)
+
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(len(result.errors), 1)
+        test, text = result.errors[0]
+        self.assertEqual(test.id(),
+                         'unittest2_parallel_fixtures.Crash.test_exit')
+        self.assertIn('exited with status 3', text)
+
+    def test_uneven_chunks_shared(self):
+        import time
+        def test_slow(self):
+            time.sleep(0.3)
+        Slow = _makeClass(self.module, 'Slow', self.log, test_slow=test_slow)
+        fast = [_makeClass(self.module, 'Fast%d' % i, self.log,
+                           test_fast=_passing) for i in range(6)]
+        suite = unittest2.TestSuite(
+            [Slow('test_slow')] + [cls('test_fast') for cls in fast])
+
+        result = self.runSuite(suite, workers=2)
+
+        self.assertEqual(result.testsRun, 7)
+        pids = {}
+        for line in self.readLog():
+            if line[0] == 'setUpClass':
+                pids.setdefault(line[2], []).append(line[1])
+        # the fast classes all went to the worker not stuck on Slow
+        self.assertEqual(sorted(len(names) for names in pids.values()),
+                         [1, 6])
+
+    def test_verbose_output_not_interleaved(self):
+        import time
+        def test_sleep(self):
+            time.sleep(0.05)
+        classes = [_makeClass(self.module, 'Test%d' % i, self.log,
+                              test_sleep=test_sleep) for i in range(4)]
+        stream = StringIO()
+        runner = unittest2.TextTestRunner(stream=stream, verbosity=2,
+                                          workers=4)
+
+        runner.run(unittest2.TestSuite(cls('test_sleep') for cls in classes))
+
+        lines = stream.getvalue().splitlines()
+        for i in range(4):
+            self.assertIn('test_sleep (unittest2_parallel_fixtures.Test%d) '
+                          '... ok' % i, lines)
+
+    def test_failfast(self):
+        def test_fail(self):
+            self.fail('broken')
+        Test = _makeClass(self.module, 'Fail', self.log, test_fail=test_fail)
+        Other = _makeClass(self.module, 'Other', self.log, test_ok=_passing)
+        suite = unittest2.TestSuite([Test('test_fail'), Other('test_ok')])
+
+        result = self.runSuite(suite, workers=2, failfast=True)
+
+        self.assertTrue(result.shouldStop)
+        self.assertEqual(len(result.failures), 1)
+
+
+class TestChunks(unittest2.TestCase):
+
+    def test_chunks_follow_classes(self):
+        class A(unittest2.TestCase):
+            def test_1(self):
+                pass
+            def test_2(self):
+                pass
+        class B(unittest2.TestCase):
+            def test_1(self):
+                pass
+        suite = unittest2.TestSuite([
+            unittest2.TestSuite([A('test_1'), A('test_2')]),
+            B('test_1'), A('test_1')])
+
+        chunks = parallel._findChunks(suite)
+
+        self.assertEqual(chunks, [[A('test_1'), A('test_2')], [B('test_1')],
+                                  [A('test_1')]])
+
+    def test_parametrized_suite_kept_whole(self):
+        reads = []
+        def params():
+            for i in range(3):
+                reads.append(i)
+                yield i
+        class A(unittest2.TestCase):
+            @unittest2.parametrize(params)
+            def test_each(self, i):
+                pass
+            def test_plain(self):
+                pass
+        suite = unittest2.TestLoader().loadTestsFromTestCase(A)
+
+        chunks = parallel._findChunks(suite)
+        parallel.preload(suite)
+
+        self.assertEqual(len(chunks), 1)
+        self.assertIsInstance(chunks[0][0], unittest2.ParametrizedSuite)
+        self.assertEqual(chunks[0][1:], [A('test_plain')])
+        self.assertEqual(reads, [])
+
+    def test_queue_longest_first_with_module_affinity(self):
+        class A(unittest2.TestCase):
+            def test_1(self):
+                pass
+        class B(unittest2.TestCase):
+            def test_1(self):
+                pass
+        B.__module__ = 'other'
+        chunks = [[A('test_1')], [B('test_1')], [A('test_1')], [B('test_1')]]
+        queue = parallel._Queue(chunks, [1, 10, 2, 3])
+
+        self.assertEqual(queue.take(), 1)
+        self.assertEqual(queue.take('other'), 3)
+        self.assertEqual(queue.take('other'), 2)
+        self.assertEqual(queue.take(A.__module__), 0)
+        self.assertIsNone(queue.take())
+
+    def test_split_large_classes_without_fixtures(self):
+        class Plain(unittest2.TestCase):
+            def test_1(self):
+                pass
+        class Fixtures(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+            def test_1(self):
+                pass
+        plain = [Plain('test_1')] * 8
+        fixtures = [Fixtures('test_1')] * 8
+
+        chunks, estimates = parallel._splitLarge(
+            [plain, fixtures, [Plain('test_1')]], [8, 8, 1], 2)
+
+        self.assertEqual([len(chunk) for chunk in chunks],
+                         [2, 2, 2, 2, 8, 1])
+        self.assertEqual(estimates, [2, 2, 2, 2, 8, 1])
+
+    def test_single_worker_runs_in_process(self):
+        class A(unittest2.TestCase):
+            def test_pid(self):
+                self.pid = os.getpid()
+        test = A('test_pid')
+        result = unittest2.TestResult()
+
+        parallel.runTests(unittest2.TestSuite([test]), result, 4)
+
+        self.assertEqual(result.testsRun, 1)
+        self.assertEqual(test.pid, os.getpid())
+
+    def test_single_worker_writes_events(self):
+        class A(unittest2.TestCase):
+            def test_one(self):
+                pass
+        stream = io.BytesIO()
+        result = unittest2.TestResult()
+
+        parallel.runTests(unittest2.TestSuite([A('test_one')]), result, 4,
+                          writer=events.EventWriter(stream))
+
+        self.assertEqual(result.testsRun, 1)
+        replayed = events.replay(io.BytesIO(stream.getvalue()),
+                                 unittest2.TestResult())
+        self.assertEqual(replayed.testsRun, 1)
+
+
+class TestPreload(unittest2.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        sys.path.insert(0, self.tempdir)
+        self.addCleanup(sys.path.remove, self.tempdir)
+
+    def writeModule(self, name, source):
+        path = os.path.join(self.tempdir, name + '.py')
+        f = open(path, 'w')
+        f.write(source)
+        f.close()
+        self.addCleanup(sys.modules.pop, name, None)
+        return path
+
+    def test_imports_of(self):
+        module = types.ModuleType('pkg.sub.mod')
+        module.__file__ = self.writeModule('unittest2_preload_mod', (
+            'import os, sys\n'
+            'from json import dumps\n'
+            'from . import sibling\n'
+            'from ..other import thing\n'
+            'def f():\n'
+            '    import unittest2_preload_inner\n'))
+
+        self.assertEqual(sorted(parallel._importsOf(module)),
+                         ['json', 'os', 'pkg.other', 'pkg.sub', 'sys',
+                          'unittest2_preload_inner'])
+
+    def test_preload_imports_nested_imports(self):
+        self.writeModule('unittest2_preload_target', 'x = 1\n')
+        self.writeModule('unittest2_preload_tests', (
+            'import unittest2\n'
+            'class Test(unittest2.TestCase):\n'
+            '    def test_it(self):\n'
+            '        import unittest2_preload_target\n'
+            '        import unittest2_preload_missing\n'))
+        import unittest2_preload_tests
+        suite = unittest2.TestLoader().loadTestsFromModule(
+            unittest2_preload_tests)
+
+        parallel.preload(suite)
+
+        self.assertIn('unittest2_preload_target', sys.modules)
+        self.assertNotIn('unittest2_preload_missing', sys.modules)
+
+    def test_preload_names(self):
+        self.writeModule('unittest2_preload_target', 'x = 1\n')
+
+        parallel.preload(unittest2.TestSuite(), ['unittest2_preload_target'])
+
+        self.assertIn('unittest2_preload_target', sys.modules)
+
+
+class TestDurationStore(unittest2.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, 'durations')
+
+    def test_save_and_load(self):
+        store = parallel.DurationStore(self.path)
+        store.tests['a.B.test_c'] = 1.5
+        store.classes['a.B'] = 3.0
+        store.save()
+
+        store = parallel.DurationStore(self.path)
+
+        self.assertEqual(store.tests, {'a.B.test_c': 1.5})
+        self.assertEqual(store.classes, {'a.B': 3.0})
+
+    def test_corrupt_file_ignored(self):
+        f = open(self.path, 'w')
+        f.write('{not json')
+        f.close()
+
+        store = parallel.DurationStore(self.path)
+
+        self.assertEqual(store.tests, {})
+
+    def test_estimate(self):
+        class Slow(unittest2.TestCase):
+            def test_1(self):
+                pass
+            def test_2(self):
+                pass
+        class New(unittest2.TestCase):
+            def test_1(self):
+                pass
+        store = parallel.DurationStore(self.path)
+        self.assertEqual(store.estimate([[Slow('test_1'), Slow('test_2')],
+                                         [New('test_1')]]), [2.0, 1.0])
+
+        store.tests[Slow('test_1').id()] = 2.0
+        store.tests[Slow('test_2').id()] = 4.0
+        store.classes[unittest2.util.strclass(Slow)] = 10.0
+
+        # unknown tests count as the mean known duration
+        self.assertEqual(store.estimate([[Slow('test_1'), Slow('test_2')],
+                                         [New('test_1')]]), [16.0, 3.0])
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -258,6 +258,61 @@ class TestCommandLineArgs(unittest2.TestCase):
                                                'tb_locals': True,
                                                'verbosity': 1})
 
+    def test_workers(self):
+        program = self.program
+
+        program.testRunner = FakeRunner
+        program.parseArgs([None, '-j', '4'])
+        self.assertEqual(program.workers, 4)
+        program.runTests()
+        self.assertEqual(FakeRunner.initArgs, {'buffer': False,
+                                               'failfast': False,
+                                               'tb_locals': False,
+                                               'verbosity': 1,
+                                               'workers': 4})
+
+    def test_durations_file(self):
+        program = self.program
+
+        program.testRunner = FakeRunner
+        program.parseArgs([None, '-j', '4', '--durations-file'])
+        self.assertEqual(program.durations_file,
+                         unittest2.parallel.DURATIONS_FILE)
+        program.runTests()
+        self.assertEqual(FakeRunner.initArgs, {
+            'buffer': False, 'failfast': False, 'tb_locals': False,
+            'verbosity': 1, 'workers': 4,
+            'durations_file': unittest2.parallel.DURATIONS_FILE})
+
+        program.parseArgs([None, '--durations-file', 'times.json'])
+        self.assertEqual(program.durations_file, 'times.json')
+
+    def test_durations(self):
+        program = self.program
+
+        program.testRunner = FakeRunner
+        program.parseArgs([None, '--durations', '5'])
+        self.assertEqual(program.durations, 5)
+        program.runTests()
+        self.assertEqual(FakeRunner.initArgs, {'buffer': False,
+                                               'failfast': False,
+                                               'tb_locals': False,
+                                               'verbosity': 1,
+                                               'durations': 5})
+
+    def test_group_fixtures(self):
+        program = self.program
+
+        program.testRunner = FakeRunner
+        program.parseArgs([None, '--group-fixtures'])
+        self.assertTrue(program.group_fixtures)
+        program.runTests()
+        self.assertEqual(FakeRunner.initArgs, {'buffer': False,
+                                               'failfast': False,
+                                               'tb_locals': False,
+                                               'verbosity': 1,
+                                               'group_fixtures': True})
+
     def testRunTestsOldRunnerClass(self):
         program = self.program
 
@@ -278,6 +333,19 @@ class TestCommandLineArgs(unittest2.TestCase):
         self.assertEqual(FakeRunner.test, 'test')
         self.assertIs(program.result, RESULT)
 
+    def test_options_not_accepted(self):
+        program = self.program
+
+        FakeRunner.raiseError = 1
+        program.testRunner = FakeRunner
+        program.parseArgs([None, '-j', '4', '--locals'])
+        with support.captured_stdout() as stdout:
+            with self.assertRaises(SystemExit):
+                program.runTests()
+        self.assertIn('FakeRunner does not accept: tb_locals, workers',
+                      stdout.getvalue())
+        self.assertIsNone(FakeRunner.test)
+
     def testCatchBreakInstallsHandler(self):
         module = sys.modules['unittest2.main']
         original = module.installHandler
@@ -1,6 +1,9 @@
+import gc
+import pickle
 import sys
 import textwrap
 import traceback2 as traceback
+import weakref
 
 import six
 from six.moves import StringIO
@@ -41,6 +44,7 @@ class Test_TestResult(unittest2.TestCase):
         self.assertEqual(len(result.failures), 0)
         self.assertEqual(result.testsRun, 0)
         self.assertEqual(result.shouldStop, False)
+        self.assertEqual(result.collectedDurations, [])
         self.assertIsNone(result._stdout_buffer)
         self.assertIsNone(result._stderr_buffer)
 
@@ -103,6 +107,28 @@ class Test_TestResult(unittest2.TestCase):
         self.assertEqual(result.testsRun, 1)
         self.assertEqual(result.shouldStop, False)
 
+    def test_addDuration(self):
+        class Foo(unittest2.TestCase):
+            def test_1(self):
+                pass
+            @unittest2.skip('skipped')
+            def test_2(self):
+                pass
+
+        result = unittest2.TestResult()
+        Foo('test_1').run(result)
+        Foo('test_2').run(result)
+
+        self.assertEqual(len(result.collectedDurations), 1)
+        name, elapsed, cpu = result.collectedDurations[0]
+        self.assertEqual(name, str(Foo('test_1')))
+        self.assertGreaterEqual(elapsed, 0)
+        self.assertGreaterEqual(cpu, 0)
+
+        result.addDuration(Foo('test_1'), 1.5)
+        self.assertEqual(result.collectedDurations[1],
+                         (str(Foo('test_1')), 1.5, None))
+
     # "Called before and after tests are run. The default implementation does nothing."
     def test_startTestRun_stopTestRun(self):
         result = unittest2.TestResult()
@@ -261,6 +287,43 @@ class Test_TestResult(unittest2.TestCase):
         test_case, formatted_exc = result.errors[0]
         self.assertEqual('A tracebacklocals', formatted_exc)
 
+    def test_addExpectedFailure_formats_lazily(self):
+        class Foo(unittest2.TestCase):
+            def test_1(self):
+                pass
+
+        class Big(object):
+            pass
+
+        def fail(big):
+            try:
+                raise ValueError('expected')
+            except ValueError:
+                # caught here so Python 2 doesn't keep big alive as the
+                # current exception of the test's frame
+                return sys.exc_info()
+
+        test = Foo('test_1')
+        big = Big()
+        alive = weakref.ref(big)
+        exc_info_tuple = fail(big)
+        del big
+
+        result = unittest2.TestResult()
+        result.addExpectedFailure(test, exc_info_tuple)
+        expected = ''.join(traceback.format_exception(*exc_info_tuple))
+        del exc_info_tuple
+        gc.collect()
+        self.assertIsNone(alive())
+
+        test_case, formatted_exc = result.expectedFailures[0]
+        self.assertIs(test_case, test)
+        self.assertIsInstance(formatted_exc, str)
+        self.assertEqual(formatted_exc, expected)
+        self.assertIn("raise ValueError('expected')", formatted_exc)
+        self.assertTrue(formatted_exc.endswith('ValueError: expected\n'))
+        self.assertEqual(pickle.loads(pickle.dumps(formatted_exc)), expected)
+
     def test_addSubTest(self):
         log = []
         class Foo(unittest.TestCase):
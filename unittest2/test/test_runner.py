@@ -69,6 +69,39 @@ class TestCleanUp(unittest2.TestCase):
         self.assertEqual((Type1, instance1), (Exception, exc1))
         self.assertEqual((Type2, instance2), (Exception, exc2))
 
+    def testPartExecutor(self):
+        class TestableTest(unittest2.TestCase):
+            def testNothing(self):
+                pass
+
+        test = TestableTest('testNothing')
+        outcome = _Outcome()
+
+        with outcome.testPartExecutor(test):
+            raise unittest2.SkipTest('reason')
+        self.assertFalse(outcome.success)
+        self.assertEqual(outcome.skipped, [(test, 'reason')])
+
+        # a part that passes doesn't reset an earlier failure
+        with outcome.testPartExecutor(test):
+            pass
+        self.assertFalse(outcome.success)
+
+        outcome = _Outcome()
+        outcome.expecting_failure = True
+        exc = ValueError('foo')
+        with outcome.testPartExecutor(test, isTest=True):
+            raise exc
+        self.assertTrue(outcome.success)
+        self.assertEqual(outcome.expectedFailure[:2], (ValueError, exc))
+        self.assertEqual(outcome.errors, [])
+
+        def interrupt():
+            with outcome.testPartExecutor(test):
+                raise KeyboardInterrupt
+        self.assertRaises(KeyboardInterrupt, interrupt)
+        self.assertTrue(outcome.success)
+
     def testCleanupInRun(self):
         blowUp = False
         ordering = []
@@ -161,6 +194,9 @@ class Test_TextTestRunner(unittest2.TestCase):
         self.assertTrue(runner.descriptions)
         self.assertEqual(runner.resultclass, unittest2.TextTestResult)
         self.assertFalse(runner.tb_locals)
+        self.assertIsNone(runner.workers)
+        self.assertIsNone(runner.durations)
+        self.assertFalse(runner.group_fixtures)
 
     def test_multiple_inheritance(self):
         class AResult(unittest.TestResult):
@@ -189,6 +225,89 @@ class Test_TextTestRunner(unittest2.TestCase):
         self.assertTrue(result.failfast)
         self.assertTrue(result.buffer)
 
+    def test_durations(self):
+        class Test(unittest2.TestCase):
+            def testFoo(self):
+                pass
+        stream = StringIO()
+        runner = unittest2.TextTestRunner(stream=stream, durations=2)
+        result = runner.run(Test('testFoo'))
+        self.assertEqual([name for name, _, _ in result.collectedDurations],
+                         [str(Test('testFoo'))])
+        self.assertIn('Slowest test durations', stream.getvalue())
+        self.assertIn('durations < 0.001s were hidden', stream.getvalue())
+        self.assertNotIn('fixture', stream.getvalue())
+
+        result.collectedDurations = [('a', 0.5, 0.25), ('b', 2.0, None),
+                                     ('c', 0.0001, 0.0), ('d', 1.0, 1.0)]
+        stream.truncate(0)
+        stream.seek(0)
+        runner._printDurations(result)
+        lines = stream.getvalue().splitlines()[3:]
+        self.assertEqual(lines, ['2.000s     -          b',
+                                 '1.000s     1.000s     d', ''])
+
+        runner.durations = 0
+        runner.verbosity = 2
+        stream.truncate(0)
+        stream.seek(0)
+        runner._printDurations(result)
+        lines = stream.getvalue().splitlines()[3:]
+        self.assertEqual([line.split()[-1] for line in lines if line],
+                         ['b', 'd', 'a', 'c'])
+
+    def test_fixture_time(self):
+        class Test(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+            @classmethod
+            def tearDownClass(cls):
+                pass
+            def testFoo(self):
+                pass
+        stream = StringIO()
+        runner = unittest2.TextTestRunner(stream=stream)
+        result = runner.run(unittest2.TestSuite([Test('testFoo')]))
+        self.assertEqual(result.fixturesRun, 2)
+        self.assertIn('\nRan 2 fixtures in %.3fs\n' %
+                      result.fixtureTime, stream.getvalue())
+
+    def test_expected_failures_not_formatted(self):
+        class Test(unittest2.TestCase):
+            @unittest2.expectedFailure
+            def testFoo(self):
+                self.fail()
+        stream = StringIO()
+        runner = unittest2.TextTestRunner(stream=stream)
+        result = runner.run(unittest2.TestSuite([Test('testFoo')]))
+        self.assertIn('OK (expected failures=1)', stream.getvalue())
+        self.assertEqual(len(result._unformattedExpectedFailures), 1)
+        self.assertEqual(len(result.expectedFailures), 1)
+        self.assertEqual(result._unformattedExpectedFailures, [])
+
+    def test_group_fixtures(self):
+        class Test(unittest2.TestCase):
+            setUps = 0
+            @classmethod
+            def setUpClass(cls):
+                Test.setUps += 1
+            def testFoo(self):
+                pass
+            def testBar(self):
+                pass
+        class Other(unittest2.TestCase):
+            def testFoo(self):
+                pass
+        stream = StringIO()
+        runner = unittest2.TextTestRunner(stream=stream, group_fixtures=True)
+        result = runner.run(unittest2.TestSuite([
+            Test('testFoo'), Other('testFoo'), Test('testBar')]))
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(Test.setUps, 1)
+        self.assertIn('\nGrouping tests by fixture saved 1 setup\n',
+                      stream.getvalue())
+
     def test_locals(self):
         runner = unittest.TextTestRunner(stream=io.StringIO(), tb_locals=True)
         result = runner.run(unittest.TestSuite())
@@ -1,4 +1,5 @@
 import sys
+import types
 
 from six.moves import StringIO
 
@@ -46,6 +47,68 @@ class TestSetups(unittest2.TestCase):
         self.assertEqual(result.testsRun, 2)
         self.assertEqual(len(result.errors), 0)
 
+    def test_fixture_durations(self):
+        class Module(object):
+            @staticmethod
+            def setUpModule():
+                pass
+
+        class Test(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+            @classmethod
+            def tearDownClass(cls):
+                raise TypeError('foo')
+            def test_one(self):
+                pass
+
+        Test.__module__ = 'Module'
+        sys.modules['Module'] = Module
+
+        result = self.runTests(Test)
+
+        className = 'Module.%s' % getattr(Test, '__qualname__', Test.__name__)
+        self.assertEqual([name for name, _, _ in result.collectedDurations],
+                         ['setUpModule (Module)',
+                          'setUpClass (%s)' % className,
+                          str(Test('test_one')),
+                          'tearDownClass (%s)' % className])
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.fixturesRun, 3)
+
+    def test_fixture_hooks(self):
+        class Test(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+            def test_one(self):
+                pass
+        class NoFixtures(unittest2.TestCase):
+            def test_one(self):
+                pass
+
+        class Result(unittest2.TestResult):
+            def __init__(self):
+                super(Result, self).__init__()
+                self.calls = []
+            def startFixture(self, fixture):
+                self.calls.append(('start', str(fixture)))
+            def stopFixture(self, fixture, elapsed, cpu=None):
+                self.calls.append(('stop', str(fixture)))
+                super(Result, self).stopFixture(fixture, elapsed, cpu)
+
+        result = Result()
+        unittest2.TestSuite([Test('test_one'), NoFixtures('test_one')]).run(
+            result)
+
+        # the fixtures inherited from TestCase aren't reported
+        name = 'setUpClass (%s)' % unittest2.util.strclass(Test)
+        self.assertEqual(result.calls, [('start', name), ('stop', name)])
+        self.assertEqual(result.fixturesRun, 1)
+        self.assertEqual(result.fixtureTime,
+                         result.collectedDurations[0][1])
+
     def test_teardown_class(self):
         class Test(unittest2.TestCase):
             tearDownCalled = 0
@@ -504,5 +567,161 @@ class TestSetups(unittest2.TestCase):
             self.assertRaisesRegex(Exception, msg, suite.debug)
 
 
+class TestResources(unittest2.TestCase):
+
+    def setUp(self):
+        self.calls = calls = []
+        def make():
+            calls.append('make')
+            return len(calls)
+        self.resource = unittest2.Resource(
+            make, clean=lambda value: calls.append(('clean', value)),
+            reset=lambda value: calls.append(('reset', value)), name='thing')
+
+    def makeTest(self, needed, name='Test', module='Module'):
+        calls = self.calls
+        def test_one(self):
+            calls.append((type(self).__name__, getattr(self, 'thing', None)))
+        Test = type(name, (unittest2.TestCase,),
+                    {'resources': needed, 'test_one': test_one,
+                     '__module__': module})
+        return Test('test_one')
+
+    def test_shared_across_classes(self):
+        needs = [('thing', self.resource)]
+        suite = unittest2.TestSuite([
+            self.makeTest(needs, 'A', 'One'), self.makeTest(needs, 'B', 'Two'),
+            self.makeTest([], 'C'), self.makeTest(needs, 'D')])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.calls, [
+            'make', ('A', 1), ('reset', 1), ('B', 1), ('clean', 1),
+            ('C', None), 'make', ('D', 7), ('clean', 7)])
+        self.assertIn('setUpResource (thing)',
+                      [name for name, _, _ in result.collectedDurations])
+
+    def test_make_fails(self):
+        def make():
+            self.calls.append('make')
+            raise ValueError('no thing')
+        needs = [('thing', unittest2.Resource(make, name='thing'))]
+        suite = unittest2.TestSuite([self.makeTest(needs, 'A'),
+                                     self.makeTest(needs, 'B')])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(self.calls, ['make'])
+        self.assertEqual(result.testsRun, 0)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(str(result.errors[0][0]), 'setUpResource (thing)')
+
+    def test_reset_fails(self):
+        def reset(value):
+            raise ValueError('stuck')
+        self.resource.reset = reset
+        needs = [('thing', self.resource)]
+        suite = unittest2.TestSuite([self.makeTest(needs, 'A'),
+                                     self.makeTest(needs, 'B')])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(self.calls, [
+            'make', ('A', 1), ('clean', 1), 'make', ('B', 4), ('clean', 4)])
+        self.assertEqual([str(test) for test, _ in result.errors],
+                         ['resetResource (thing)'])
+
+    def test_debug(self):
+        def clean(value):
+            raise ValueError('clean')
+        self.resource.clean = clean
+        suite = unittest2.TestSuite([
+            self.makeTest([('thing', self.resource)])])
+        self.assertRaisesRegex(ValueError, 'clean', suite.debug)
+
+
+class TestSessions(unittest2.TestCase):
+
+    def setUp(self):
+        self.calls = calls = []
+        self.package = types.ModuleType('Session')
+        self.package.__path__ = []
+        self.package.setUpSession = lambda: calls.append('setUpSession')
+        self.package.tearDownSession = lambda: calls.append('tearDownSession')
+        for name in ('Session', 'Session.one', 'Session.two'):
+            self.addCleanup(sys.modules.pop, name, None)
+        sys.modules['Session'] = self.package
+        sys.modules['Session.one'] = types.ModuleType('Session.one')
+        sys.modules['Session.two'] = types.ModuleType('Session.two')
+
+    def makeTest(self, module, test_one=None):
+        calls = self.calls
+        if test_one is None:
+            def test_one(self):
+                calls.append(self.__module__)
+        Test = type('Test', (unittest2.TestCase,),
+                    {'test_one': test_one, '__module__': module})
+        return Test('test_one')
+
+    def test_once_per_run(self):
+        suite = unittest2.TestSuite([
+            self.makeTest('Session.one'), self.makeTest('Session.two'),
+            self.makeTest('Other')])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.calls, [
+            'setUpSession', 'Session.one', 'Session.two', 'Other',
+            'tearDownSession'])
+        self.assertIn('setUpSession (Session)',
+                      [name for name, _, _ in result.collectedDurations])
+
+    def test_session_module(self):
+        module = types.ModuleType(unittest2.suite.SESSION_MODULE)
+        module.setUpSession = lambda: self.calls.append('module')
+        self.addCleanup(sys.modules.pop, module.__name__, None)
+        sys.modules[module.__name__] = module
+        suite = unittest2.TestSuite([self.makeTest('Other'),
+                                     self.makeTest('Session.one')])
+
+        suite.run(unittest2.TestResult())
+
+        self.assertEqual(self.calls, [
+            'module', 'Other', 'setUpSession', 'Session.one',
+            'tearDownSession'])
+
+    def test_error_in_setup_session(self):
+        def setUpSession():
+            raise TypeError('foo')
+        self.package.setUpSession = setUpSession
+        suite = unittest2.TestSuite([
+            self.makeTest('Session.one'), self.makeTest('Session.two'),
+            self.makeTest('Other')])
+
+        result = unittest2.TestResult()
+        suite.run(result)
+
+        self.assertEqual(self.calls, ['Other'])
+        self.assertEqual([str(test) for test, _ in result.errors],
+                         ['setUpSession (Session)'])
+
+    def test_torn_down_when_interrupted(self):
+        def test_one(self):
+            raise KeyboardInterrupt
+        suite = unittest2.TestSuite([
+            self.makeTest('Session.one', test_one),
+            self.makeTest('Session.two')])
+
+        self.assertRaises(KeyboardInterrupt, suite.run,
+                          unittest2.TestResult())
+        self.assertEqual(self.calls, ['setUpSession', 'tearDownSession'])
+
+
 if __name__ == '__main__':
     unittest2.main()
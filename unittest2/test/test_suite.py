@@ -433,5 +433,173 @@ class Test_TestSuite(unittest2.TestCase, EqualityMixin):
         wrapper(unittest2.TestResult())
         self.assertTrue(suite.called)
 
+class Test_LazySuite(unittest2.TestCase):
+
+    def test_loaded_on_iteration(self):
+        loads = []
+        def load():
+            loads.append(True)
+            return _mk_TestSuite('test_1', 'test_2')
+        suite = unittest2.LazySuite(load, 'module')
+
+        self.assertEqual(loads, [])
+        self.assertIn('not loaded', repr(suite))
+        self.assertEqual(suite.countTestCases(), 2)
+        self.assertEqual(list(suite), list(_mk_TestSuite('test_1', 'test_2')))
+        self.assertEqual(loads, [True])
+
+    def test_run(self):
+        suite = unittest2.TestSuite([
+            unittest2.LazySuite(lambda: _mk_TestSuite('test_1')),
+            unittest2.LazySuite(lambda: _mk_TestSuite('test_2', 'test_3'))])
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(suite.countTestCases(), 3)
+
+    def test_addTest_before_load(self):
+        suite = unittest2.LazySuite(lambda: [])
+        self.assertRaises(TypeError, suite.addTest, Test.Foo('test_1'))
+        list(suite)
+        suite.addTest(Test.Foo('test_1'))
+        self.assertEqual(suite.countTestCases(), 1)
+
+
+class Test_ParametrizedSuite(unittest2.TestCase):
+
+    def setUp(self):
+        self.reads = reads = []
+        def params():
+            for i in range(3):
+                reads.append(i)
+                yield i
+
+        class Foo(unittest2.TestCase):
+            ran = []
+            @unittest2.parametrize(params)
+            def test(self, i):
+                self.ran.append((i, len(reads)))
+        self.Foo = Foo
+
+    def test_cases_made_while_running(self):
+        suite = unittest2.ParametrizedSuite(self.Foo, 'test')
+        self.assertEqual(self.reads, [])
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(result.testsRun, 3)
+        # each case ran before the next parameters were read
+        self.assertEqual(self.Foo.ran, [(0, 1), (1, 2), (2, 3)])
+        # counting after the run doesn't read the parameters again
+        self.assertEqual(suite.countTestCases(), 3)
+        self.assertEqual(len(self.reads), 3)
+
+    def test_ids(self):
+        suite = unittest2.ParametrizedSuite(self.Foo, 'test')
+        self.assertEqual(suite.countTestCases(), 3)
+        self.assertEqual([test.id().rsplit('.', 1)[1] for test in suite],
+                         ['test[0]', 'test[1]', 'test[2]'])
+        self.assertRaises(TypeError, suite.addTest, self.Foo('test[0]'))
+
+    def test_plain_iterator_not_counted(self):
+        class Foo(unittest2.TestCase):
+            @unittest2.parametrize(iter([1, 2]))
+            def test(self, i):
+                pass
+        suite = unittest2.ParametrizedSuite(Foo, 'test')
+        self.assertEqual(suite.countTestCases(), 0)
+        result = unittest2.TestResult()
+        suite.run(result)
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(suite.countTestCases(), 2)
+
+
+class Test_groupByFixtures(unittest2.TestCase):
+
+    def setUp(self):
+        self.setUps = setUps = []
+        class Module(object):
+            @staticmethod
+            def setUpModule():
+                setUps.append('module')
+        class Fixed(unittest2.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                setUps.append('class')
+            def test_1(self): pass
+            def test_2(self): pass
+        class Plain(unittest2.TestCase):
+            def test_1(self): pass
+            def test_2(self): pass
+        Fixed.__module__ = Plain.__module__ = 'Module'
+        sys.modules['Module'] = Module
+        self.addCleanup(sys.modules.pop, 'Module')
+        self.Fixed, self.Plain = Fixed, Plain
+
+    def test_grouped(self):
+        Fixed, Plain = self.Fixed, self.Plain
+        suite = unittest2.TestSuite([
+            Fixed('test_2'), Plain('test_2'), Test.Foo('test_1'),
+            unittest2.TestSuite([Fixed('test_1'), Plain('test_1')])])
+
+        grouped, saved = unittest2.suite.groupByFixtures(suite)
+
+        self.assertEqual(list(grouped),
+                         [Fixed('test_2'), Fixed('test_1'), Plain('test_2'),
+                          Plain('test_1'), Test.Foo('test_1')])
+        # a setUpModule and a setUpClass
+        self.assertEqual(saved, 2)
+        grouped.run(unittest2.TestResult())
+        self.assertEqual(self.setUps, ['module', 'class'])
+
+    def test_grouped_by_resources(self):
+        cheap = unittest2.Resource(lambda: None, name='cheap')
+        dear = unittest2.Resource(lambda: None, cost=10, name='dear')
+        def makeClass(name, *resources):
+            return type(name, (unittest2.TestCase,), {
+                'resources': [(str(r), r) for r in resources],
+                'test_1': lambda self: None})
+        Cheap = makeClass('Cheap', cheap)
+        Dear = makeClass('Dear', dear)
+        Both = makeClass('Both', cheap, dear)
+        Neither = makeClass('Neither')
+        suite = unittest2.TestSuite(
+            cls('test_1') for cls in (Dear, Cheap, Neither, Both, Dear))
+
+        grouped, saved = unittest2.suite.groupByFixtures(suite)
+
+        # each resource is made once
+        self.assertEqual([type(test) for test in grouped],
+                         [Dear, Dear, Both, Cheap, Neither])
+        self.assertEqual(saved, 2)
+
+    def test_module_fixtures_cost(self):
+        resource = unittest2.Resource(lambda: None, name='r1')
+        classes = []
+        for module in ('One', 'Two'):
+            fixture = type(sys)(module)
+            fixture.setUpModule = lambda: None
+            sys.modules[module] = fixture
+            self.addCleanup(sys.modules.pop, module)
+            for needs in ([('r1', resource)], []):
+                classes.append(type('Test', (unittest2.TestCase,), {
+                    'resources': needs, 'test_1': lambda self: None,
+                    '__module__': module}))
+        suite = unittest2.TestSuite(cls('test_1') for cls in classes)
+
+        grouped, saved = unittest2.suite.groupByFixtures(suite)
+
+        # moving the resource users together would set up each module twice
+        self.assertEqual(list(grouped), list(suite))
+        self.assertEqual(saved, 0)
+
+    def test_already_grouped(self):
+        suite = unittest2.TestSuite([self.Fixed('test_1'),
+                                     self.Fixed('test_2'),
+                                     self.Plain('test_1')])
+        grouped, saved = unittest2.suite.groupByFixtures(suite)
+        self.assertEqual(list(grouped), list(suite))
+        self.assertEqual(saved, 0)
+
+
 if __name__ == '__main__':
     unittest2.main()
@@ -1,6 +1,9 @@
 """Various utility functions."""
 
 from os.path import commonprefix
+import time
+
+import six
 
 __unittest = True
 
@@ -22,7 +25,9 @@ def _shorten(s, prefixlen, suffixlen):
     return s
 
 def _common_shorten_repr(*args):
-    args = tuple(map(safe_repr, args))
+    return _common_shorten(tuple(map(safe_repr, args)))
+
+def _common_shorten(args):
     maxlen = max(map(len, args))
     if maxlen <= _MAX_LENGTH:
         return args
@@ -42,14 +47,121 @@ def _common_shorten_repr(*args):
     return tuple(prefix + _shorten(s[prefixlen:], _MIN_DIFF_LEN, _MIN_END_LEN)
                  for s in args)
 
-def safe_repr(obj, short=False):
+def _repr(obj):
     try:
-        result = repr(obj)
+        return repr(obj)
     except Exception:
-        result = object.__repr__(obj)
-    if not short or len(result) < _MAX_LENGTH:
+        return object.__repr__(obj)
+
+def safe_repr(obj, short=False, limit=None):
+    """repr(obj), even if that raises.
+
+    With a limit, only the first limit characters of the repr are made,
+    and '...' and the brackets and quotes left open follow them when the
+    repr is longer. short cuts it to _MAX_LENGTH characters.
+    """
+    if short and (limit is None or limit > _MAX_LENGTH):
+        limit = _MAX_LENGTH
+    if limit is None:
+        return _repr(obj)
+    result, closers = _BoundedRepr(limit).make(obj)
+    if short:
+        if len(result) < _MAX_LENGTH:
+            return result
+        return result[:_MAX_LENGTH] + ' [truncated]...'
+    if closers is None:
         return result
-    return result[:_MAX_LENGTH] + ' [truncated]...'
+    return result + '...' + closers
+
+
+class _ReprFull(Exception):
+    """The repr has used up its characters."""
+
+# the end of the repr of each string type after its opening quote
+_STRING_ENDS = dict((kind, len(repr(kind())) - repr(kind()).index("'") - 1)
+                    for kind in (str, bytes, bytearray, six.text_type))
+_SET_BRACKETS = dict((kind, tuple(repr(kind([0])).split('0')))
+                     for kind in (set, frozenset))
+
+
+class _BoundedRepr(object):
+    """Makes the repr of builtin containers and strings a piece at a
+    time, so that no more than a given number of characters is made.
+
+    Other objects have their repr made in full and cut.
+    """
+
+    __slots__ = ('parts', 'room', 'closers', 'active')
+
+    def __init__(self, limit):
+        self.parts = []
+        self.room = limit
+        self.closers = []
+        self.active = set()
+
+    def make(self, obj):
+        """Return (repr, None) if the repr of obj fits in the limit, or
+        (first limit characters of it, what closes them)."""
+        try:
+            self.add(obj)
+        except _ReprFull:
+            return ''.join(self.parts), ''.join(reversed(self.closers))
+        return ''.join(self.parts), None
+
+    def write(self, text):
+        if len(text) > self.room:
+            self.parts.append(text[:self.room])
+            raise _ReprFull
+        self.parts.append(text)
+        self.room -= len(text)
+
+    def add(self, obj):
+        kind = type(obj)
+        if kind in _STRING_ENDS:
+            # a slice one longer than the room still shows it is cut
+            if len(obj) > self.room:
+                obj = obj[:self.room + 1]
+            self.enclose(_repr(obj), _STRING_ENDS[kind])
+        elif kind in (list, tuple, dict, set, frozenset):
+            if not obj:
+                self.write(repr(obj))
+            elif id(obj) in self.active:
+                self.write('{...}' if kind is dict else '[...]')
+            elif kind is dict:
+                self.items('{', '}', obj, obj.items(), self.pair)
+            elif kind is tuple:
+                self.items('(', ',)' if len(obj) == 1 else ')', obj, obj,
+                           self.add)
+            elif kind is list:
+                self.items('[', ']', obj, obj, self.add)
+            else:
+                opener, closer = _SET_BRACKETS[kind]
+                self.items(opener, closer, obj, obj, self.add)
+        else:
+            self.write(_repr(obj))
+
+    def enclose(self, text, end):
+        self.closers.append(text[len(text) - end:])
+        self.write(text[:len(text) - end])
+        self.write(self.closers[-1])
+        self.closers.pop()
+
+    def pair(self, item):
+        self.add(item[0])
+        self.write(': ')
+        self.add(item[1])
+
+    def items(self, opener, closer, container, items, add):
+        self.active.add(id(container))
+        self.write(opener)
+        self.closers.append(closer)
+        for index, item in enumerate(items):
+            if index:
+                self.write(', ')
+            add(item)
+        self.write(closer)
+        self.closers.pop()
+        self.active.discard(id(container))
 
 def safe_str(obj):
     try:
@@ -61,6 +173,15 @@ def strclass(cls):
     return "%s.%s" % (cls.__module__, getattr(cls, '__qualname__', cls.__name__))
 
 
+_monotonic = getattr(time, 'monotonic', time.time)
+_process_time = getattr(time, 'process_time', None) or time.clock
+
+def clocks():
+    """Return the monotonic wall clock and the process CPU time, in
+    seconds, as a pair."""
+    return _monotonic(), _process_time()
+
+
 def unorderable_list_difference(expected, actual, ignore_duplicate=False):
     """Same behavior as sorted_list_difference but
     for lists of unorderable items (like dicts).
@@ -98,6 +219,105 @@ def unorderable_list_difference(expected, actual, ignore_duplicate=False):
     return missing, actual
 
 
+class _NoKey(Exception):
+    """The item has no key that is equal exactly when the item is."""
+
+# tags for the keys of unhashable containers, equal only to themselves
+_LIST_KEY = object()
+_TUPLE_KEY = object()
+_DICT_KEY = object()
+
+_object_eq = getattr(object, '__eq__', None)
+_KEY_TYPES = frozenset(six.integer_types + (
+    bool, float, complex, bytes, six.text_type, str, type(None)))
+
+def _item_key(item):
+    """Return a hashable key for item, such that the keys of two items
+    are equal when the items are."""
+    kind = type(item)
+    if kind in _KEY_TYPES:
+        return item
+    try:
+        hash(item)
+    except Exception:
+        pass
+    else:
+        if (getattr(kind, '__hash__', None) is object.__hash__ and
+            (getattr(kind, '__eq__', None) is not _object_eq or
+             getattr(kind, '__cmp__', None) is not None)):
+            # compared by value but hashed by identity, which Python 2
+            # allows
+            raise _NoKey
+        return item
+    if kind is list:
+        return (_LIST_KEY, tuple(map(_item_key, item)))
+    if kind is tuple:
+        return (_TUPLE_KEY, tuple(map(_item_key, item)))
+    if kind is dict:
+        return (_DICT_KEY, frozenset((key, _item_key(value))
+                                     for key, value in item.items()))
+    if kind is set:
+        # equal to a frozenset of the same items, as the set is
+        return frozenset(item)
+    if kind is bytearray:
+        return bytes(item)
+    raise _NoKey
+
+
+def unorderable_items_difference(expected, actual):
+    """Same result as unorderable_list_difference(expected, actual), with
+    the items in the same order, without its O(n*n) search for the items
+    that are hashable or are lists, tuples, dicts or sets of such items.
+
+    Those are matched up through a key for each item; only the items left
+    unmatched are compared one by one, and of those only pairs where one
+    of the items has no key.
+    """
+    expected_keys = []
+    actual_keys = []
+    positions = {}
+    for items, keys, side in ((expected, expected_keys, 0),
+                              (actual, actual_keys, 1)):
+        for index, item in enumerate(items):
+            try:
+                key = _item_key(item)
+            except _NoKey:
+                keys.append(_NoKey)
+                continue
+            keys.append(key)
+            positions.setdefault(key, ([], []))[side].append(index)
+
+    # like unorderable_list_difference, the expected items are matched
+    # from the last, each with the first equal actual item left
+    matched_expected = [False] * len(expected)
+    matched_actual = [False] * len(actual)
+    for expected_indexes, actual_indexes in positions.values():
+        count = min(len(expected_indexes), len(actual_indexes))
+        for index in expected_indexes[len(expected_indexes) - count:]:
+            matched_expected[index] = True
+        for index in actual_indexes[:count]:
+            matched_actual[index] = True
+
+    left = [index for index in range(len(actual))
+            if not matched_actual[index]]
+    no_key = [index for index in left if actual_keys[index] is _NoKey]
+    missing = []
+    for index in range(len(expected) - 1, -1, -1):
+        if matched_expected[index]:
+            continue
+        item = expected[index]
+        # items with different keys are different
+        candidates = left if expected_keys[index] is _NoKey else no_key
+        for other in candidates:
+            if not matched_actual[other] and actual[other] == item:
+                matched_actual[other] = True
+                break
+        else:
+            missing.append(item)
+    unexpected = [actual[index] for index in left if not matched_actual[index]]
+    return missing, unexpected
+
+
 def three_way_cmp(x, y):
     """Return -1 if x < y, 0 if x == y and 1 if x > y"""
     return (x > y) - (x < y)